@@ -0,0 +1,164 @@
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from .database import DatabaseManager
+from .profiling import StageTimer
+
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Попыток записи пакета при ошибке БД (например, база заблокирована другим процессом)
+FLUSH_RETRIES = 3
+
+
+
+class AttendanceWriter(threading.Thread):
+
+    def __init__(self, institution_type: str, batch_size: int = 50, flush_interval: float = 0.2,
+                 on_flush: Optional[Callable[[int], None]] = None,
+                 on_drop: Optional[Callable[[List[Tuple[int, datetime]]], None]] = None):
+        """
+        Отложенная запись посещений отдельным потоком со своим соединением с БД
+        События копятся в очереди и записываются одной транзакцией, когда набирается
+        batch_size событий или проходит flush_interval секунд с первого события пакета.
+        Поток распознавания и GUI не ждут записи на диск
+        :param institution_type: Educational или Enterprise
+        :param batch_size: Максимум событий в одной транзакции
+        :param flush_interval: Максимальная задержка записи события в секундах
+        :param on_flush: Вызывается из потока записи с количеством добавленных записей
+        :param on_drop: Вызывается из потока записи с посещениями (id, время), которые не удалось
+                        записать после FLUSH_RETRIES попыток (например, чтобы снять отметку в памяти)
+        """
+        super().__init__(name="AttendanceWriter", daemon=True)
+        self.institution_type = institution_type
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.on_drop = on_drop
+        self.events: "queue.Queue[Tuple[int, str]]" = queue.Queue()
+        # Посещения в очереди и в записываемом пакете (еще не в БД)
+        self.pending: "Counter[Tuple[int, str]]" = Counter()
+        self.pending_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.timings = StageTimer()
+        self.written = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+
+    def add(self, user_id: int, timestamp: datetime):
+        """Постановка посещения в очередь записи (время - момент распознавания)"""
+        event = (user_id, timestamp.strftime(TIMESTAMP_FORMAT))
+        with self.pending_lock:
+            self.pending[event] += 1
+        self.events.put(event)
+
+
+    def pending_marks(self, day: date) -> Dict[int, datetime]:
+        """
+        Незаписанные посещения дня: id пользователя -> время последнего
+        (дополняют отметки из БД при их перезагрузке)
+        """
+        prefix = day.isoformat()
+        marks = {}
+        with self.pending_lock:
+            for user_id, timestamp in self.pending:
+                if timestamp.startswith(prefix):
+                    marks[user_id] = max(marks.get(user_id, timestamp), timestamp)
+        return {user_id: datetime.strptime(timestamp, TIMESTAMP_FORMAT) for user_id, timestamp in marks.items()}
+
+
+    def stop(self):
+        """Запись оставшихся событий и остановка потока"""
+        self.stop_event.set()
+        if self.is_alive():
+            self.join()
+
+
+    def queue_depth(self) -> int:
+        return self.events.qsize()
+
+
+    def summary(self) -> str:
+        message = (f"записано посещений: {self.written}, в очереди: {self.queue_depth()}, "
+                   f"макс. очередь: {self.max_depth}")
+        if self.timings.totals:
+            message += f", {self.timings.summary()}"
+        if self.dropped:
+            message += f", потеряно из-за ошибок БД: {self.dropped}"
+        return message
+
+
+    def run(self):
+        # Соединение SQLite привязано к потоку, в котором создано
+        db = DatabaseManager(self.institution_type)
+        batch: List[Tuple[int, str]] = []
+        attempts = 0
+
+        try:
+            while not (self.stop_event.is_set() and not batch and self.events.empty()):
+                self._collect(batch)
+                if not batch:
+                    continue
+
+                self.max_depth = max(self.max_depth, len(batch) + self.events.qsize())
+                if self._flush(db, batch):
+                    self._release(batch)
+                    batch = []
+                    attempts = 0
+                    continue
+
+                attempts += 1
+                if attempts >= FLUSH_RETRIES:
+                    print(f"Не удалось записать {len(batch)} посещений после {attempts} попыток")
+                    self.dropped += len(batch)
+                    self._release(batch)
+                    if self.on_drop is not None:
+                        self.on_drop([(user_id, datetime.strptime(timestamp, TIMESTAMP_FORMAT))
+                                      for user_id, timestamp in batch])
+                    batch = []
+                    attempts = 0
+                elif not self.stop_event.is_set():
+                    time.sleep(self.flush_interval)
+        finally:
+            db.conn.close()
+
+
+    def _collect(self, batch: list):
+        """Добор пакета: до batch_size событий или до истечения flush_interval (при остановке - без ожидания)"""
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if self.stop_event.is_set() or timeout <= 0:
+                    batch.append(self.events.get_nowait())
+                else:
+                    batch.append(self.events.get(timeout=timeout))
+            except queue.Empty:
+                return
+
+
+    def _release(self, batch: list):
+        """Пакет записан или отброшен: события больше не считаются ожидающими"""
+        with self.pending_lock:
+            self.pending.subtract(batch)
+            for event in batch:
+                if self.pending[event] <= 0:
+                    del self.pending[event]
+
+
+    def _flush(self, db: DatabaseManager, batch: list) -> bool:
+        try:
+            with self.timings.measure('запись пакета'):
+                added = db.add_attendance_events(batch)
+        except sqlite3.Error as e:
+            print(f"Ошибка записи посещений ({len(batch)} событий): {e}")
+            return False
+
+        self.written += added
+        if self.on_flush is not None and added:
+            self.on_flush(added)
+        return True
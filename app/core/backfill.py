@@ -0,0 +1,270 @@
+import json
+import multiprocessing as mp
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import cv2
+from .database import DatabaseManager
+from .face_recognition import FaceRecognizer
+from .frame_source import IMAGE_EXTENSIONS, list_images
+from .gallery import FaceGallery
+from .model_loader import clear_models
+from .paths import BACKFILL_DIR
+from ..settings.settings import SettingsManager
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.m4v', '.webm')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Дата и время в имени файла: 20241018_093000, 2024-10-18 09-30-00, 2024-10-18T09:30:00 и т.п.
+FILENAME_TIME_PATTERN = re.compile(r'(\d{4})[-_.]?(\d{2})[-_.]?(\d{2})[ _T-]?(\d{2})[-_:.]?(\d{2})[-_:.]?(\d{2})')
+
+# Состояние процесса-обработчика (один распознаватель на процесс)
+_worker_recognizer: Optional[FaceRecognizer] = None
+
+
+
+def collect_units(paths: List[str]) -> List[Path]:
+    """
+    Единицы обработки: видеофайлы и папки с изображениями (папка - одна съемка)
+    Папки просматриваются рекурсивно
+    """
+    units = []
+    for path in map(Path, paths):
+        if path.is_file():
+            units.append(path)
+            continue
+        if not path.is_dir():
+            print(f"Путь {path} не найден")
+            continue
+        for directory in [path] + sorted(p for p in path.rglob('*') if p.is_dir()):
+            files = sorted(p for p in directory.iterdir() if p.is_file())
+            units.extend(p for p in files if p.suffix.lower() in VIDEO_EXTENSIONS)
+            if any(p.suffix.lower() in IMAGE_EXTENSIONS for p in files):
+                units.append(directory)
+    return units
+
+
+def unit_signature(unit: Path) -> dict:
+    """Размер и время изменения: по ним определяется, что обработанный файл не менялся"""
+    paths = list_images(unit) if unit.is_dir() else [unit]
+    stats = [path.stat() for path in paths]
+    return {
+        'files': len(stats),
+        'size': sum(stat.st_size for stat in stats),
+        'mtime_ns': max((stat.st_mtime_ns for stat in stats), default=0)
+    }
+
+
+def time_from_filename(path: Path) -> Optional[datetime]:
+    match = FILENAME_TIME_PATTERN.search(path.stem)
+    if match is None:
+        return None
+    try:
+        return datetime(*map(int, match.groups()))
+    except ValueError:
+        return None
+
+
+def image_time(path: Path) -> datetime:
+    """Время съемки изображения: EXIF DateTimeOriginal, имя файла или время изменения"""
+    try:
+        from PIL import Image
+        with Image.open(path) as img:
+            value = img.getexif().get_ifd(0x8769).get(0x9003)  # Exif IFD -> DateTimeOriginal
+        if value:
+            return datetime.strptime(value, '%Y:%m:%d %H:%M:%S')
+    except Exception:
+        pass
+    return time_from_filename(path) or datetime.fromtimestamp(path.stat().st_mtime)
+
+
+def video_start_time(path: Path, cap: cv2.VideoCapture) -> datetime:
+    """
+    Время начала записи: из имени файла, иначе время изменения файла
+    минус длительность (файл дописывается до конца записи)
+    """
+    start = time_from_filename(path)
+    if start is not None:
+        return start
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0
+    frames = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0
+    duration = frames / fps if fps > 0 else 0
+    return datetime.fromtimestamp(path.stat().st_mtime) - timedelta(seconds=duration)
+
+
+def _init_worker(snapshot_dir: Path, generation: int):
+    """Инициализация процесса-обработчика: модели и общая галерея (только чтение)"""
+    global _worker_recognizer
+    # Процессы делят ядра между собой
+    cv2.setNumThreads(1)
+    recognizer = FaceRecognizer(None, SettingsManager(), gallery=FaceGallery())
+    recognizer.set_gallery(FaceGallery.load_snapshot(snapshot_dir, generation,
+                                                     index=recognizer.create_gallery_index()))
+    _worker_recognizer = recognizer
+
+
+def _iter_unit(unit: Path, stride: int, start: Optional[datetime]):
+    """Кадры единицы обработки с временем съемки: (время, кадр, доля выполнения)"""
+    if unit.is_dir():
+        images = list_images(unit)[::stride]
+        for index, path in enumerate(images):
+            frame = cv2.imread(str(path))
+            if frame is not None:
+                yield image_time(path), frame, (index + 1) / len(images)
+        return
+
+    cap = cv2.VideoCapture(str(unit))
+    if not cap.isOpened():
+        raise IOError(f"Не удалось открыть видео {unit}")
+    try:
+        start = start or video_start_time(unit, cap)
+        total = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            position = cap.get(cv2.CAP_PROP_POS_MSEC)
+            done = cap.get(cv2.CAP_PROP_POS_FRAMES) / total if total > 0 else 0.0
+            yield start + timedelta(milliseconds=position), frame, done
+            # Пропущенные кадры не декодируются
+            for _ in range(stride - 1):
+                if not cap.grab():
+                    return
+    finally:
+        cap.release()
+
+
+def process_unit(unit: Path, stride: int, min_hits: int, start: Optional[datetime]) -> Tuple[str, List[Tuple[int, str]], int]:
+    """
+    Распознавание одной записи в процессе-обработчике
+    Пользователь считается присутствовавшим в день, если распознан не менее чем
+    на min_hits кадрах видео (на одном изображении для папок); время посещения -
+    первый из этих кадров
+    Возвращает (путь, список (id пользователя, время), обработано кадров)
+    """
+    # Фотографии делаются намеренно: одного снимка достаточно
+    required = 1 if unit.is_dir() else min_hits
+    hits: Dict[Tuple[int, str], List[datetime]] = {}
+    frames = 0
+    reported = 0.0
+
+    for timestamp, frame, done in _iter_unit(unit, stride, start):
+        frames += 1
+        for user_id, _ in _worker_recognizer.identify_faces(frame):
+            seen = hits.setdefault((user_id, timestamp.date().isoformat()), [])
+            if len(seen) < required:
+                seen.append(timestamp)
+        if done - reported >= 0.1:
+            reported = done
+            print(f"  {unit.name}: {done:.0%}", flush=True)
+
+    records = [(user_id, seen[0].strftime(TIMESTAMP_FORMAT))
+               for (user_id, _), seen in hits.items() if len(seen) >= required]
+    return str(unit), records, frames
+
+
+
+class BackfillRunner:
+
+    def __init__(self, settings_manager: SettingsManager, stride: int = 25, min_hits: int = 2,
+                 workers: int = 0, start: Optional[datetime] = None, force: bool = False):
+        """
+        Загрузка посещаемости задним числом из записей с камер и папок с фотографиями
+        Записи распознаются пулом процессов; результаты пишутся в БД этим процессом
+        одной транзакцией на запись. Обработанные записи запоминаются в файле
+        состояния и при повторном запуске пропускаются (если файл не изменился)
+        :param stride: Обрабатывается каждый stride-й кадр видео (каждое stride-е изображение)
+        :param min_hits: Минимум кадров с распознанным пользователем для отметки посещения
+        :param workers: Количество процессов (0 - по числу ядер)
+        :param start: Время начала записи для видео без времени в имени файла
+        :param force: Обработать заново уже обработанные записи
+        """
+        self.settings_manager = settings_manager
+        self.stride = max(1, stride)
+        self.min_hits = max(1, min_hits)
+        self.workers = workers or os.cpu_count() or 1
+        self.start = start
+        self.force = force
+        self.institution_type = settings_manager.get_setting('institution')
+        self.db = DatabaseManager(self.institution_type)
+        self.state_path = BACKFILL_DIR / f"{self.institution_type.lower()}_state.json"
+        self.state = self._load_state()
+
+
+    def run(self, paths: List[str]):
+        units = collect_units(paths)
+        pending = [unit for unit in units if self.force or not self._is_done(unit)]
+        print(f"Записей: {len(units)}, к обработке: {len(pending)}, пропущено как обработанные: {len(units) - len(pending)}")
+        if not pending:
+            return
+
+        # Галерея публикуется в файлы, которые процессы отображают в память. Эмбеддинги
+        # берутся из кэша: модели загружаются, только если есть новые или измененные эталоны
+        recognizer = FaceRecognizer(self.db, self.settings_manager, load_model=False)
+        snapshot_dir = recognizer.get_snapshot_dir("backfill_snapshot")
+        recognizer.gallery.save_snapshot(snapshot_dir, 1)
+        # Модели нужны только процессам-обработчикам
+        del recognizer
+        clear_models()
+
+        completed = 0
+        total_records = 0
+        executor = ProcessPoolExecutor(max_workers=min(self.workers, len(pending)),
+                                       mp_context=mp.get_context('spawn'),
+                                       initializer=_init_worker, initargs=(snapshot_dir, 1))
+        with executor:
+            futures = {executor.submit(process_unit, unit, self.stride, self.min_hits, self.start): unit
+                       for unit in pending}
+            for future in as_completed(futures):
+                unit = futures[future]
+                completed += 1
+                try:
+                    _, records, frames = future.result()
+                except Exception as e:
+                    print(f"[{completed}/{len(pending)}] {unit}: ошибка: {str(e)}")
+                    continue
+
+                added = self.db.add_attendance_records(records)
+                total_records += added
+                self._mark_done(unit, frames, len(records), added)
+                print(f"[{completed}/{len(pending)}] {unit}: кадров {frames}, "
+                      f"пользователей {len(records)}, новых записей {added}", flush=True)
+
+        print(f"Готово: добавлено записей о посещении: {total_records}")
+
+
+    def _load_state(self) -> dict:
+        if not self.state_path.exists():
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Ошибка чтения состояния загрузки, записи будут обработаны заново: {str(e)}")
+            return {}
+
+
+    def _is_done(self, unit: Path) -> bool:
+        entry = self.state.get(str(unit.resolve()))
+        return entry is not None and entry['signature'] == unit_signature(unit)
+
+
+    def _mark_done(self, unit: Path, frames: int, users: int, added: int):
+        """Запись состояния после фиксации транзакции: прерванная запись будет обработана заново"""
+        self.state[str(unit.resolve())] = {
+            'signature': unit_signature(unit),
+            'frames': frames,
+            'users': users,
+            'added': added,
+            'stride': self.stride,
+            'finished': datetime.now().strftime(TIMESTAMP_FORMAT)
+        }
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.state_path)
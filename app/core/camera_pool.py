@@ -0,0 +1,203 @@
+import multiprocessing as mp
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from .capture import open_capture
+from .frame_queue import LatestFrameQueue
+from .gallery import FaceGallery
+from .roi import FULL_FRAME
+from ..settings.settings import SettingsManager
+
+
+# Через сколько обработанных кадров процесс камеры сообщает их количество
+STATS_BATCH = 100
+# Попыток открыть опубликованную галерею (пока процесс читал файлы, могло выйти следующее поколение)
+SNAPSHOT_ATTEMPTS = 3
+
+
+
+def _capture_loop(cap, frame_queue: LatestFrameQueue, preview_queue, is_preview, stop_event):
+    """Поток захвата внутри процесса камеры: свежие кадры - в распознавание и в предпросмотр"""
+    while not stop_event.is_set():
+        ret, frame = cap.read()
+        if not ret:
+            time.sleep(0.01)
+            continue
+
+        frame_queue.put(frame)
+        if is_preview():
+            try:
+                preview_queue.put_nowait(frame)
+            except queue.Full:
+                pass
+
+
+def _load_gallery(recognizer, snapshot_dir: Path, generation) -> int:
+    """
+    Загрузка последнего опубликованного поколения галереи в распознаватель
+    При ошибке чтения (файлы поколения уже удалены после следующих публикаций)
+    повторяется с текущим номером поколения
+    Возвращает загруженное поколение
+    """
+    for attempt in range(SNAPSHOT_ATTEMPTS):
+        current_generation = generation.value
+        try:
+            recognizer.set_gallery(FaceGallery.load_snapshot(snapshot_dir, current_generation,
+                                                             index=recognizer.create_gallery_index()))
+            return current_generation
+        except (OSError, ValueError):
+            if attempt == SNAPSHOT_ATTEMPTS - 1:
+                raise
+            time.sleep(0.05)
+
+
+def camera_worker(source_index: int, source, snapshot_dir: Path, generation, preview_source, rois,
+                  result_queue, preview_queue, stop_event):
+    """
+    Процесс одной камеры: захват, трекинг и распознавание по общей галерее
+    Посещение не записывается: события отправляются в главный процесс
+    """
+    from .face_recognition import FaceRecognizer
+
+    try:
+        recognizer = FaceRecognizer(None, SettingsManager(), gallery=FaceGallery())
+        current_generation = _load_gallery(recognizer, snapshot_dir, generation)
+    except Exception as e:
+        result_queue.put((source_index, 'error', f"Камера {source}: ошибка инициализации распознавания: {str(e)}"))
+        return
+
+    cap = open_capture(source, recognizer.CAPTURE_RESOLUTION)
+    if not cap.isOpened():
+        result_queue.put((source_index, 'error', f"Камера {source} недоступна!"))
+        return
+
+    frame_queue = LatestFrameQueue(maxsize=1)
+    capture = threading.Thread(
+        target=_capture_loop,
+        args=(cap, frame_queue, preview_queue, lambda: preview_source.value == source_index, stop_event),
+        daemon=True
+    )
+    capture.start()
+    processed = 0
+
+    try:
+        while not stop_event.is_set():
+            # Галерея обновлена главным процессом (регистрация или удаление пользователя)
+            if generation.value != current_generation:
+                try:
+                    current_generation = _load_gallery(recognizer, snapshot_dir, generation)
+                except (OSError, ValueError) as e:
+                    # Распознавание продолжается по прежней галерее до следующей публикации
+                    current_generation = generation.value
+                    result_queue.put((source_index, 'error', f"Камера {source}: ошибка обновления галереи: {str(e)}"))
+
+            frame = frame_queue.get(timeout=0.1)
+            if frame is None:
+                continue
+
+            # Область интереса может быть изменена в окне предпросмотра
+            recognizer.set_roi(tuple(rois[source_index * 4:source_index * 4 + 4]))
+            results = recognizer.analyze_frame(frame)
+            recognized = [result for result in results if result['recognized']]
+            if recognized:
+                result_queue.put((source_index, 'recognized', recognized))
+            if preview_source.value == source_index:
+                result_queue.put((source_index, 'preview', results))
+
+            # Счетчик обработанных кадров для статистики главного процесса
+            processed += 1
+            if processed == STATS_BATCH:
+                result_queue.put((source_index, 'frames', processed))
+                processed = 0
+    finally:
+        # Кадры после последнего пакета статистики
+        if processed:
+            result_queue.put((source_index, 'frames', processed))
+        capture.join(timeout=1)
+        cap.release()
+        if recognizer.timings.totals:
+            print(f"Камера {source}, время этапов обработки кадра: {recognizer.timings.summary()}")
+
+
+
+class CameraPool:
+
+    def __init__(self, sources: list, snapshot_dir: Path, rois: Optional[dict] = None):
+        """
+        Пул процессов камер с общей галереей только для чтения
+        Галерея публикуется в файлы, отображаемые в память каждым процессом (страницы
+        разделяются через кэш ОС); события распознавания собираются в одну очередь
+        главного процесса, который единственный записывает посещения
+        :param sources: Источники кадров (индексы камер, пути к видео, URL потоков)
+        :param snapshot_dir: Директория для публикации галереи
+        :param rois: Области интереса по номерам источников (parse_rois)
+        """
+        self.sources = sources
+        self.snapshot_dir = snapshot_dir
+        # spawn одинаково ведет себя на всех ОС и не копирует состояние Qt в дочерние процессы
+        self.ctx = mp.get_context('spawn')
+        self.generation = self.ctx.Value('i', 0)
+        self.preview_source = self.ctx.Value('i', 0)
+        self.rois = self.ctx.Array('d', FULL_FRAME * len(sources))
+        for source_index, roi in (rois or {}).items():
+            self.set_roi(source_index, roi)
+        self.result_queue = self.ctx.Queue()
+        self.preview_queue = self.ctx.Queue(maxsize=2)
+        self.stop_event = self.ctx.Event()
+        self.processes = []
+
+
+    def publish_gallery(self, gallery: FaceGallery):
+        """Публикация новой версии галереи; процессы камер подхватывают ее на следующем кадре"""
+        generation = self.generation.value + 1
+        gallery.save_snapshot(self.snapshot_dir, generation)
+        self.generation.value = generation
+
+
+    def set_roi(self, source_index: int, roi):
+        """Смена области интереса камеры (None - весь кадр)"""
+        if 0 <= source_index < len(self.sources):
+            self.rois[source_index * 4:source_index * 4 + 4] = list(roi or FULL_FRAME)
+
+
+    def start(self, gallery: FaceGallery):
+        """Публикация галереи и запуск процессов камер"""
+        self.publish_gallery(gallery)
+        self.stop_event.clear()
+        for source_index, source in enumerate(self.sources):
+            process = self.ctx.Process(
+                target=camera_worker,
+                args=(source_index, source, self.snapshot_dir, self.generation, self.preview_source,
+                      self.rois, self.result_queue, self.preview_queue, self.stop_event),
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+
+
+    def stop(self, timeout: float = 5.0):
+        """Остановка процессов камер"""
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+
+
+    def get_result(self, timeout: float = 0.0) -> Optional[tuple]:
+        """Следующее событие (индекс источника, тип, данные) или None"""
+        try:
+            return self.result_queue.get(timeout=timeout) if timeout else self.result_queue.get_nowait()
+        except queue.Empty:
+            return None
+
+
+    def get_preview_frame(self, timeout: float = 0.0):
+        """Следующий кадр предпросмотра выбранной камеры или None"""
+        try:
+            return self.preview_queue.get(timeout=timeout) if timeout else self.preview_queue.get_nowait()
+        except queue.Empty:
+            return None
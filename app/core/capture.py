@@ -0,0 +1,41 @@
+from typing import Tuple
+
+
+
+def parse_sources(value: str) -> list:
+    """
+    Разбор списка источников кадров из настроек
+    '0, 1, rtsp://host/stream' -> [0, 1, 'rtsp://host/stream'] (числа - индексы камер)
+    """
+    sources = [parse_source(item) for item in value.split(',') if item.strip()]
+    return sources or [0]
+
+
+def parse_source(value: str):
+    """Один источник кадров: число - индекс камеры, иначе путь или URL"""
+    value = value.strip()
+    return int(value) if value.isdigit() else value
+
+
+def capture_resolution(settings_manager) -> Tuple[int, int]:
+    """Разрешение захвата из настроек (0 - разрешение камеры по умолчанию)"""
+    return (int(settings_manager.get_setting('capture_width')),
+            int(settings_manager.get_setting('capture_height')))
+
+
+def open_capture(source, resolution: Tuple[int, int] = (0, 0)):
+    """
+    Открытие источника кадров с запросом разрешения захвата
+    Без запроса большинство камер отдают 640x480 - этого мало для распознавания удаленных лиц
+    :param source: Индекс камеры или путь/URL видеопотока
+    :param resolution: Желаемые (ширина, высота); для файлов и потоков игнорируется
+    """
+    # OpenCV импортируется при первом открытии камеры, а не при запуске приложения
+    import cv2
+
+    cap = cv2.VideoCapture(source)
+    width, height = resolution
+    if cap.isOpened() and isinstance(source, int) and width > 0 and height > 0:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    return cap
@@ -1,7 +1,7 @@
 import shutil
 import sqlite3
-from datetime import datetime
-from typing import List, Tuple
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
 import pytz
 from .paths import DB_EDUCATIONAL, DB_ENTERPRISE, FACES_IMG_DIR_EDUCATIONAL, FACES_IMG_DIR_ENTERPRISE
 
@@ -9,27 +9,45 @@ TIMEZONE = pytz.timezone('Asia/Yekaterinburg')
 
 
 
+class AttendanceEvent(NamedTuple):
+    """Одно посещение с данными пользователя"""
+    user_id: int
+    fullname: str
+    # Группа (Educational) или должность (Enterprise)
+    category: str
+    timestamp: datetime
+
+
+# Версия схемы БД (PRAGMA user_version), см. _migrate
+SCHEMA_VERSION = 1
+
+
+
 
 class DatabaseManager:
 
-    def __init__(self, institution_type: str):
+    def __init__(self, institution_type: str, db_path=None):
         """
         Инициализация класса для работы с базой данных с использованием sqlite3
         :param institution_type=Educational или Enterprise
+        :param db_path: Другой файл БД (например, для тестов производительности)
         """
         self.institution_type = institution_type
-        if self.institution_type == 'Educational':
-            self.conn = sqlite3.connect(DB_EDUCATIONAL)
-        
-        elif self.institution_type == 'Enterprise':
-            self.conn = sqlite3.connect(DB_ENTERPRISE)
-
-        else:
+        if self.institution_type not in ('Educational', 'Enterprise'):
             raise ValueError("Недопустимый тип учреждения. Допустимые значения: 'Educational', 'Enterprise'")
 
+        if db_path is None:
+            db_path = DB_EDUCATIONAL if self.institution_type == 'Educational' else DB_ENTERPRISE
+        self.conn = sqlite3.connect(db_path)
+
         self.conn.execute("PRAGMA foreign_keys = ON")
+        # WAL: чтение из GUI не блокируется записью посещений из другого потока;
+        # NORMAL - синхронизация с диском при контрольной точке, а не при каждой транзакции
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
         self.cursor = self.conn.cursor()
         self._create_tables()
+        self._migrate()
 
 
     def _create_tables(self):
@@ -41,6 +59,38 @@ class DatabaseManager:
             self._create_tables_enterprise()
 
 
+    def _migrate(self):
+        """
+        Обновление схемы существующей БД
+        1: время посещения приводится к формату 'YYYY-MM-DD HH:MM:SS', строки которого
+           сравниваются в хронологическом порядке: фильтры по дате записываются как
+           полуоткрытые диапазоны по timestamp и используют индекс (функции от столбца,
+           например DATE(timestamp), индекс не используют). Индексы по одному столбцу
+           заменяются составными (timestamp, user_id) и (user_id, timestamp)
+        """
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        print(f"Обновление схемы БД до версии {SCHEMA_VERSION}...")
+        try:
+            with self.conn:
+                if version < 1:
+                    self.cursor.execute('''
+                        UPDATE attendance SET timestamp = datetime(timestamp)
+                        WHERE datetime(timestamp) IS NOT NULL AND timestamp <> datetime(timestamp)
+                    ''')
+                    self.cursor.execute("DROP INDEX IF EXISTS idx_attendance_user")
+                    self.cursor.execute("DROP INDEX IF EXISTS idx_attendance_time")
+                self.cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            # Статистика для выбора индекса планировщиком (по выборке, чтобы не читать всю таблицу)
+            self.cursor.execute("PRAGMA analysis_limit = 1000")
+            self.cursor.execute("ANALYZE")
+
+        except sqlite3.Error as e:
+            print(f"Ошибка обновления схемы БД: {e}")
+
+
     def _create_tables_enterprise(self):
         """Создание таблиц для Enterprise"""
         try:
@@ -66,12 +116,12 @@ class DatabaseManager:
             ''')
 
             self.cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_attendance_user 
-                ON attendance(user_id)
+                CREATE INDEX IF NOT EXISTS idx_attendance_user_time
+                ON attendance(user_id, timestamp)
             ''')
             self.cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_attendance_time 
-                ON attendance(timestamp)
+                CREATE INDEX IF NOT EXISTS idx_attendance_time_user
+                ON attendance(timestamp, user_id)
             ''')
 
             self.conn.commit()
@@ -105,12 +155,12 @@ class DatabaseManager:
             ''')
 
             self.cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_attendance_user 
-                ON attendance(user_id)
+                CREATE INDEX IF NOT EXISTS idx_attendance_user_time
+                ON attendance(user_id, timestamp)
             ''')
             self.cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_attendance_time 
-                ON attendance(timestamp)
+                CREATE INDEX IF NOT EXISTS idx_attendance_time_user
+                ON attendance(timestamp, user_id)
             ''')
 
             self.conn.commit()
@@ -120,7 +170,7 @@ class DatabaseManager:
             self.conn.rollback()
 
 
-    def add_attendance_record(self, user_id: int):
+    def add_attendance_record(self, user_id: int) -> bool:
         """Добавление записи о посещении с текущим временем в SQL"""
         try:
             self.cursor.execute('''
@@ -128,10 +178,55 @@ class DatabaseManager:
                 VALUES (?, datetime('now', 'localtime'))
             ''', (user_id,))
             self.conn.commit()
+            return True
 
         except sqlite3.Error as e:
             print(f"Ошибка с добавлением записи о посещении: {e}")
             self.conn.rollback()
+            return False
+
+
+    def add_attendance_events(self, records: List[Tuple[int, str]]) -> int:
+        """
+        Добавление событий посещения одной транзакцией (очередь записи AttendanceWriter)
+        События удаленных пользователей пропускаются; ошибки sqlite3 передаются
+        вызывающему, чтобы пакет можно было записать повторно
+        :param records: Список (id пользователя, время 'YYYY-MM-DD HH:MM:SS')
+        Возвращает количество добавленных записей
+        """
+        with self.conn:
+            self.cursor.executemany('''
+                INSERT INTO attendance (user_id, timestamp)
+                SELECT ?1, ?2 WHERE EXISTS (SELECT 1 FROM users WHERE id = ?1)
+            ''', records)
+        return self.cursor.rowcount
+
+
+    def add_attendance_records(self, records: List[Tuple[int, str]]) -> int:
+        """
+        Добавление записей о посещении с заданным временем одной транзакцией
+        (загрузка записей с камер задним числом)
+        Запись пропускается, если у пользователя уже есть посещение в этот день
+        или пользователь удален
+        :param records: Список (id пользователя, время 'YYYY-MM-DD HH:MM:SS')
+        Возвращает количество добавленных записей
+        """
+        try:
+            with self.conn:
+                self.cursor.executemany('''
+                    INSERT INTO attendance (user_id, timestamp)
+                    SELECT ?1, ?2
+                    WHERE EXISTS (SELECT 1 FROM users WHERE id = ?1)
+                      AND NOT EXISTS (
+                          SELECT 1 FROM attendance
+                          WHERE user_id = ?1 AND timestamp >= date(?2) AND timestamp < date(?2, '+1 day')
+                      )
+                ''', records)
+            return self.cursor.rowcount
+
+        except sqlite3.Error as e:
+            print(f"Ошибка пакетного добавления записей о посещении: {e}")
+            return 0
 
 
     def add_user(self, user_data: dict) -> int:
@@ -194,30 +289,6 @@ class DatabaseManager:
             return -1
 
 
-    def get_attendance(self, start_date: str, end_date: str) -> List[Tuple]:
-        """Получение посещаемости с преобразованием времени"""
-        try:
-            self.cursor.execute('''
-                SELECT 
-                    u.id,
-                    u.lastname || ' ' || u.firstname || COALESCE(' ' || u.patronymic, '') AS fullname,
-                    GROUP_CONCAT(
-                        strftime('%d.%m.%Y %H:%M', datetime(timestamp)),
-                        '; '
-                    ) AS times
-                FROM attendance a
-                JOIN users u ON a.user_id = u.id
-                WHERE date(timestamp) BETWEEN ? AND ?
-                GROUP BY u.id
-                ORDER BY timestamp DESC
-            ''', (start_date, end_date))
-            return self.cursor.fetchall()
-        
-        except sqlite3.Error as e:
-            print(f"Ошибка с полученим посещаемости: {e}")
-            return []
-
-
     def get_today_attendance(self) -> List[Tuple]:
         """Получение посещаемости за текущий день"""
         if self.institution_type == 'Educational':
@@ -236,7 +307,7 @@ class DatabaseManager:
                     GROUP_CONCAT(a.timestamp, ', ') AS timestamps
                 FROM users u 
                 JOIN attendance a ON u.id = a.user_id
-                WHERE DATE(a.timestamp) = DATE(datetime('now', 'localtime'))
+                WHERE a.timestamp >= date('now', 'localtime') AND a.timestamp < date('now', 'localtime', '+1 day')
                 GROUP BY u.id;
             ''')
             return self.cursor.fetchall()
@@ -256,7 +327,7 @@ class DatabaseManager:
                     GROUP_CONCAT(a.timestamp, ', ') AS timestamps
                 FROM users u 
                 JOIN attendance a ON u.id = a.user_id
-                WHERE DATE(a.timestamp) = DATE(datetime('now', 'localtime'))
+                WHERE a.timestamp >= date('now', 'localtime') AND a.timestamp < date('now', 'localtime', '+1 day')
                 GROUP BY u.id;
             ''')
             return self.cursor.fetchall()
@@ -265,12 +336,57 @@ class DatabaseManager:
             return []
         
 
+    def get_attendance_marks(self, day: date) -> Dict[int, datetime]:
+        """
+        Время последней отметки каждого пользователя за день одним запросом
+        (сравнение строк времени использует индекс по timestamp)
+        """
+        try:
+            self.cursor.execute('''
+                SELECT user_id, MAX(timestamp) FROM attendance
+                WHERE timestamp >= ?1 AND timestamp < date(?1, '+1 day')
+                GROUP BY user_id
+            ''', (day.isoformat(),))
+            return {user_id: datetime.fromisoformat(timestamp) for user_id, timestamp in self.cursor.fetchall()}
+
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Ошибка получения отметок посещения: {e}")
+            return {}
+
+
+    def _date_ranges(self, day: int, month: Optional[int] = None, year: Optional[int] = None) -> List[Tuple[str, str]]:
+        """
+        Полуоткрытые диапазоны [начало дня, начало следующего дня) для частичной даты
+        Без года (месяца) перебираются годы (месяцы) от первой до последней записи о посещении
+        """
+        if year is not None:
+            years = [year]
+        else:
+            self.cursor.execute('''
+                SELECT (SELECT MIN(timestamp) FROM attendance), (SELECT MAX(timestamp) FROM attendance)
+            ''')
+            first, last = self.cursor.fetchone()
+            if first is None:
+                return []
+            years = range(int(first[:4]), int(last[:4]) + 1)
+
+        ranges = []
+        for y in years:
+            for m in ([month] if month is not None else range(1, 13)):
+                try:
+                    start = date(y, m, day)
+                except ValueError:
+                    continue  # 31 число в коротком месяце и т.п.
+                ranges.append((start.isoformat(), (start + timedelta(days=1)).isoformat()))
+        return ranges
+
+
     def has_attendance_today(self, user_id: int) -> bool:
         """Проверка, есть ли сегодняшняя запись о посещении для пользователя"""
         try:
             self.cursor.execute('''
                 SELECT COUNT(*) FROM attendance
-                WHERE user_id = ? AND DATE(timestamp) = DATE(datetime('now', 'localtime'))
+                WHERE user_id = ? AND timestamp >= date('now', 'localtime') AND timestamp < date('now', 'localtime', '+1 day')
             ''', (user_id,))
             count = self.cursor.fetchone()[0]
             return count > 0
@@ -297,128 +413,112 @@ class DatabaseManager:
             self.conn.rollback()
 
     
-    def get_attendance_by_date(self, date_input: str) -> List[Tuple]:
-        """Поиск записей о посещених по частичной дате (день, день.месяц, день.месяц.год)"""
-        try:
-            parts = date_input.split(".")
-            day, month, year = None, None, None
-
-            if len(parts) == 1:
-                day = parts[0].zfill(2)
-            elif len(parts) == 2:
-                day, month = parts
-                day = day.zfill(2)
-                month = month.zfill(2)
-            elif len(parts) == 3:
-                day, month, year = parts
-                day = day.zfill(2)
-                month = month.zfill(2)
-            else:
-                raise ValueError("Некорректный формат даты")
+    def iter_attendance_events(self, start_date: str, end_date: str,
+                               chunk_size: int = 1000) -> Iterator[List[AttendanceEvent]]:
+        """
+        Посещения за период (даты 'YYYY-MM-DD' включительно) частями по chunk_size событий
+        Одна строка на посещение, от новых к старым
+        Ошибка БД посреди чтения передается вызывающему (результат не обрезается молча)
+        """
+        return self._iter_events("a.timestamp >= ? AND a.timestamp < date(?, '+1 day')",
+                                 (start_date, end_date), chunk_size)
 
-            conditions = []
-            params = []
-            if day:
-                conditions.append("strftime('%d', a.timestamp) = ?")
-                params.append(day)
-            if month:
-                conditions.append("strftime('%m', a.timestamp) = ?")
-                params.append(month)
-            if year:
-                conditions.append("strftime('%Y', a.timestamp) = ?")
-                params.append(year)
-
-            if not conditions:
-                raise ValueError("Не указана дата")
-
-            query = f'''
-                SELECT
-                    u.id,
-                    u.lastname || ' ' || u.firstname || COALESCE(' ' || u.patronymic, '') AS fullname,
-                    GROUP_CONCAT(
-                        strftime('%d.%m.%Y %H:%M', a.timestamp),
-                        '; '
-                    ) AS times
-                FROM attendance a
+
+    def get_attendance_events(self, start_date: str, end_date: str) -> List[AttendanceEvent]:
+        """Посещения за период (даты 'YYYY-MM-DD' включительно) одним запросом"""
+        return self._collect_events("a.timestamp >= ? AND a.timestamp < date(?, '+1 day')", (start_date, end_date))
+
+
+    def count_attendance_events(self, start_date: str, end_date: str) -> int:
+        """Количество посещений за период (даты 'YYYY-MM-DD' включительно) по индексу времени"""
+        try:
+            self.cursor.execute('''
+                SELECT COUNT(*) FROM attendance a
                 JOIN users u ON a.user_id = u.id
-                WHERE {' AND '.join(conditions)}
-                GROUP BY u.id
-                ORDER BY a.timestamp DESC
-            '''
+                WHERE a.timestamp >= ? AND a.timestamp < date(?, '+1 day')
+            ''', (start_date, end_date))
+            return self.cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Ошибка подсчета посещений: {e}")
+            return 0
 
-            self.cursor.execute(query, params)
-            return self.cursor.fetchall()
+
+    def get_attendance_events_by_date(self, date_input: str) -> List[AttendanceEvent]:
+        """Посещения по частичной дате (день, день.месяц, день.месяц.год)"""
+        try:
+            parts = date_input.split(".")
+            if not 1 <= len(parts) <= 3:
+                raise ValueError("Некорректный формат даты")
+            day, month, year = (list(map(int, parts)) + [None, None])[:3]
 
         except ValueError as ve:
             print(f"Ошибка: {ve}")
             return []
-        except sqlite3.Error as e:
-            print(f"Ошибка при поиске по дате: {e}")
+
+        # Частичная дата - набор диапазонов по индексу времени вместо strftime от каждой записи
+        ranges = self._date_ranges(day, month, year)
+        if not ranges:
             return []
+        where = ' OR '.join(["(a.timestamp >= ? AND a.timestamp < ?)"] * len(ranges))
+        params = [bound for date_range in ranges for bound in date_range]
+        return self._collect_events(where, params)
 
 
-    def get_attendance_by_search(self, search_text):
-        """Поиск записей о посещених по фамилии, имени, отчеству, группе, позиции"""
-        if self.institution_type == 'Educational':
-            return self._get_attendance_by_search_educational(search_text)
-        
-        elif self.institution_type == 'Enterprise':
-            return self._get_attendance_by_search_enterprise(search_text)
-    
+    def get_attendance_events_by_search(self, search_text: str) -> List[AttendanceEvent]:
+        """Посещения пользователей, найденных по фамилии, имени, отчеству, группе (должности)"""
+        where = f'''
+            u.lastname LIKE ?1 OR u.firstname LIKE ?1
+            OR u.patronymic LIKE ?1 OR {self._category_column()} LIKE ?1
+        '''
+        return self._collect_events(where, (f"%{search_text}%",))
+
+
+    def _category_column(self) -> str:
+        """Группа студента или должность сотрудника"""
+        return 'u.group_name' if self.institution_type == 'Educational' else 'u.position'
+
 
-    def _get_attendance_by_search_enterprise(self, search_text):
-        """Поиск записей о посещених по фамилии, имени, отчеству или группе [Enterprise]"""
+    def _iter_events(self, where: str, params, chunk_size: int = 1000) -> Iterator[List[AttendanceEvent]]:
+        """
+        Посещения с данными пользователя одним запросом (без запроса группы/должности
+        на каждую запись), чтение частями из отдельного курсора
+        """
+        # Отдельный курсор: self.cursor может использоваться между чтениями частей
+        cursor = self.conn.cursor()
         try:
-            search_param = f"%{search_text}%"
-            self.cursor.execute('''
+            cursor.execute(f'''
                 SELECT
-                    u.id,
+                    a.user_id,
                     u.lastname || ' ' || u.firstname || COALESCE(' ' || u.patronymic, '') AS fullname,
-                    GROUP_CONCAT(
-                        strftime('%d.%m.%Y %H:%M', datetime(a.timestamp)), '; ') AS times
+                    {self._category_column()},
+                    a.timestamp
                 FROM attendance a
                 JOIN users u ON a.user_id = u.id
-                WHERE 
-                    u.lastname LIKE ? 
-                    OR u.firstname LIKE ?
-                    OR u.patronymic LIKE ?
-                    OR u.position LIKE ?
-                GROUP BY u.id
+                WHERE {where}
                 ORDER BY a.timestamp DESC
-            ''', (search_param, search_param, search_param, search_param))
-            return self.cursor.fetchall()
-        
-        except sqlite3.Error as e:
-            print(f"Ошибка при поиске [Enterprise]: {e}")
-            return []
+            ''', params)
+
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield [AttendanceEvent(user_id, fullname, category or "N/A", datetime.fromisoformat(timestamp))
+                       for user_id, fullname, category, timestamp in rows]
 
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Ошибка с получением посещаемости: {e}")
+            raise
+        finally:
+            cursor.close()
 
-    def _get_attendance_by_search_educational(self, search_text):
-        """Поиск записей о посещених по фамилии, имени, отчеству или группе [Educational]"""
+
+    def _collect_events(self, where: str, params) -> List[AttendanceEvent]:
+        """Все посещения по условию списком; при ошибке - пустой список, а не его начало"""
         try:
-            search_param = f"%{search_text}%"
-            self.cursor.execute('''
-                SELECT
-                    u.id,
-                    u.lastname || ' ' || u.firstname || COALESCE(' ' || u.patronymic, '') AS fullname,
-                    GROUP_CONCAT(
-                        strftime('%d.%m.%Y %H:%M', datetime(a.timestamp)), '; ') AS times
-                FROM attendance a
-                JOIN users u ON a.user_id = u.id
-                WHERE 
-                    u.lastname LIKE ? 
-                    OR u.firstname LIKE ?
-                    OR u.patronymic LIKE ?
-                    OR u.group_name LIKE ?
-                GROUP BY u.id
-                ORDER BY a.timestamp DESC
-            ''', (search_param, search_param, search_param, search_param))
-            return self.cursor.fetchall()
-        
-        except sqlite3.Error as e:
-            print(f"Ошибка при поиске [Educational]: {e}")
+            return [event for chunk in self._iter_events(where, params) for event in chunk]
+        except (sqlite3.Error, ValueError):
             return []
-    
+
 
     def get_all_users(self, search_query=None):
         """Получение всех пользователей с возможностью поиска"""
@@ -488,32 +588,15 @@ class DatabaseManager:
             return []
         
         
-    def get_user_position(self, user_id):
-        """Поиск должности сотрудника по id"""
+    def get_user_by_id(self, user_id: int):
+        """Получение пользователя по id (поля в том же порядке, что и в get_all_users)"""
         try:
-            self.cursor.execute('''
-                SELECT position FROM users WHERE id = ?
-            ''', (user_id,))
-            result = self.cursor.fetchone()
-            return result[0] if result else "N/A"
-        
-        except sqlite3.Error as e:
-            print(f"Ошибка при получении должности сотрудника: {e}")
-            return "N/A"
+            self.cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
+            return self.cursor.fetchone()
 
-
-    def get_user_group(self, user_id):
-        """Поиск группы пользователя по id"""
-        try:
-            self.cursor.execute('''
-                SELECT group_name FROM users WHERE id = ?
-            ''', (user_id,))
-            result = self.cursor.fetchone()
-            return result[0] if result else "N/A"
-        
         except sqlite3.Error as e:
-            print(f"Ошибка при получении группы пользователя: {e}")
-            return "N/A"
+            print(f"Ошибка при получении пользователя: {e}")
+            return None
 
 
     def delete_user(self, user_id: int) -> bool:
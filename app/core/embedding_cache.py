@@ -0,0 +1,243 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+
+CACHE_VERSION = 1
+
+
+
+class EmbeddingCache:
+
+    META_FILE = "embeddings.json"
+    JOURNAL_DIR = "journal"
+
+    def __init__(self, cache_dir: Path, model_name: str, det_size: Tuple[int, int]):
+        """
+        Версионированное хранилище эмбеддингов эталонных изображений
+        :param cache_dir: Директория кэша (по одной на тип учреждения)
+        :param model_name: Имя модели InsightFace, которой получены эмбеддинги
+        :param det_size: Размер входа детектора, при котором получены эмбеддинги
+        """
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.det_size = list(det_size)
+        self.generation = 0
+        self.entries: Dict[str, dict] = {}
+        self.user_keys: Dict[int, set] = {}
+        self.embeddings: Optional[np.ndarray] = None
+
+
+    @property
+    def journal_dir(self) -> Path:
+        return self.cache_dir / self.JOURNAL_DIR
+
+
+    def has_journal(self) -> bool:
+        """Есть ли изменения, еще не перенесенные в основной файл кэша"""
+        return self.journal_dir.exists() and any(self.journal_dir.glob("*.npz"))
+
+
+    def load(self) -> bool:
+        """
+        Загрузка кэша с диска (матрица эмбеддингов отображается в память)
+        и применение журнала изменений отдельных пользователей
+        Возвращает False, если кэш отсутствует или построен другой моделью
+        """
+        self.entries = {}
+        self.user_keys = {}
+        self.embeddings = None
+        meta_path = self.cache_dir / self.META_FILE
+
+        if not meta_path.exists():
+            return False
+
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+
+            self.generation = meta.get('generation', 0)
+            if (meta.get('version') != CACHE_VERSION or
+                    meta.get('model') != self.model_name or
+                    meta.get('det_size') != self.det_size):
+                print("Кэш эмбеддингов построен другой моделью и будет перестроен")
+                return False
+
+            data_path = self.cache_dir / meta['data_file']
+            if meta['entries'] and not data_path.exists():
+                print(f"Файл эмбеддингов {data_path} не найден, кэш будет перестроен")
+                return False
+
+            if data_path.exists():
+                self.embeddings = np.load(data_path, mmap_mode='r')
+            for entry in meta['entries']:
+                self._set_entry(entry)
+            self._apply_journal()
+            return True
+
+        except Exception as e:
+            print(f"Ошибка чтения кэша эмбеддингов: {str(e)}")
+            self.entries = {}
+            self.user_keys = {}
+            self.embeddings = None
+            return False
+
+
+    def lookup(self, key: str, img_path: Path) -> Tuple[bool, Optional[np.ndarray]]:
+        """
+        Поиск эмбеддинга изображения в кэше
+        Возвращает:
+            - True, если изображение не изменилось с момента последнего расчета
+            - Эмбеддинг (None, если лицо на изображении не было найдено)
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+
+        stat = img_path.stat()
+        if entry['mtime_ns'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+            return False, None
+
+        if 'embedding' in entry:
+            return True, entry['embedding']
+
+        if entry['row'] < 0:
+            return True, None
+
+        return True, self.embeddings[entry['row']]
+
+
+    def update_user(self, user_id: int, records: List[Tuple[str, Path, Optional[np.ndarray]]]):
+        """
+        Замена записей одного пользователя без перезаписи всего кэша:
+        изменения дописываются в журнал и переносятся в основной файл при полной загрузке
+        :param records: Список (ключ, путь к изображению, эмбеддинг или None); пустой - удаление
+        """
+        keys, mtimes, sizes, rows, embeddings = [], [], [], [], []
+        for key, img_path, embedding in records:
+            stat = img_path.stat()
+            keys.append(key)
+            mtimes.append(stat.st_mtime_ns)
+            sizes.append(stat.st_size)
+            rows.append(len(embeddings) if embedding is not None else -1)
+            if embedding is not None:
+                embeddings.append(np.asarray(embedding, dtype=np.float32))
+
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        seq = max((int(path.stem.split('_')[0]) for path in self.journal_dir.glob("*.npz")), default=0) + 1
+        journal_path = self.journal_dir / f"{seq:08d}_{user_id}.npz"
+        with open(journal_path, 'wb') as f:
+            np.savez(f,
+                     user_id=user_id,
+                     keys=np.array(keys, dtype=str),
+                     mtime_ns=np.array(mtimes, dtype=np.int64),
+                     sizes=np.array(sizes, dtype=np.int64),
+                     rows=np.array(rows, dtype=np.int64),
+                     embeddings=np.stack(embeddings) if embeddings else np.empty((0, 0), dtype=np.float32))
+
+        self._apply_journal_file(journal_path)
+
+
+    def save(self, records: List[Tuple[str, int, Path, Optional[np.ndarray]]]):
+        """
+        Сохранение кэша
+        :param records: Список (ключ, id пользователя, путь к изображению, эмбеддинг или None)
+        """
+        embeddings = []
+        entries = []
+
+        for key, user_id, img_path, embedding in records:
+            stat = img_path.stat()
+            row = -1
+            if embedding is not None:
+                row = len(embeddings)
+                embeddings.append(np.asarray(embedding, dtype=np.float32))
+
+            entries.append({
+                'path': key,
+                'user_id': user_id,
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'row': row
+            })
+
+        # Каждое сохранение пишет новый файл данных: текущий может быть
+        # отображен в память и не может быть перезаписан (Windows)
+        self.generation += 1
+        data_file = f"embeddings_{self.generation}.npy"
+        matrix = np.stack(embeddings) if embeddings else np.empty((0, 0), dtype=np.float32)
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_dir / data_file, 'wb') as f:
+            np.save(f, matrix)
+
+        meta = {
+            'version': CACHE_VERSION,
+            'model': self.model_name,
+            'det_size': self.det_size,
+            'generation': self.generation,
+            'data_file': data_file,
+            'entries': entries
+        }
+        meta_path = self.cache_dir / self.META_FILE
+        tmp_path = meta_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+        # Журнал перенесен в основной файл
+        for path in self.journal_dir.glob("*.npz"):
+            path.unlink()
+
+        self._remove_stale_files(data_file)
+        self.load()
+
+
+    def _set_entry(self, entry: dict):
+        """Добавление записи с учетом принадлежности пользователю"""
+        self.entries[entry['path']] = entry
+        self.user_keys.setdefault(entry['user_id'], set()).add(entry['path'])
+
+
+    def _apply_journal(self):
+        """Применение журнала изменений в порядке записи"""
+        if not self.journal_dir.exists():
+            return
+
+        for path in sorted(self.journal_dir.glob("*.npz")):
+            self._apply_journal_file(path)
+
+
+    def _apply_journal_file(self, path: Path):
+        """Замена записей пользователя записями из файла журнала"""
+        with np.load(path) as data:
+            user_id = int(data['user_id'])
+            for key in self.user_keys.pop(user_id, set()):
+                self.entries.pop(key, None)
+
+            embeddings = data['embeddings']
+            for key, mtime_ns, size, row in zip(data['keys'], data['mtime_ns'], data['sizes'], data['rows']):
+                entry = {
+                    'path': str(key),
+                    'user_id': user_id,
+                    'mtime_ns': int(mtime_ns),
+                    'size': int(size),
+                    'row': -1
+                }
+                if row >= 0:
+                    entry['embedding'] = embeddings[row]
+                self._set_entry(entry)
+
+
+    def _remove_stale_files(self, current_file: str):
+        """Удаление файлов данных предыдущих поколений"""
+        for path in self.cache_dir.glob("embeddings_*.npy"):
+            if path.name == current_file:
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                # Файл еще отображен в память, будет удален при следующем сохранении
+                pass
@@ -0,0 +1,189 @@
+import csv
+import gzip
+import os
+import re
+from typing import Callable, Dict, Optional
+from .database import AttendanceEvent, DatabaseManager
+
+
+# Поддерживаемые форматы по расширению файла
+EXPORT_FORMATS = ('.xlsx', '.csv', '.csv.gz')
+# Символы, недопустимые в названии листа Excel, и максимальная длина названия
+INVALID_SHEET_CHARS = re.compile(r'[\\/?*\[\]:]')
+MAX_SHEET_TITLE = 31
+
+
+
+def export_format(path: str) -> str:
+    """Формат экспорта по расширению файла (без известного расширения - xlsx)"""
+    lower = path.lower()
+    for extension in sorted(EXPORT_FORMATS, key=len, reverse=True):
+        if lower.endswith(extension):
+            return extension
+    return '.xlsx'
+
+
+def export_attendance(db: DatabaseManager, start_date: str, end_date: str, path: str,
+                      per_category: bool = False, chunk_size: int = 1000,
+                      progress: Optional[Callable[[int, int], None]] = None,
+                      should_stop: Optional[Callable[[], bool]] = None) -> Optional[int]:
+    """
+    Потоковый экспорт посещений за период: строки читаются из курсора частями
+    и сразу записываются в файл, поэтому память не зависит от длины периода
+    Файл пишется под временным именем и переименовывается только после успешной записи:
+    при ошибке БД, отмене или несовпадении числа строк с подсчитанным файл не создается
+    :param path: Файл .xlsx (режим write_only), .csv или .csv.gz
+    :param per_category: Отдельный лист для каждой группы/должности (только xlsx)
+    :param progress: Вызывается после каждой части с (записано, всего)
+    :param should_stop: Проверяется между частями; True - экспорт отменяется
+    :return: Количество записанных строк или None, если экспорт отменен
+    """
+    # Подсчет и чтение в одной транзакции видят один снимок БД (WAL), несмотря на запись посещений
+    db.conn.execute("BEGIN")
+    try:
+        return _export_snapshot(db, start_date, end_date, path, per_category, chunk_size, progress, should_stop)
+    finally:
+        db.conn.rollback()
+
+
+def _export_snapshot(db: DatabaseManager, start_date: str, end_date: str, path: str, per_category: bool,
+                     chunk_size: int, progress, should_stop) -> Optional[int]:
+    total = db.count_attendance_events(start_date, end_date)
+    category = "Группа" if db.institution_type == 'Educational' else "Должность"
+    header = ["ФИО", category, "Дата", "Время"]
+
+    temp_path = path + '.part'
+    file_format = export_format(path)
+    if file_format == '.xlsx':
+        writer = ExcelWriter(temp_path, header, per_category)
+    else:
+        writer = CsvWriter(temp_path, header, compress=file_format == '.csv.gz')
+
+    written = 0
+    try:
+        for chunk in db.iter_attendance_events(start_date, end_date, chunk_size):
+            if should_stop is not None and should_stop():
+                discard(writer, temp_path)
+                return None
+            for event in chunk:
+                writer.write(event)
+            written += len(chunk)
+            if progress is not None:
+                progress(written, max(total, written))
+
+        if written != total:
+            raise RuntimeError(f"Прочитано {written} записей из {total}, файл не сохранен")
+        writer.save()
+        os.replace(temp_path, path)
+        return written
+
+    except BaseException:
+        discard(writer, temp_path)
+        raise
+
+
+def discard(writer, temp_path: str):
+    """Прерванный экспорт: незаконченный файл удаляется"""
+    writer.close()
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+
+def event_row(event: AttendanceEvent) -> list:
+    return [event.fullname, event.category,
+            event.timestamp.strftime("%d.%m.%Y"), event.timestamp.strftime("%H:%M")]
+
+
+
+class ExcelWriter:
+
+    def __init__(self, path: str, header: list, per_category: bool = False):
+        """
+        Запись в книгу openpyxl в режиме write_only: строки сразу сбрасываются
+        во временные файлы листов и не хранятся в памяти
+        :param per_category: Лист на каждую группу/должность (листы создаются по мере появления)
+        """
+        from openpyxl import Workbook  # загружается только при экспорте
+
+        self.path = path
+        self.header = header
+        self.per_category = per_category
+        self.workbook = Workbook(write_only=True)
+        # группа/должность -> лист ('' - общий лист)
+        self.sheets: Dict[str, object] = {}
+        self.titles = set()
+
+
+    def write(self, event: AttendanceEvent):
+        key = event.category if self.per_category else ''
+        sheet = self.sheets.get(key)
+        if sheet is None:
+            sheet = self.workbook.create_sheet(self._sheet_title(key or "Посещаемость"))
+            sheet.append(self.header)
+            self.sheets[key] = sheet
+        sheet.append(event_row(event))
+
+
+    def save(self):
+        if not self.sheets:
+            self.write_header_only()
+        self.workbook.save(self.path)
+        self.sheets.clear()
+
+
+    def write_header_only(self):
+        """Пустой период: книга с одним листом заголовков"""
+        self.workbook.create_sheet("Посещаемость").append(self.header)
+
+
+    def close(self):
+        """
+        Прерванная запись: книга не сохраняется, временные файлы листов удаляются сразу,
+        а не при выходе из программы (файл книги удаляет вызывающий)
+        """
+        for sheet in self.sheets.values():
+            # Листы, уже записанные в книгу при сохранении, openpyxl удаляет сам
+            if not sheet.closed:
+                sheet.close()
+                sheet._writer.cleanup()
+        self.sheets.clear()
+
+
+    def _sheet_title(self, name: str) -> str:
+        """Допустимое и уникальное (без учета регистра) название листа"""
+        base = INVALID_SHEET_CHARS.sub('_', name).strip("' ")[:MAX_SHEET_TITLE] or "N_A"
+        title, number = base, 1
+        while title.lower() in self.titles:
+            number += 1
+            suffix = f" ({number})"
+            title = base[:MAX_SHEET_TITLE - len(suffix)] + suffix
+        self.titles.add(title.lower())
+        return title
+
+
+
+class CsvWriter:
+
+    def __init__(self, path: str, header: list, compress: bool = False):
+        """
+        Запись в CSV (при compress - в gzip) построчно
+        Разделитель ';' и BOM - файл открывается в Excel с русскими настройками без импорта
+        """
+        if compress:
+            self.file = gzip.open(path, 'wt', encoding='utf-8-sig', newline='')
+        else:
+            self.file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self.writer = csv.writer(self.file, delimiter=';')
+        self.writer.writerow(header)
+
+
+    def write(self, event: AttendanceEvent):
+        self.writer.writerow(event_row(event))
+
+
+    def save(self):
+        self.file.close()
+
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,39 @@
+import cv2
+import numpy as np
+
+
+# Дисперсия лапласиана, начиная с которой выровненное лицо 112x112 считается резким
+SHARPNESS_REFERENCE = 150.0
+
+
+
+def sharpness_score(aligned_face: np.ndarray) -> float:
+    """Резкость выровненного лица (дисперсия лапласиана), нормированная в [0, 1]"""
+    gray = cv2.cvtColor(aligned_face, cv2.COLOR_BGR2GRAY)
+    variance = cv2.Laplacian(gray, cv2.CV_64F).var()
+    return float(min(variance / SHARPNESS_REFERENCE, 1.0))
+
+
+def pose_score(kps: np.ndarray) -> float:
+    """
+    Фронтальность лица по 5 ключевым точкам (глаза, нос, углы рта) в [0, 1]
+    Учитывает поворот головы (смещение носа от центра между глазами) и наклон линии глаз
+    """
+    left_eye, right_eye, nose = kps[0], kps[1], kps[2]
+    eye_vector = right_eye - left_eye
+    eye_distance = np.linalg.norm(eye_vector)
+    if eye_distance < 1e-6:
+        return 0.0
+
+    eyes_center = (left_eye + right_eye) / 2
+    yaw = abs(float(np.dot(nose - eyes_center, eye_vector)) / eye_distance ** 2)
+    roll = abs(float(np.arctan2(eye_vector[1], eye_vector[0])))
+
+    yaw_score = max(0.0, 1.0 - yaw / 0.35)
+    roll_score = max(0.0, 1.0 - roll / np.radians(30))
+    return yaw_score * roll_score
+
+
+def sample_quality(aligned_face: np.ndarray, kps: np.ndarray, det_score: float) -> float:
+    """Итоговая оценка образца для регистрации: произведение резкости, фронтальности и уверенности детектора"""
+    return sharpness_score(aligned_face) * pose_score(kps) * float(det_score)
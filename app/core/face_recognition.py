@@ -1,104 +1,380 @@
+import threading
+from datetime import datetime
 import cv2
 import numpy as np
-from typing import List, Tuple, Optional
-from insightface.app import FaceAnalysis
-from .paths import FACES_IMG_DIR_ENTERPRISE, FACES_IMG_DIR_EDUCATIONAL
+from typing import Callable, List, Tuple, Optional
+from insightface.utils import face_align
+from .paths import (FACES_IMG_DIR_ENTERPRISE, FACES_IMG_DIR_EDUCATIONAL,
+                    FACES_CACHE_DIR_EDUCATIONAL, FACES_CACHE_DIR_ENTERPRISE)
 from .database import DatabaseManager
+from .embedding_cache import EmbeddingCache
+from .gallery import FaceGallery
+from .gallery_index import create_index
+from .face_quality import sample_quality
+from .tracking import FaceTracker
+from .motion import MotionGate
+from .presence import DailyPresence
+from .profiling import StageTimer
+from .roi import normalize_roi, roi_to_pixels
+from .capture import capture_resolution, open_capture
+from .model_loader import get_face_analysis, session_options_from_settings
 from ..settings.settings import SettingsManager
 
+# Размер выровненного лица на входе модели распознавания
+ALIGNED_FACE_SIZE = 112
 
 class FaceRecognizer:
 
-    def __init__(self, db: DatabaseManager, settings_manager: SettingsManager):
+    def __init__(self, db: Optional[DatabaseManager], settings_manager: SettingsManager,
+                 gallery: Optional[FaceGallery] = None, load_gallery: bool = True, load_model: bool = True):
         """
         Инициализация класса распознавания лиц с использованием InsightFace
-        :param db: Объект DatabaseManager для работы с базой данных
+        :param db: Объект DatabaseManager для работы с базой данных (None - только распознавание)
+        :param settings_manager: Объект SettingsManager с настройками
+        :param gallery: Готовая галерея (например, общая для процессов камер); иначе загружается из БД
+        :param load_gallery: False - галерея будет загружена позже вызовом load_known_faces
+                             (например, в фоновом потоке при запуске приложения)
+        :param load_model: False - модели загружаются при первом расчете эмбеддинга эталона
+                           (галерея из кэша эмбеддингов без сессий onnxruntime, например для публикации)
         """
-        self.settings_manager = SettingsManager()
+        self.settings_manager = settings_manager
         self.settings_manager.load_settings()
-
-        # Конфигурация
-        self.USE_GPU = True if self.settings_manager.get_setting('execution_provider') == "GPU" else False
-        self.MODEL_NAME = self.settings_manager.get_setting('model')
-        self.DET_SIZE = (320, 320)
-        self.REC_THRESHOLD = 0.5
-        self.max_faces = int(self.settings_manager.get_setting('max_faces'))
-        self.institution_type = self.settings_manager.get_setting('institution')
-        self.FRAME_SKIP = 1
+        self._read_settings()
         
         self.db = db
-        self.known_embeddings = []
-        self.known_users = []
-        self.last_detected_user = None
+        self.gallery = gallery if gallery is not None else FaceGallery(
+            index=self.create_gallery_index(),
+            index_path=self._get_cache_dir() / f"index_{self.INDEX_TYPE}.npz"
+        )
+        self.presence = DailyPresence(self.ATTENDANCE_COOLDOWN)
+        # Отложенная запись посещений (None - запись сразу в self.db)
+        self.attendance_writer = None
         self.frame_counter = 0
+        self.tracker = FaceTracker(max_misses=3 * (self.FRAME_SKIP + 1))
+        self.motion_gate = MotionGate(self.MOTION_MIN_AREA, self.MOTION_MAX_IDLE)
+        self.timings = StageTimer()
+        # Область интереса (доли кадра), None - весь кадр
+        self.roi = None
+        # Защищает галерею при распознавании в рабочем потоке
+        self.lock = threading.RLock()
+        self.embedding_cache = EmbeddingCache(self._get_cache_dir(), self.MODEL_NAME, self.DET_SIZE)
         
         # Инициализация модели
-        self._init_model()
-        self.load_known_faces()
+        self.model = self.det_model = self.rec_model = None
+        if load_model:
+            self._init_model()
+        if gallery is None and load_gallery:
+            self.load_known_faces()
         print("Создание объекта FaceRecognizer с макс. кол-вом лиц:", self.max_faces)
 
 
+    def _read_settings(self):
+        """Чтение конфигурации из настроек"""
+        self.USE_GPU = True if self.settings_manager.get_setting('execution_provider') == "GPU" else False
+        self.MODEL_NAME = self.settings_manager.get_setting('model')
+        self.DET_SIZE = (int(self.settings_manager.get_setting('det_size')),) * 2
+        self.CAPTURE_RESOLUTION = capture_resolution(self.settings_manager)
+        self.REC_THRESHOLD = 0.5
+        self.max_faces = int(self.settings_manager.get_setting('max_faces'))
+        self.FACE_PRIORITY = self.settings_manager.get_setting('face_priority')
+        self.QUANTIZATION = self.settings_manager.get_setting('quantization')
+        self.institution_type = self.settings_manager.get_setting('institution')
+        self.FRAME_SKIP = int(self.settings_manager.get_setting('frame_skip'))
+        self.CONFIRM_VOTES = int(self.settings_manager.get_setting('track_confirm_votes'))
+        self.RECHECK_INTERVAL = int(self.settings_manager.get_setting('track_recheck_interval'))
+        self.INDEX_TYPE = self.settings_manager.get_setting('gallery_index')
+        self.IVF_NLIST = int(self.settings_manager.get_setting('ivf_nlist'))
+        self.IVF_NPROBE = int(self.settings_manager.get_setting('ivf_nprobe'))
+        self.SESSION_OPTIONS = tuple(self.settings_manager.get_setting(key) for key in
+                                     ('intra_op_threads', 'inter_op_threads', 'graph_optimization', 'execution_mode'))
+        self.KEEP_SAMPLES = int(self.settings_manager.get_setting('registration_keep_samples'))
+        self.MOTION_MIN_AREA = float(self.settings_manager.get_setting('motion_min_area'))
+        self.MOTION_MAX_IDLE = float(self.settings_manager.get_setting('motion_max_idle'))
+        self.ATTENDANCE_COOLDOWN = float(self.settings_manager.get_setting('attendance_cooldown'))
+
+
+    def _model_key(self) -> tuple:
+        """Параметры, при изменении которых нужны другие модели"""
+        return self.MODEL_NAME, self.USE_GPU, self.DET_SIZE, self.QUANTIZATION, self.SESSION_OPTIONS
+
+
+    def _index_key(self) -> tuple:
+        """Параметры индекса галереи"""
+        return self.INDEX_TYPE, self.IVF_NLIST, self.IVF_NPROBE
+
+
+    def apply_settings(self) -> bool:
+        """
+        Применение измененных настроек к работающему распознавателю без его пересоздания
+        Отбор лиц, трекинг и датчик движения перенастраиваются сразу. Модели берутся
+        из реестра процесса и загружаются только при изменении модели, провайдера,
+        размера детектора, квантования или параметров сессий. Загрузка моделей и
+        построение нового индекса галереи идут без блокировки: распознавание продолжается
+        со старыми, замена выполняется под self.lock. Эмбеддинги галереи зависят от модели
+        и размера детектора (как и кэш эмбеддингов): только при их изменении галерея очищается
+        Возвращает True, если галерею нужно загрузить заново (load_known_faces)
+        """
+        self.settings_manager.load_settings()
+        model_key = self._model_key()
+        index_key = self._index_key()
+        embedding_key = (self.MODEL_NAME, self.DET_SIZE)
+        self._read_settings()
+
+        model = self._load_model() if self._model_key() != model_key else None
+        reload_gallery = (self.MODEL_NAME, self.DET_SIZE) != embedding_key
+        index_changed = self._index_key()[:2] != index_key[:2]
+        index_path = self._get_cache_dir() / f"index_{self.INDEX_TYPE}.npz"
+        index = self.create_gallery_index() if index_changed else None
+        if index is not None and not reload_gallery:
+            with self.lock:
+                gallery = self.gallery
+            version = gallery.prepare_index(index, index_path)
+
+        with self.lock:
+            self.tracker.max_misses = 3 * (self.FRAME_SKIP + 1)
+            self.motion_gate.min_area = self.MOTION_MIN_AREA
+            self.motion_gate.max_idle = self.MOTION_MAX_IDLE
+            self.presence.cooldown = self.ATTENDANCE_COOLDOWN
+
+            if model is not None:
+                self._set_model(model)
+                self.tracker.reset()
+
+            if reload_gallery:
+                # Старые эмбеддинги несравнимы с эмбеддингами новой модели
+                self.embedding_cache = EmbeddingCache(self._get_cache_dir(), self.MODEL_NAME, self.DET_SIZE)
+                if index is not None:
+                    self.gallery.index, self.gallery.index_path = index, index_path
+                self.gallery.build([], [], {})
+            elif index is not None:
+                # Галерея могла смениться (set_gallery) или измениться во время построения индекса
+                self.gallery.set_index(index, index_path, version if self.gallery is gallery else -1)
+            elif hasattr(self.gallery.index, 'nprobe'):
+                self.gallery.index.nprobe = self.IVF_NPROBE
+        return reload_gallery
+
+
+    def set_gallery(self, gallery: FaceGallery):
+        """Замена галереи (например, новой версией, опубликованной главным процессом)"""
+        with self.lock:
+            self.gallery = gallery
+
+
+    def set_attendance_writer(self, writer):
+        """
+        Запись посещений через очередь AttendanceWriter вместо прямой записи в БД
+        Посещения, которые не удалось записать, снимаются с отметок дня: пользователь
+        будет отмечен при следующем распознавании
+        """
+        self.attendance_writer = writer
+        writer.on_drop = self._unmark_dropped
+
+
+    def _unmark_dropped(self, events: list):
+        for user_id, timestamp in events:
+            self.presence.unmark(user_id, timestamp)
+
+
+    def set_roi(self, roi):
+        """Область кадра (x1, y1, x2, y2 в долях), передаваемая детектору; None - весь кадр"""
+        self.roi = normalize_roi(roi)
+
+
+    def get_snapshot_dir(self, name: str = "snapshot"):
+        """Директория для публикации галереи процессам (камер, пакетной обработки)"""
+        return self._get_cache_dir() / name
+
+
+    def create_gallery_index(self):
+        """Индекс галереи согласно настройкам"""
+        return create_index(self.INDEX_TYPE, nlist=self.IVF_NLIST, nprobe=self.IVF_NPROBE)
+
+
     def _init_model(self):
-        """Инициализация модели InsightFace"""
-        self.model = FaceAnalysis(
+        """Загрузка моделей при создании распознавателя"""
+        self._set_model(self._load_model())
+
+
+    def _load_model(self):
+        """Модели InsightFace из реестра процесса (загружаются при первом запросе)"""
+        return get_face_analysis(
             name=self.MODEL_NAME,
-            providers=['CUDAExecutionProvider'] if self.USE_GPU else ['CPUExecutionProvider'],
-            allowed_modules=['detection', 'recognition']
-        )
-        self.model.prepare(
-            ctx_id=0 if self.USE_GPU else -1,
-            det_size=self.DET_SIZE
+            use_gpu=self.USE_GPU,
+            det_size=self.DET_SIZE,
+            # Квантованные модели ускоряют только CPU
+            quantization='none' if self.USE_GPU else self.QUANTIZATION,
+            sess_options=session_options_from_settings(self.settings_manager)
         )
 
 
-    def load_known_faces(self):
-        """Загрузка известных лиц из базы данных"""
-        self.known_embeddings = []
-        self.known_users = []
+    def _set_model(self, model):
+        """Замена используемых моделей (при работающем распознавании - под self.lock)"""
+        self.model = model
+        self.det_model = model.det_model
+        self.rec_model = model.models['recognition']
 
-        users = self.db.get_all_users()
+
+    def load_known_faces(self, users: Optional[list] = None, progress: Optional[Callable[[int, int], None]] = None):
+        """
+        Загрузка известных лиц из базы данных (с использованием кэша эмбеддингов)
+        :param users: Пользователи из БД (если загрузка идет в другом потоке, чем создано
+                      соединение с БД, список читается вызывающим своим соединением)
+        :param progress: Функция (обработано пользователей, всего пользователей)
+        """
+        embeddings = []
+        embedding_user_ids = []
+        user_names = {}
+
+        if users is None:
+            users = self.db.get_all_users()
         print(f"Найдено пользователей в БД: {len(users)}")
 
-        for user in users:
+        self.embedding_cache.load()
+        records = []
+        embedded = 0
+
+        for done, user in enumerate(users):
+            if progress is not None:
+                progress(done, len(users))
             user_id = user[0]
-            
-            if self.institution_type == 'Educational':
-                user_folder = FACES_IMG_DIR_EDUCATIONAL / str(user_id)
-            elif self.institution_type == 'Enterprise':
-                user_folder = FACES_IMG_DIR_ENTERPRISE / str(user_id)
+            user_folder = self._get_user_folder(user_id)
 
             if not user_folder.exists():
                 print(f"Папка {user_folder} не существует!")
                 continue
 
+            user_names[user_id] = self._get_user_name(user)
+
             # Загрузка всех изображений пользователя
-            for img_path in user_folder.glob("*.jpg"):
-                print(f"Обработка файла: {img_path}")
+            for img_path in sorted(user_folder.glob("*.jpg")):
+                key = f"{user_id}/{img_path.name}"
                 try:
-                    img = cv2.imread(str(img_path))
-
-                    if img is None:
-                        print(f"Ошибка чтения файла: {img_path}")
+                    cached, embedding = self.embedding_cache.lookup(key, img_path)
+                    if not cached:
+                        print(f"Обработка файла: {img_path}")
+                        embedding = self._embed_image(img_path)
+                        embedded += 1
+
+                    records.append((key, user_id, img_path, embedding))
+                    if embedding is None:
                         continue
 
-                    faces = self.model.get(img)
-                    if not faces:
-                        print(f"Лица не найдены на изображении: {img_path}")
-                        continue
-                    
-                    # Используем первое найденное лицо
-                    embedding = faces[0].embedding
-                    self.known_embeddings.append(embedding)
-                    self.known_users.append({
-                        'id': user_id,
-                        'name': self._get_user_name(user),
-                        'path': img_path
-                    })
+                    embeddings.append(embedding)
+                    embedding_user_ids.append(user_id)
 
                 except Exception as e:
                     print(f"Ошибка обработки {img_path}: {str(e)}")
 
-        print(f"Итого загружено эмбеддингов: {len(self.known_embeddings)}")
+        # Кэш перезаписывается только при добавлении, изменении или удалении изображений,
+        # а также для переноса журнала инкрементальных изменений в основной файл
+        if (embedded or self.embedding_cache.has_journal() or
+                {record[0] for record in records} != set(self.embedding_cache.entries)):
+            try:
+                self.embedding_cache.save(records)
+            except Exception as e:
+                print(f"Ошибка сохранения кэша эмбеддингов: {str(e)}")
+
+        with self.lock:
+            self.gallery.build(embeddings, embedding_user_ids, user_names)
+        print(f"Итого загружено эмбеддингов: {len(self.gallery)} (рассчитано заново: {embedded})")
+
+
+    def add_user(self, user_id: int, records: Optional[list] = None) -> bool:
+        """
+        Добавление (обновление) одного пользователя в галерею без полной перезагрузки
+        :param records: Готовые образцы (ключ, путь, эмбеддинг); если не заданы - читаются из папки пользователя
+        Возвращает False, если у пользователя нет ни одного пригодного образца
+        """
+        user = self.db.get_user_by_id(user_id)
+        if user is None:
+            print(f"Пользователь ID {user_id} не найден в БД")
+            return False
+
+        if records is None:
+            records = self._embed_user_folder(user_id)
+        embeddings = [embedding for _, _, embedding in records if embedding is not None]
+
+        try:
+            self.embedding_cache.update_user(user_id, records)
+        except Exception as e:
+            print(f"Ошибка обновления кэша эмбеддингов: {str(e)}")
+
+        with self.lock:
+            self.gallery.add_user(user_id, self._get_user_name(user), embeddings)
+        print(f"Пользователь ID {user_id} добавлен в галерею, образцов: {len(embeddings)}")
+        return bool(embeddings)
+
+
+    def _embed_user_folder(self, user_id: int) -> list:
+        """Эмбеддинги всех образцов пользователя (с использованием кэша)"""
+        user_folder = self._get_user_folder(user_id)
+        records = []
+
+        for img_path in sorted(user_folder.glob("*.jpg")) if user_folder.exists() else []:
+            key = f"{user_id}/{img_path.name}"
+            try:
+                cached, embedding = self.embedding_cache.lookup(key, img_path)
+                if not cached:
+                    embedding = self._embed_image(img_path)
+                records.append((key, img_path, embedding))
+
+            except Exception as e:
+                print(f"Ошибка обработки {img_path}: {str(e)}")
+
+        return records
+
+
+    def remove_user(self, user_id: int):
+        """Удаление пользователя из галереи и кэша без полной перезагрузки"""
+        with self.lock:
+            self.gallery.remove_user(user_id)
+            self.tracker.forget_user(user_id)
+        self.presence.forget(user_id)
+
+        try:
+            self.embedding_cache.update_user(user_id, [])
+        except Exception as e:
+            print(f"Ошибка обновления кэша эмбеддингов: {str(e)}")
+
+
+    def _embed_image(self, img_path) -> Optional[np.ndarray]:
+        """Расчет эмбеддинга по эталонному изображению"""
+        img = cv2.imread(str(img_path))
+
+        if img is None:
+            print(f"Ошибка чтения файла: {img_path}")
+            return None
+
+        if self.model is None:
+            self._init_model()
+
+        # Выровненные при регистрации лица подаются сразу в модель распознавания
+        if img.shape[:2] == (ALIGNED_FACE_SIZE, ALIGNED_FACE_SIZE):
+            return self.model.models['recognition'].get_feat(img).flatten()
+
+        faces = self.model.get(img)
+        if not faces:
+            print(f"Лица не найдены на изображении: {img_path}")
+            return None
+
+        # Используем первое найденное лицо
+        return faces[0].embedding
+
+
+    def _get_user_folder(self, user_id: int):
+        """Папка с эталонными изображениями пользователя"""
+        if self.institution_type == 'Educational':
+            return FACES_IMG_DIR_EDUCATIONAL / str(user_id)
+        elif self.institution_type == 'Enterprise':
+            return FACES_IMG_DIR_ENTERPRISE / str(user_id)
+
+
+    def _get_cache_dir(self):
+        """Директория кэша эмбеддингов для текущего типа учреждения"""
+        if self.institution_type == 'Educational':
+            return FACES_CACHE_DIR_EDUCATIONAL
+        elif self.institution_type == 'Enterprise':
+            return FACES_CACHE_DIR_ENTERPRISE
 
 
     def _get_user_name(self, user):
@@ -123,125 +399,305 @@ class FaceRecognizer:
 
     def process_frame(self, frame: np.ndarray) -> Tuple[np.ndarray, list]:
         """
-        Обработка кадра и распознавание лиц
+        Обработка кадра и распознавание лиц (синхронно, с отметкой посещения)
         Возвращает:
             - Обработанный кадр с визуализацией
             - Список распознанных пользователей
         """
+        results = self.analyze_frame(frame)
+        recognized = [result for result in results if result['recognized']]
+        self.mark_attendance(recognized)
 
-        self.frame_counter += 1
         processed_frame = frame.copy()
-        recognized = []
+        self.draw_results(processed_frame, results)
+        return processed_frame, recognized
+
+
+    def analyze_frame(self, frame: np.ndarray) -> list:
+        """
+        Детекция, трекинг и распознавание лиц без побочных эффектов (можно вызывать из рабочего потока)
+        Детектор запускается на уменьшенной области интереса на каждом (FRAME_SKIP + 1)-м
+        кадре, между ними рамки треков сдвигаются по прогнозу. Если в кадре нет треков и нет движения, детекция
+        не запускается (не реже одного раза в MOTION_MAX_IDLE секунд). Модель распознавания
+        запускается только для треков, голосование которых не завершено, а также для периодической
+        перепроверки подтвержденных и неизвестных: все такие лица кадра обрабатываются одним вызовом
+        Треки изменяются под self.lock: их сбрасывают remove_user и apply_settings из других потоков
+        Время этапов накапливается в self.timings
+        Возвращает список всех отслеживаемых лиц с полями
+        track_id, user_id, user_name, similarity, bbox, recognized
+        """
+        self.frame_counter += 1
         
-        # Пропуск кадров для оптимизации
-        # if self.frame_counter % (self.FRAME_SKIP + 1) != 0:
-        #     return processed_frame, recognized
+        # Пропуск детекции между кадрами: рамки сдвигаются по прогнозу трекера
+        if self.frame_counter % (self.FRAME_SKIP + 1) != 0:
+            with self.lock:
+                return self._track_results(self.tracker.predict())
+
+        # Проверка движения и детектор видят только область интереса камеры
+        x1, y1, x2, y2 = roi_to_pixels(self.roi, frame.shape)
+        region = frame[y1:y2, x1:x2]
+
+        # Статичный кадр без лиц (пустой коридор) пропускается без вызова модели
+        with self.lock:
+            has_tracks = bool(self.tracker.tracks)
+        if not self.motion_gate.should_process(region, force=has_tracks):
+            return []
         
         # Детекция лиц
-        faces = self.model.get(frame)
-        
-        for face in faces[:self.max_faces]:
-            bbox = face.bbox.astype(int)
-            similarity, user_id, user_name = self._recognize_face(face.embedding)
-            
-            # Отрисовка результатов
-            color = (0, 255, 0) if similarity >= self.REC_THRESHOLD else (0, 0, 255)
-            label = f"{user_name} ({similarity:.2f})" if similarity >= self.REC_THRESHOLD else "Неизвестный"
+        with self.timings.measure('detect'):
+            bboxes, kpss = self._detect(region)
+        bboxes, kpss = self._select_faces(region, bboxes, kpss)
+        if x1 or y1:
+            # Координаты области -> координаты кадра (трекинг, выравнивание и отрисовка)
+            bboxes[:, :4] += np.array([x1, y1, x1, y1], dtype=np.float32)
+            if kpss is not None:
+                kpss = kpss + np.array([x1, y1], dtype=np.float32)
+        with self.lock:
+            updated = self.tracker.update(bboxes[:, :4], kpss, bboxes[:, 4])
+            # Распознавание только для треков, которым оно нужно
+            pending = [track for track in updated if track.needs_recognition(self.RECHECK_INTERVAL)]
+
+        if pending:
+            embeddings = self._embed_tracks(frame, pending)
+
+            # Сопоставление всех лиц кадра с галереей одним матричным умножением
+            with self.timings.measure('match'), self.lock:
+                match_ids, match_scores = self.match_faces(embeddings)
+
+                for track, user_id, similarity in zip(pending, match_ids[:, 0], match_scores[:, 0]):
+                    user_id = int(user_id) if similarity >= self.REC_THRESHOLD else -1
+                    track.add_vote(user_id, float(similarity), self.CONFIRM_VOTES)
+
+        with self.lock:
+            return self._track_results(self.tracker.tracks)
+
+
+    def _detect(self, frame: np.ndarray):
+        """
+        Детекция на уменьшенном кадре с пересчетом координат в исходный кадр
+        Кадр сжимается до DET_SIZE с усреднением пикселей (INTER_AREA): детектор иначе
+        сжимает его сам билинейной интерполяцией, и мелкие лица на кадре высокого
+        разрешения теряются из-за алиасинга. Выравнивание и распознавание затем
+        выполняются по исходному кадру полного разрешения
+        """
+        height, width = frame.shape[:2]
+        scale = min(self.DET_SIZE[0] / width, self.DET_SIZE[1] / height)
+        if scale >= 1.0:
+            return self.det_model.detect(frame, max_num=0, metric='default')
+
+        small = cv2.resize(frame, (int(round(width * scale)), int(round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+        bboxes, kpss = self.det_model.detect(small, max_num=0, metric='default')
+        restore = np.array([width / small.shape[1], height / small.shape[0]], dtype=np.float32)
+        bboxes[:, :4] *= np.tile(restore, 2)
+        if kpss is not None:
+            kpss = kpss * restore
+        return bboxes, kpss
+
+
+    def _select_faces(self, frame: np.ndarray, bboxes: np.ndarray, kpss: Optional[np.ndarray]):
+        """
+        Отбор не более max_faces лиц до распознавания, чтобы стоимость кадра
+        ограничивалась настройкой, а не количеством людей в кадре
+        Приоритет (FACE_PRIORITY): size - крупные (ближние) лица, center - крупные
+        и близкие к центру кадра, score - уверенность детектора
+        """
+        if self.max_faces <= 0 or bboxes.shape[0] <= self.max_faces:
+            return bboxes, kpss
+
+        area = (bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])
+        if self.FACE_PRIORITY == 'score':
+            priority = bboxes[:, 4]
+        elif self.FACE_PRIORITY == 'center':
+            # Та же метрика, что и у детектора InsightFace: площадь минус штраф за удаление от центра
+            center = np.array([frame.shape[1], frame.shape[0]], dtype=np.float32) / 2
+            offset = (bboxes[:, 0:2] + bboxes[:, 2:4]) / 2 - center
+            priority = area - 2.0 * np.sum(offset ** 2, axis=1)
+        else:
+            priority = area
+
+        order = np.argsort(-priority)[:self.max_faces]
+        return bboxes[order], kpss[order] if kpss is not None else None
+
+
+    def _embed_tracks(self, frame: np.ndarray, tracks: list) -> np.ndarray:
+        """Эмбеддинги лиц треков по ключевым точкам последней детекции"""
+        return self._embed_faces(frame, [track.kps for track in tracks])
+
+
+    def _embed_faces(self, frame: np.ndarray, kpss) -> np.ndarray:
+        """
+        Эмбеддинги лиц по ключевым точкам: выровненные лица собираются
+        в один батч и проходят через модель одним вызовом
+        """
+        with self.timings.measure('align'):
+            aligned = [face_align.norm_crop(frame, landmark=kps, image_size=ALIGNED_FACE_SIZE) for kps in kpss]
+        with self.timings.measure('embed'):
+            return self.rec_model.get_feat(aligned)
+
+
+    def identify_faces(self, frame: np.ndarray) -> List[Tuple[int, float]]:
+        """
+        Распознавание лиц отдельного кадра без трекинга (пакетная обработка записей,
+        где кадры берутся с большим шагом и треки между ними не строятся)
+        Возвращает список (id пользователя, схожесть) для лиц, прошедших порог
+        """
+        with self.timings.measure('detect'):
+            bboxes, kpss = self._detect(frame)
+        bboxes, kpss = self._select_faces(frame, bboxes, kpss)
+        if bboxes.shape[0] == 0 or kpss is None:
+            return []
+
+        embeddings = self._embed_faces(frame, kpss)
+        with self.timings.measure('match'), self.lock:
+            match_ids, match_scores = self.match_faces(embeddings)
+        return [(int(user_id), float(similarity))
+                for user_id, similarity in zip(match_ids[:, 0], match_scores[:, 0])
+                if user_id >= 0 and similarity >= self.REC_THRESHOLD]
+
+
+    def _track_results(self, tracks) -> list:
+        """Преобразование треков в результаты распознавания"""
+        results = []
+        with self.lock:
+            for track in tracks:
+                # Треки, не найденные на последней детекции, не отображаются
+                if track.misses > self.FRAME_SKIP:
+                    continue
+                results.append({
+                    'track_id': track.track_id,
+                    'user_id': track.user_id if track.confirmed else -1,
+                    'user_name': self.gallery.get_user_name(track.user_id) if track.confirmed else "",
+                    'similarity': track.similarity,
+                    'bbox': track.bbox.astype(int),
+                    'recognized': track.confirmed
+                })
+        return results
+
+
+    def draw_results(self, frame: np.ndarray, results: list):
+        """Отрисовка рамок и подписей распознанных лиц на кадре"""
+        for result in results:
+            bbox = result['bbox']
+            color = (0, 255, 0) if result['recognized'] else (0, 0, 255)
+            label = f"{result['user_name']} ({result['similarity']:.2f})" if result['recognized'] else "Неизвестный"
             
-            cv2.rectangle(processed_frame, 
+            cv2.rectangle(frame, 
                          (bbox[0], bbox[1]), 
                          (bbox[2], bbox[3]), 
                          color, 2)
 
-            cv2.putText(processed_frame, label,
+            cv2.putText(frame, label,
                    (bbox[0], bbox[1]-10),
                    cv2.FONT_HERSHEY_COMPLEX, 0.6, color, 1)
-            
-            if similarity >= self.REC_THRESHOLD:
-                recognized.append({
-                    'user_id': user_id,
-                    'user_name': user_name,
-                    'similarity': similarity,
-                    'bbox': bbox
-                })
-                self._handle_recognized_user(user_id)
-        
-        return processed_frame, recognized
+
+
+    def mark_attendance(self, recognized: list):
+        """Отметка посещения распознанных пользователей (работает с БД, вызывается из потока GUI)"""
+        for result in recognized:
+            self._handle_recognized_user(result['user_id'])
+
+
+    def match_faces(self, embeddings: np.ndarray, top_k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Пакетное сопоставление эмбеддингов лиц с галереей
+        Возвращает:
+            - Матрица (M, k) id пользователей
+            - Матрица (M, k) косинусной схожести
+        """
+        return self.gallery.match(embeddings, top_k)
 
 
     def _recognize_face(self, embedding: np.ndarray) -> Tuple[float, int, str]:
         """Сравнение с эталонными образцами"""
 
-        if not self.known_embeddings:
+        if len(self.gallery) == 0:
             return 0.0, -1, ""
 
-        # Нормализация эмбеддингов
-        embedding = embedding / np.linalg.norm(embedding)
-        known_embeddings_norm = [e / np.linalg.norm(e) for e in self.known_embeddings]
-
-        # Вычисление косинусной схожести
-        similarities = np.dot(known_embeddings_norm, embedding)
-        best_match_idx = np.argmax(similarities)
-        max_similarity = similarities[best_match_idx]
+        match_ids, match_scores = self.match_faces(embedding)
+        max_similarity = float(match_scores[0, 0])
 
         if max_similarity >= self.REC_THRESHOLD:
-
-            user = self.known_users[best_match_idx]
-            return max_similarity, user['id'], user['name']
+            user_id = int(match_ids[0, 0])
+            return max_similarity, user_id, self.gallery.get_user_name(user_id)
 
         return max_similarity, -1, ""
 
 
     def _handle_recognized_user(self, user_id: int):
-        """Обработка распознанного пользователя"""
+        """
+        Обработка распознанного пользователя
+        Отметки дня хранятся в памяти (self.presence): БД запрашивается один раз в день,
+        запись выполняется только для неотмеченных пользователей
+        """
+        now = datetime.now()
+        if self.presence.needs_reload(now):
+            self._load_presence(now.date())
 
-        if self.last_detected_user != user_id:
-            if not self.db.has_attendance_today(user_id):
-                try:
-                    self.db.add_attendance_record(user_id)
-                    self.last_detected_user = user_id
+        if not self.presence.should_mark(user_id, now):
+            return
 
-                except Exception as e:
-                    print(f"Ошибка записи посещения: {str(e)}")
+        if self.attendance_writer is not None:
+            # Отметка ставится до постановки в очередь: снятие при сбое записи ее не опередит
+            self.presence.mark(user_id, now)
+            self.attendance_writer.add(user_id, now)
+            return
+
+        try:
+            if self.db.add_attendance_record(user_id):
+                self.presence.mark(user_id, now)
+
+        except Exception as e:
+            print(f"Ошибка записи посещения: {str(e)}")
+
+
+    def _load_presence(self, day):
+        """
+        Загрузка отметок дня из БД вместе с посещениями, еще ожидающими в очереди записи
+        (ожидающие читаются до БД: записанное между двумя чтениями уже будет в БД)
+        """
+        pending = self.attendance_writer.pending_marks(day) if self.attendance_writer is not None else {}
+        marks = self.db.get_attendance_marks(day)
+        for user_id, timestamp in pending.items():
+            marks[user_id] = max(marks.get(user_id, timestamp), timestamp)
+        self.presence.load(day, marks)
 
 
     def register_new_user(self, user_id: int, num_samples: int = 10) -> bool:
         """
         Регистрация нового пользователя
+        Эмбеддинги считаются по полному кадру во время захвата, на диск сохраняются
+        только лучшие выровненные лица 112x112 (повторная детекция не требуется)
         Возвращает:
             True - регистрация успешна
             False - ошибка регистрации
         """
 
-        if self.institution_type == 'Educational':
-            user_folder = FACES_IMG_DIR_EDUCATIONAL / str(user_id)
-        elif self.institution_type == 'Enterprise':
-            user_folder = FACES_IMG_DIR_ENTERPRISE / str(user_id)
-
+        user_folder = self._get_user_folder(user_id)
         user_folder.mkdir(parents=True, exist_ok=True)
 
-        cap = cv2.VideoCapture(0)
+        cap = open_capture(0, self.CAPTURE_RESOLUTION)
 
         if not cap.isOpened():
             return False
 
-        samples = 0
-        while samples < num_samples:
+        candidates = []
+        while len(candidates) < num_samples:
             ret, frame = cap.read()
             if not ret:
                 continue
 
-            # Детекция лиц
+            # Детекция лиц и расчет эмбеддингов
             faces = self.model.get(frame)
             if faces:
-                face = faces[0]
+                # Регистрируется самое крупное лицо в кадре
+                face = max(faces, key=lambda f: (f.bbox[2] - f.bbox[0]) * (f.bbox[3] - f.bbox[1]))
                 bbox = face.bbox.astype(int)
                 
-                # Сохранение образца
-                face_img = frame[bbox[1]:bbox[3], bbox[0]:bbox[2]]
-                img_path = user_folder / f"sample_{samples}.jpg"
-                cv2.imwrite(str(img_path), face_img)
-                samples += 1
+                # Оценка образца по выровненному лицу
+                aligned = face_align.norm_crop(frame, landmark=face.kps, image_size=ALIGNED_FACE_SIZE)
+                quality = sample_quality(aligned, face.kps, face.det_score)
+                candidates.append((quality, aligned, face.embedding))
                 
                 # Визуальная обратная связь
                 cv2.rectangle(frame, 
@@ -249,7 +705,7 @@ class FaceRecognizer:
                              (bbox[2], bbox[3]), 
                              (0, 255, 0), 2)
 
-                cv2.putText(frame, f"Собрано образцов: {samples}/{num_samples}",
+                cv2.putText(frame, f"Собрано образцов: {len(candidates)}/{num_samples}",
                            (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
             
             cv2.imshow("Регистрация пользователя", frame)
@@ -259,7 +715,25 @@ class FaceRecognizer:
 
         cap.release()
         cv2.destroyAllWindows()
-        self.load_known_faces()
-        return samples >= num_samples
 
+        if len(candidates) < num_samples:
+            return False
 
+        # Образцы прошлой регистрации удаляются: при меньшем registration_keep_samples
+        # старые sample_K.jpg и далее иначе попали бы в галерею при полной перезагрузке
+        for old_sample in user_folder.glob("sample_*.jpg"):
+            try:
+                old_sample.unlink()
+            except OSError as e:
+                print(f"Ошибка удаления старого образца {old_sample}: {str(e)}")
+
+        # Сохранение лучших образцов
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        records = []
+        for rank, (quality, aligned, embedding) in enumerate(candidates[:self.KEEP_SAMPLES]):
+            img_path = user_folder / f"sample_{rank}.jpg"
+            cv2.imwrite(str(img_path), aligned)
+            records.append((f"{user_id}/{img_path.name}", img_path, embedding))
+            print(f"Образец {img_path.name}: качество {quality:.3f}")
+
+        return self.add_user(user_id, records)
@@ -0,0 +1,42 @@
+import threading
+from collections import deque
+from typing import Any, Optional
+
+
+
+class LatestFrameQueue:
+
+    def __init__(self, maxsize: int = 1):
+        """
+        Ограниченная очередь кадров: при переполнении отбрасывается самый старый кадр,
+        поэтому потребитель всегда получает самые свежие кадры и задержка не накапливается
+        :param maxsize: Максимальное количество ожидающих кадров
+        """
+        self._items = deque(maxlen=maxsize)
+        self._condition = threading.Condition()
+        self.dropped = 0
+
+
+    def put(self, item: Any):
+        """Добавление кадра (старый кадр вытесняется, если очередь заполнена)"""
+        with self._condition:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._condition.notify()
+
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """Получение самого старого из ожидающих кадров (None по истечении таймаута)"""
+        with self._condition:
+            if not self._items:
+                self._condition.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+
+    def clear(self):
+        """Очистка очереди"""
+        with self._condition:
+            self._items.clear()
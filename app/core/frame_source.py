@@ -0,0 +1,65 @@
+import time
+from pathlib import Path
+from typing import Iterator
+import cv2
+import numpy as np
+from .capture import open_capture
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+
+def is_live_source(source) -> bool:
+    """Камера или сетевой поток (кадры нужно успевать забирать, устаревшие можно пропускать)"""
+    return isinstance(source, int) or '://' in str(source)
+
+
+def is_image_dir(source) -> bool:
+    return not isinstance(source, int) and Path(source).is_dir()
+
+
+def list_images(directory) -> list:
+    """Изображения папки в порядке имен (обычно совпадает с порядком съемки)"""
+    return sorted(path for path in Path(directory).iterdir() if path.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def iter_frames(source, resolution=(0, 0), stride: int = 1, should_stop=None) -> Iterator[np.ndarray]:
+    """
+    Последовательное чтение кадров источника без пропусков
+    (видеофайл, папка с изображениями, а также камера или поток)
+    :param stride: Обрабатывается каждый stride-й кадр (пропущенные кадры не декодируются)
+    :param should_stop: Функция без аргументов; True - прервать чтение
+    """
+    should_stop = should_stop or (lambda: False)
+
+    if is_image_dir(source):
+        for path in list_images(source)[::stride]:
+            if should_stop():
+                return
+            frame = cv2.imread(str(path))
+            if frame is None:
+                print(f"Не удалось прочитать изображение {path}")
+                continue
+            yield frame
+        return
+
+    cap = open_capture(source, resolution)
+    if not cap.isOpened():
+        print(f"Источник {source} недоступен!")
+        return
+
+    try:
+        while not should_stop():
+            ret, frame = cap.read()
+            if not ret:
+                if is_live_source(source):
+                    time.sleep(0.01)
+                    continue
+                return
+            yield frame
+            for _ in range(stride - 1):
+                if not cap.grab():
+                    break
+    finally:
+        cap.release()
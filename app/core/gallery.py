@@ -0,0 +1,305 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .gallery_index import ExactIndex
+
+
+
+class FaceGallery:
+
+    def __init__(self, index=None, index_path: Optional[Path] = None):
+        """
+        Галерея эталонных эмбеддингов в виде одной нормализованной матрицы float32
+        :param index: Индекс для поиска ближайших соседей (по умолчанию точный перебор)
+        :param index_path: Файл для сохранения индекса между запусками
+        """
+        self.index = index if index is not None else ExactIndex()
+        self.index_path = index_path
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self.row_user_ids = np.empty(0, dtype=np.int64)
+        self.max_samples_per_user = 0
+        self.user_names: Dict[int, str] = {}
+
+        # Буферы с запасом емкости: matrix и row_user_ids - их срезы,
+        # поэтому добавление пользователя не копирует всю галерею
+        self._buffer = self.matrix
+        self._user_buffer = self.row_user_ids
+        # Строки, сгруппированные по пользователю, для точного поиска (пересчитываются после изменений)
+        self._groups: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        # Номер версии содержимого, увеличивается при каждом изменении
+        self.version = 0
+
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+
+    def build(self, embeddings: List[np.ndarray], user_ids: List[int], user_names: Dict[int, str]):
+        """
+        Пересборка матрицы галереи и индекса
+        :param embeddings: Эмбеддинги эталонных изображений
+        :param user_ids: id пользователя для каждого эмбеддинга
+        :param user_names: Имена пользователей по id
+        """
+        self.user_names = dict(user_names)
+
+        if not embeddings:
+            self._buffer = np.empty((0, 0), dtype=np.float32)
+            self._user_buffer = np.empty(0, dtype=np.int64)
+            self._set_size(0)
+            self.max_samples_per_user = 0
+            self.index.build(self.matrix)
+            return
+
+        self._user_buffer = np.asarray(user_ids, dtype=np.int64)
+        self._buffer = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        self._set_size(self._buffer.shape[0])
+        self.max_samples_per_user = int(np.unique(self.row_user_ids, return_counts=True)[1].max())
+        self._build_index()
+
+
+    def add_user(self, user_id: int, user_name: str, embeddings: List[np.ndarray]):
+        """
+        Добавление (или замена) образцов одного пользователя без пересборки галереи
+        Стоимость зависит от числа образцов пользователя, а не от размера галереи
+        """
+        self.remove_user(user_id)
+        self.user_names[user_id] = user_name
+        if not embeddings:
+            return
+
+        rows = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        start = len(self)
+        end = start + rows.shape[0]
+        self._reserve(end, rows.shape[1])
+        self._buffer[start:end] = rows
+        self._user_buffer[start:end] = user_id
+        self._set_size(end)
+
+        self.max_samples_per_user = max(self.max_samples_per_user, rows.shape[0])
+        self.index.add(self.matrix, np.arange(start, end))
+
+
+    def remove_user(self, user_id: int) -> bool:
+        """
+        Удаление образцов пользователя: на их место переносятся последние строки галереи
+        Возвращает False, если пользователя нет в галерее
+        """
+        self.user_names.pop(user_id, None)
+        # Поиск по вектору id - единственная операция, проходящая по всей галерее (8 байт на строку)
+        removed = np.flatnonzero(self.row_user_ids == user_id)
+        if removed.size == 0:
+            return False
+
+        size = len(self)
+        new_size = size - removed.size
+        moved_to = removed[removed < new_size]
+        tail = np.arange(new_size, size)
+        moved_from = tail[~np.isin(tail, removed)]
+
+        self._buffer[moved_to] = self._buffer[moved_from]
+        self._user_buffer[moved_to] = self._user_buffer[moved_from]
+        self._set_size(new_size)
+
+        self.index.remove(self.matrix, removed, moved_from, moved_to)
+        return True
+
+
+    def match(self, embeddings: np.ndarray, top_k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Пакетный поиск ближайших пользователей
+        :param embeddings: Матрица (M, D) эмбеддингов лиц одного кадра
+        :param top_k: Количество лучших пользователей для каждого лица
+        Возвращает:
+            - Матрица (M, k) id пользователей (-1, если кандидатов меньше k)
+            - Матрица (M, k) косинусной схожести
+        """
+        queries = self._normalize(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        num_queries = queries.shape[0]
+        ids = np.full((num_queries, top_k), -1, dtype=np.int64)
+        scores = np.zeros((num_queries, top_k), dtype=np.float32)
+
+        if len(self) == 0 or num_queries == 0:
+            return ids, scores
+
+        if self.index.kind == 'exact':
+            return self._match_exact(queries, top_k, ids, scores)
+
+        # Лучшие строки k пользователей гарантированно входят в первые k * max_samples строк
+        rows, row_scores = self.index.search(queries, top_k * self.max_samples_per_user)
+
+        for i in range(num_queries):
+            valid = rows[i] >= 0
+            row_users = self.row_user_ids[rows[i][valid]]
+            # Строки отсортированы по убыванию схожести: первое вхождение - лучший образец
+            _, first = np.unique(row_users, return_index=True)
+            first = np.sort(first)[:top_k]
+            ids[i, :first.shape[0]] = row_users[first]
+            scores[i, :first.shape[0]] = row_scores[i][valid][first]
+
+        return ids, scores
+
+
+    def _match_exact(self, queries: np.ndarray, top_k: int, ids: np.ndarray, scores: np.ndarray):
+        """Точный поиск одним матричным умножением и максимумом схожести по пользователю"""
+        order, group_starts, user_ids = self._user_groups()
+
+        # (M, N) схожесть со всеми образцами -> (M, U) лучшая схожесть по пользователю
+        similarities = queries @ self.matrix.T
+        user_scores = np.maximum.reduceat(similarities[:, order], group_starts, axis=1)
+
+        k = min(top_k, user_scores.shape[1])
+        if k < user_scores.shape[1]:
+            candidates = np.argpartition(-user_scores, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.tile(np.arange(k), (queries.shape[0], 1))
+
+        candidate_scores = np.take_along_axis(user_scores, candidates, axis=1)
+        best = np.argsort(-candidate_scores, axis=1)
+        candidates = np.take_along_axis(candidates, best, axis=1)
+
+        ids[:, :k] = user_ids[candidates]
+        scores[:, :k] = np.take_along_axis(candidate_scores, best, axis=1)
+        return ids, scores
+
+
+    def _user_groups(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Порядок строк, сгруппированных по пользователю, начала групп и id пользователей групп
+        После добавления и удаления пользователей строки одного пользователя не идут подряд,
+        поэтому группировка пересчитывается при первом поиске после изменения
+        """
+        if self._groups is None:
+            order = np.argsort(self.row_user_ids, kind='stable')
+            user_ids, group_starts = np.unique(self.row_user_ids[order], return_index=True)
+            self._groups = (order, group_starts, user_ids)
+        return self._groups
+
+
+    def save_snapshot(self, snapshot_dir: Path, generation: int):
+        """
+        Сохранение галереи для совместного использования процессами камер
+        Файлы каждого поколения пишутся заново: старые могут быть отображены в память
+        Предыдущее поколение сохраняется: процесс камеры может еще читать его файлы
+        """
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        with open(snapshot_dir / f"matrix_{generation}.npy", 'wb') as f:
+            np.save(f, self.matrix)
+        with open(snapshot_dir / f"user_ids_{generation}.npy", 'wb') as f:
+            np.save(f, self.row_user_ids)
+        with open(snapshot_dir / f"names_{generation}.json", 'w', encoding='utf-8') as f:
+            json.dump({str(user_id): name for user_id, name in self.user_names.items()}, f, ensure_ascii=False)
+        if self.index.kind != 'exact':
+            self.index.save(snapshot_dir / f"index_{generation}.npz", self._fingerprint())
+
+        keep = {str(generation), str(generation - 1)}
+        for path in snapshot_dir.iterdir():
+            if path.stem.rsplit('_', 1)[-1] not in keep:
+                try:
+                    path.unlink()
+                except OSError:
+                    # Файл еще отображен в память процессом камеры
+                    pass
+
+
+    @classmethod
+    def load_snapshot(cls, snapshot_dir: Path, generation: int, index=None) -> 'FaceGallery':
+        """Открытие сохраненной галереи только для чтения (матрица отображается в память)"""
+        gallery = cls(index=index, index_path=snapshot_dir / f"index_{generation}.npz")
+        gallery._buffer = np.load(snapshot_dir / f"matrix_{generation}.npy", mmap_mode='r')
+        gallery._user_buffer = np.load(snapshot_dir / f"user_ids_{generation}.npy")
+        gallery._set_size(gallery._buffer.shape[0])
+        with open(snapshot_dir / f"names_{generation}.json", 'r', encoding='utf-8') as f:
+            gallery.user_names = {int(user_id): name for user_id, name in json.load(f).items()}
+
+        if len(gallery):
+            gallery.max_samples_per_user = int(np.unique(gallery.row_user_ids, return_counts=True)[1].max())
+        gallery._build_index()
+        return gallery
+
+
+    def get_user_name(self, user_id: int) -> str:
+        """Имя пользователя по id"""
+        return self.user_names.get(user_id, "")
+
+
+    def _reserve(self, size: int, dim: int):
+        """Увеличение емкости буферов (удвоением) для амортизированного добавления"""
+        capacity = self._buffer.shape[0]
+        if capacity >= size and self._buffer.shape[1] == dim:
+            return
+
+        new_capacity = max(size, 2 * capacity, 64)
+        buffer = np.empty((new_capacity, dim), dtype=np.float32)
+        user_buffer = np.empty(new_capacity, dtype=np.int64)
+        count = len(self)
+        if count:
+            buffer[:count] = self.matrix
+            user_buffer[:count] = self.row_user_ids
+        self._buffer = buffer
+        self._user_buffer = user_buffer
+
+
+    def _set_size(self, size: int):
+        """Обновление видимой части буферов"""
+        self.matrix = self._buffer[:size]
+        self.row_user_ids = self._user_buffer[:size]
+        self._groups = None
+        self.version += 1
+
+
+    def prepare_index(self, index, index_path: Optional[Path] = None) -> int:
+        """
+        Построение другого индекса по текущему содержимому без замены используемого
+        Может выполняться без блокировки галереи, пока поиск идет по старому индексу
+        Возвращает версию содержимого, по которой построен индекс (для set_index)
+        """
+        version, matrix = self.version, self.matrix
+        # Точный индекс не сохраняется: отпечаток (хэш всей матрицы) для него не считается
+        if index_path is None or index.kind == 'exact':
+            index.build(matrix)
+            return version
+
+        fingerprint = self._fingerprint()
+        if index.load(index_path, matrix, fingerprint):
+            return version
+
+        index.build(matrix)
+        try:
+            index.save(index_path, fingerprint)
+        except Exception as e:
+            print(f"Ошибка сохранения индекса галереи: {str(e)}")
+        return version
+
+
+    def set_index(self, index, index_path: Optional[Path], version: int):
+        """
+        Замена индекса, подготовленного prepare_index
+        Если галерея изменилась после подготовки, индекс строится заново
+        """
+        self.index = index
+        self.index_path = index_path
+        if version != self.version:
+            self._build_index()
+
+
+    def _build_index(self):
+        """Загрузка сохраненного индекса или построение нового"""
+        self.prepare_index(self.index, self.index_path)
+
+
+    def _fingerprint(self) -> str:
+        """Отпечаток содержимого галереи для проверки актуальности сохраненного индекса (по всей матрице)"""
+        digest = hashlib.sha1(np.ascontiguousarray(self.row_user_ids).tobytes())
+        digest.update(np.ascontiguousarray(self.matrix).data)
+        return f"{self.matrix.shape[0]}x{self.matrix.shape[1]}:{digest.hexdigest()}"
+
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        """L2-нормализация строк матрицы"""
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(matrix / norms, dtype=np.float32)
@@ -0,0 +1,282 @@
+from pathlib import Path
+from typing import List, Tuple
+import numpy as np
+
+
+INDEX_VERSION = 1
+
+
+
+class ExactIndex:
+
+    kind = 'exact'
+
+    def __init__(self):
+        """Точный поиск полным перебором по матрице галереи"""
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+
+
+    def build(self, matrix: np.ndarray):
+        """Построение индекса по нормализованной матрице галереи"""
+        self.matrix = matrix
+
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Поиск k ближайших строк галереи
+        Возвращает матрицы (M, k) номеров строк и схожести, отсортированные по убыванию
+        """
+        similarities = queries @ self.matrix.T
+        return _top_k(similarities, k)
+
+
+    def add(self, matrix: np.ndarray, rows: np.ndarray):
+        """Добавление строк: точному индексу достаточно новой матрицы"""
+        self.matrix = matrix
+
+
+    def remove(self, matrix: np.ndarray, removed: np.ndarray, moved_from: np.ndarray, moved_to: np.ndarray):
+        """Удаление строк: точному индексу достаточно новой матрицы"""
+        self.matrix = matrix
+
+
+    def save(self, path: Path, fingerprint: str):
+        """Точный индекс не требует сохранения"""
+        pass
+
+
+    def load(self, path: Path, matrix: np.ndarray, fingerprint: str) -> bool:
+        """Точный индекс строится мгновенно"""
+        return False
+
+
+
+class IVFIndex:
+
+    kind = 'ivf'
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8, kmeans_iterations: int = 10, seed: int = 0):
+        """
+        Приближенный поиск с разбиением галереи на кластеры (IVF, сферический k-means)
+        :param nlist: Количество кластеров (0 - автоматически, около sqrt(N))
+        :param nprobe: Количество просматриваемых кластеров: больше - выше полнота, ниже скорость
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self.centroids = np.empty((0, 0), dtype=np.float32)
+        self.lists: List[np.ndarray] = []
+        self.assignment = np.empty(0, dtype=np.int64)
+        self.trained_size = 0
+
+
+    def build(self, matrix: np.ndarray):
+        """Обучение центроидов и распределение строк галереи по кластерам"""
+        self.matrix = matrix
+        num_rows = matrix.shape[0]
+
+        if num_rows == 0:
+            self.centroids = np.empty((0, 0), dtype=np.float32)
+            self.lists = []
+            self.assignment = np.empty(0, dtype=np.int64)
+            self.trained_size = 0
+            return
+
+        nlist = self.nlist if self.nlist > 0 else int(np.sqrt(num_rows))
+        nlist = max(1, min(nlist, num_rows))
+        rng = np.random.default_rng(self.seed)
+
+        # Обучение на подвыборке: ~64 точки на кластер достаточно для центроидов
+        train_size = min(num_rows, nlist * 64)
+        train = matrix[rng.choice(num_rows, train_size, replace=False)]
+        centroids = train[rng.choice(train_size, nlist, replace=False)].copy()
+
+        for _ in range(self.kmeans_iterations):
+            assignment = np.argmax(train @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, train)
+            counts = np.bincount(assignment, minlength=nlist)
+
+            # Пустые кластеры переинициализируются случайными точками
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = train[rng.choice(train_size, int(empty.sum()), replace=False)]
+            centroids = _normalize(sums)
+
+        self.centroids = centroids
+        self.trained_size = num_rows
+        self._assign(self._nearest_centroids(matrix))
+
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Поиск k ближайших строк среди nprobe ближайших кластеров
+        Возвращает матрицы (M, k) номеров строк (-1, если кандидатов меньше k) и схожести
+        """
+        num_queries = queries.shape[0]
+        rows = np.full((num_queries, k), -1, dtype=np.int64)
+        scores = np.full((num_queries, k), -1.0, dtype=np.float32)
+
+        if self.matrix.shape[0] == 0 or not self.lists:
+            return rows, scores
+
+        nprobe = max(1, min(self.nprobe, self.centroids.shape[0]))
+        centroid_scores = queries @ self.centroids.T
+        probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+
+        for i in range(num_queries):
+            candidates = np.concatenate([self.lists[c] for c in probes[i]])
+            if candidates.size == 0:
+                continue
+
+            similarities = self.matrix[candidates] @ queries[i]
+            top_idx, top_scores = _top_k(similarities[np.newaxis, :], min(k, candidates.size))
+            count = top_idx.shape[1]
+            rows[i, :count] = candidates[top_idx[0]]
+            scores[i, :count] = top_scores[0]
+
+        return rows, scores
+
+
+    def add(self, matrix: np.ndarray, rows: np.ndarray):
+        """Добавление новых строк галереи в ближайшие кластеры без переобучения"""
+        self.matrix = matrix
+        if self.centroids.shape[0] == 0:
+            self.build(matrix)
+            return
+
+        clusters = self._nearest_centroids(matrix[rows])
+        self.assignment = np.concatenate([self.assignment[:rows[0]], clusters])
+        for c in np.unique(clusters):
+            self.lists[c] = np.concatenate([self.lists[c], rows[clusters == c]])
+
+
+    def remove(self, matrix: np.ndarray, removed: np.ndarray, moved_from: np.ndarray, moved_to: np.ndarray):
+        """
+        Удаление строк галереи
+        :param removed: Номера удаленных строк
+        :param moved_from: Номера строк, перенесенных на место удаленных
+        :param moved_to: Новые номера перенесенных строк
+        """
+        self.matrix = matrix
+        if self.centroids.shape[0] == 0:
+            return
+
+        removed_clusters = self.assignment[removed]
+        for c in np.unique(removed_clusters):
+            self.lists[c] = self.lists[c][~np.isin(self.lists[c], removed[removed_clusters == c])]
+
+        for src, dst in zip(moved_from, moved_to):
+            c = self.assignment[src]
+            self.lists[c][self.lists[c] == src] = dst
+            self.assignment[dst] = c
+
+        self.assignment = self.assignment[:matrix.shape[0]]
+
+
+    def save(self, path: Path, fingerprint: str):
+        """Сохранение центроидов и списков кластеров рядом с галереей"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        sizes = np.array([len(rows) for rows in self.lists], dtype=np.int64)
+        with open(path, 'wb') as f:
+            np.savez(f,
+                     version=INDEX_VERSION,
+                     fingerprint=fingerprint,
+                     trained_size=self.trained_size,
+                     centroids=self.centroids,
+                     list_rows=np.concatenate(self.lists) if self.lists else np.empty(0, dtype=np.int64),
+                     list_offsets=np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64))
+
+
+    def load(self, path: Path, matrix: np.ndarray, fingerprint: str) -> bool:
+        """
+        Загрузка сохраненного индекса
+        Если галерея изменилась, строки перераспределяются по сохраненным центроидам;
+        переобучение нужно, только если галерея выросла более чем вдвое
+        Возвращает False, если индекс отсутствует или не подходит к галерее
+        """
+        if not path.exists():
+            return False
+
+        try:
+            with np.load(path) as data:
+                if int(data['version']) != INDEX_VERSION:
+                    return False
+                if self.nlist > 0 and data['centroids'].shape[0] != self.nlist:
+                    return False
+                if data['centroids'].shape[1:] != matrix.shape[1:]:
+                    return False
+
+                self.centroids = data['centroids']
+                self.trained_size = int(data['trained_size'])
+                self.matrix = matrix
+
+                if str(data['fingerprint']) == fingerprint:
+                    offsets = data['list_offsets']
+                    self.lists = list(np.split(data['list_rows'], offsets[1:-1]))
+                    self.assignment = np.empty(matrix.shape[0], dtype=np.int64)
+                    for c, rows in enumerate(self.lists):
+                        self.assignment[rows] = c
+                    return True
+
+            if matrix.shape[0] > 2 * self.trained_size:
+                return False
+
+            self._assign(self._nearest_centroids(matrix))
+            self.save(path, fingerprint)
+            return True
+
+        except Exception as e:
+            print(f"Ошибка чтения индекса галереи {path}: {str(e)}")
+            return False
+
+
+    def _nearest_centroids(self, matrix: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+        """Номер ближайшего центроида для каждой строки (по частям, чтобы ограничить память)"""
+        assignment = np.empty(matrix.shape[0], dtype=np.int64)
+        for start in range(0, matrix.shape[0], chunk_size):
+            chunk = matrix[start:start + chunk_size]
+            assignment[start:start + chunk_size] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return assignment
+
+
+    def _assign(self, assignment: np.ndarray):
+        """Построение списков кластеров по номерам кластеров строк"""
+        self.assignment = assignment
+        list_rows = np.argsort(assignment, kind='stable')
+        counts = np.bincount(assignment, minlength=self.centroids.shape[0])
+        self.lists = list(np.split(list_rows, np.cumsum(counts)[:-1]))
+
+
+
+def create_index(kind: str, nlist: int = 0, nprobe: int = 8):
+    """Создание индекса галереи по имени из настроек"""
+    if kind == 'ivf':
+        return IVFIndex(nlist=nlist, nprobe=nprobe)
+    elif kind == 'exact':
+        return ExactIndex()
+
+    print(f"Неизвестный тип индекса '{kind}', используется точный поиск")
+    return ExactIndex()
+
+
+def _top_k(similarities: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """k наибольших значений в каждой строке, отсортированных по убыванию"""
+    k = min(k, similarities.shape[1])
+    if k < similarities.shape[1]:
+        idx = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    else:
+        idx = np.tile(np.arange(k), (similarities.shape[0], 1))
+
+    top = np.take_along_axis(similarities, idx, axis=1)
+    order = np.argsort(-top, axis=1)
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    """L2-нормализация строк матрицы"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
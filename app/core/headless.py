@@ -0,0 +1,160 @@
+import threading
+import time
+from .attendance_writer import AttendanceWriter
+from .camera_pool import CameraPool
+from .database import DatabaseManager
+from .face_recognition import FaceRecognizer
+from .frame_queue import LatestFrameQueue
+from .frame_source import is_image_dir, is_live_source, iter_frames
+from .roi import parse_rois
+from ..settings.settings import SettingsManager
+
+
+
+class HeadlessRunner:
+
+    def __init__(self, settings_manager: SettingsManager, sources: list, stats_interval: float = 30.0):
+        """
+        Распознавание и учет посещаемости без графического интерфейса (без PyQt6)
+        Один источник обрабатывается в этом процессе, несколько - пулом процессов камер;
+        посещения записывает только этот процесс
+        :param settings_manager: Настройки (settings.ini)
+        :param sources: Индексы камер, видеофайлы, URL потоков или папки с изображениями
+        :param stats_interval: Период вывода статистики в секундах (0 - не выводить)
+        """
+        self.settings_manager = settings_manager
+        self.sources = sources
+        self.stats_interval = stats_interval
+        self.rois = parse_rois(settings_manager.get_setting('camera_rois'))
+        self.db = DatabaseManager(settings_manager.get_setting('institution'))
+        self.face_recognizer = FaceRecognizer(self.db, settings_manager)
+        self.attendance_writer = AttendanceWriter(
+            self.db.institution_type,
+            batch_size=int(settings_manager.get_setting('attendance_batch_size')),
+            flush_interval=int(settings_manager.get_setting('attendance_flush_ms')) / 1000
+        )
+        self.face_recognizer.set_attendance_writer(self.attendance_writer)
+        self.stop_event = threading.Event()
+
+        self.frames = 0
+        self.recognized_events = 0
+        self.dropped_frames = 0
+        self.last_report = time.monotonic()
+        self.last_report_frames = 0
+
+
+    def run(self):
+        """Обработка до исчерпания источника (файлы) или до вызова stop()"""
+        self.attendance_writer.start()
+        try:
+            if len(self.sources) > 1:
+                self._run_pool()
+            else:
+                self._run_single(self.sources[0])
+        finally:
+            # Оставшиеся в очереди посещения записываются до выхода
+            self.attendance_writer.stop()
+        self._report_stats()
+
+
+    def stop(self):
+        self.stop_event.set()
+
+
+    def _run_single(self, source):
+        """Один источник в этом процессе: живой поток читается отдельным потоком, файлы - подряд"""
+        self.face_recognizer.set_roi(self.rois.get(0))
+        resolution = self.face_recognizer.CAPTURE_RESOLUTION
+
+        if not is_live_source(source):
+            for frame in iter_frames(source, resolution, should_stop=self.stop_event.is_set):
+                self._process(frame)
+            return
+
+        # Устаревшие кадры камеры отбрасываются, распознается самый свежий
+        frame_queue = LatestFrameQueue(maxsize=1)
+        capture = threading.Thread(target=self._capture_loop, args=(source, resolution, frame_queue), daemon=True)
+        capture.start()
+
+        while not self.stop_event.is_set() and capture.is_alive():
+            frame = frame_queue.get(timeout=0.1)
+            if frame is not None:
+                self._process(frame)
+            self.dropped_frames = frame_queue.dropped
+        capture.join(timeout=1)
+
+
+    def _capture_loop(self, source, resolution, frame_queue: LatestFrameQueue):
+        for frame in iter_frames(source, resolution, should_stop=self.stop_event.is_set):
+            frame_queue.put(frame)
+
+
+    def _run_pool(self):
+        """Несколько источников: процессы камер распознают, этот процесс записывает посещения"""
+        for source in self.sources:
+            if is_image_dir(source):
+                print(f"Папка {source} не может обрабатываться вместе с другими источниками")
+                return
+
+        pool = CameraPool(self.sources, self.face_recognizer.get_snapshot_dir(), rois=self.rois)
+        # Кадры предпросмотра не нужны
+        pool.preview_source.value = -1
+        with self.face_recognizer.lock:
+            pool.start(self.face_recognizer.gallery)
+
+        try:
+            while not self.stop_event.is_set() and any(process.is_alive() for process in pool.processes):
+                event = pool.get_result(timeout=0.5)
+                if event is not None:
+                    self._handle_event(event)
+                self._maybe_report()
+        finally:
+            pool.stop()
+            # События, отправленные процессами при остановке (последние кадры и распознавания)
+            event = pool.get_result()
+            while event is not None:
+                self._handle_event(event)
+                event = pool.get_result()
+
+
+    def _handle_event(self, event: tuple):
+        source_index, kind, payload = event
+        if kind == 'recognized':
+            self._mark_attendance(payload)
+        elif kind == 'frames':
+            self.frames += payload
+        elif kind == 'error':
+            print(payload)
+
+
+    def _process(self, frame):
+        results = self.face_recognizer.analyze_frame(frame)
+        self.frames += 1
+        self._mark_attendance([result for result in results if result['recognized']])
+        self._maybe_report()
+
+
+    def _mark_attendance(self, recognized: list):
+        if recognized:
+            self.recognized_events += len(recognized)
+            self.face_recognizer.mark_attendance(recognized)
+
+
+    def _maybe_report(self):
+        if self.stats_interval > 0 and time.monotonic() - self.last_report >= self.stats_interval:
+            self._report_stats()
+
+
+    def _report_stats(self):
+        """Вывод пропускной способности за последний период"""
+        now = time.monotonic()
+        period = max(now - self.last_report, 1e-6)
+        fps = (self.frames - self.last_report_frames) / period
+        message = (f"[{time.strftime('%H:%M:%S')}] кадров: {self.frames} ({fps:.1f} к/с), "
+                   f"пропущено: {self.dropped_frames}, распознаваний: {self.recognized_events}")
+        if self.face_recognizer.timings.totals:
+            message += f"; {self.face_recognizer.timings.summary()}"
+        message += f"; {self.attendance_writer.summary()}"
+        print(message, flush=True)
+        self.last_report = now
+        self.last_report_frames = self.frames
@@ -0,0 +1,356 @@
+import glob
+import json
+import os
+import os.path as osp
+import platform
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+import onnx
+import onnxruntime
+from insightface.app import FaceAnalysis
+from insightface.model_zoo.arcface_onnx import ArcFaceONNX
+from insightface.model_zoo.attribute import Attribute
+from insightface.model_zoo.inswapper import INSwapper
+from insightface.model_zoo.landmark import Landmark
+from insightface.model_zoo.retinaface import RetinaFace
+from insightface.utils import ensure_available
+from .paths import MODELS_DIR
+
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+}
+
+OPTIMIZATION_LEVEL_NAMES = {level: name for name, level in GRAPH_OPTIMIZATION_LEVELS.items()}
+
+EXECUTION_MODES = {
+    'sequential': onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+    'parallel': onnxruntime.ExecutionMode.ORT_PARALLEL
+}
+
+# Модули, которые можно заменить квантованной версией
+QUANTIZABLE_MODULES = {
+    'none': (),
+    'recognition': ('recognition',),
+    'all': ('detection', 'recognition')
+}
+
+# Версия формата сведений об оптимизированном графе: записи других версий создаются заново
+# (в версии 1 тип модели определялся с ошибкой и не должен использоваться)
+MODEL_INFO_FORMAT = 2
+
+# Наборов моделей в реестре процесса: предыдущий набор сохраняется для быстрого возврата к прежним настройкам
+MAX_CACHED_MODELS = 2
+_models: 'OrderedDict[tuple, TunedFaceAnalysis]' = OrderedDict()
+_models_lock = threading.Lock()
+
+
+
+def create_session_options(intra_op_threads: int = 0, inter_op_threads: int = 0,
+                           graph_optimization: str = 'all', execution_mode: str = 'sequential'):
+    """
+    Параметры сессий onnxruntime
+    :param intra_op_threads: Потоки внутри одного оператора (0 - по числу ядер)
+    :param inter_op_threads: Потоки для независимых операторов (только в режиме parallel, 0 - автоматически)
+    :param graph_optimization: Уровень оптимизации графа: disable, basic, extended, all
+    :param execution_mode: sequential или parallel
+    """
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS.get(
+        graph_optimization, onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL)
+    options.execution_mode = EXECUTION_MODES.get(execution_mode, onnxruntime.ExecutionMode.ORT_SEQUENTIAL)
+    return options
+
+
+def session_options_from_settings(settings_manager):
+    """Параметры сессий onnxruntime из настроек приложения"""
+    return create_session_options(
+        intra_op_threads=int(settings_manager.get_setting('intra_op_threads')),
+        inter_op_threads=int(settings_manager.get_setting('inter_op_threads')),
+        graph_optimization=settings_manager.get_setting('graph_optimization'),
+        execution_mode=settings_manager.get_setting('execution_mode')
+    )
+
+
+def quantize_model(model_file: Path, quantized_file: Path):
+    """
+    Динамическое квантование весов модели в int8
+    Веса хранятся как uint8: для ConvInteger на CPU onnxruntime реализует только этот вариант
+    """
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantized_file.parent.mkdir(parents=True, exist_ok=True)
+    # Процессы камер при первом запуске квантуют одновременно: у каждого свой временный файл
+    tmp_file = quantized_file.with_suffix(f".{os.getpid()}.tmp")
+    quantize_dynamic(str(model_file), str(tmp_file), weight_type=QuantType.QUInt8)
+    tmp_file.replace(quantized_file)
+
+
+def get_quantized_model(model_file: Path, model_name: str) -> Path:
+    """Путь к квантованной копии модели; копия создается при отсутствии или изменении исходного файла"""
+    quantized_file = MODELS_DIR / model_name / f"{model_file.stem}.int8.onnx"
+    if not quantized_file.exists() or quantized_file.stat().st_mtime < model_file.stat().st_mtime:
+        print(f"Квантование модели {model_file.name} в int8...")
+        quantize_model(model_file, quantized_file)
+    return quantized_file
+
+
+def copy_session_options(sess_options=None):
+    """Копия параметров сессии (параметры изменяются для отдельных моделей)"""
+    options = onnxruntime.SessionOptions()
+    if sess_options is not None:
+        options.intra_op_num_threads = sess_options.intra_op_num_threads
+        options.inter_op_num_threads = sess_options.inter_op_num_threads
+        options.graph_optimization_level = sess_options.graph_optimization_level
+        options.execution_mode = sess_options.execution_mode
+    return options
+
+
+def session_options_key(sess_options=None) -> tuple:
+    """Параметры сессии в виде ключа (наборы с разными параметрами хранятся в реестре отдельно)"""
+    options = copy_session_options(sess_options)
+    return (options.intra_op_num_threads, options.inter_op_num_threads,
+            int(options.graph_optimization_level), int(options.execution_mode))
+
+
+def optimized_model_path(model_file: Path, model_name: str, sess_options, providers: list) -> Path:
+    """
+    Путь к оптимизированному графу модели
+    Оптимизированный граф зависит от провайдера, архитектуры процессора,
+    версии onnxruntime и уровня оптимизации
+    (уровень all добавляет преобразования под набор инструкций процессора: при переносе
+    данных приложения на другой компьютер каталоги optimized следует удалить)
+    """
+    provider = providers[0].replace('ExecutionProvider', '').lower()
+    level = OPTIMIZATION_LEVEL_NAMES.get(copy_session_options(sess_options).graph_optimization_level, 'all')
+    return (MODELS_DIR / model_name / "optimized" /
+            f"{model_file.stem}.{provider}-{platform.machine().lower()}.ort{onnxruntime.__version__}.{level}.onnx")
+
+
+def read_model_info(optimized_file: Path, model_file: Path) -> Optional[dict]:
+    """
+    Сведения об оптимизированном графе: тип модели и время загрузки без кэша
+    None - графа нет, исходный файл изменился или сведения записаны в другом формате
+    """
+    try:
+        with open(optimized_file.with_suffix('.json'), 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        stat = model_file.stat()
+        if (info.get('format') != MODEL_INFO_FORMAT or
+                info['source_size'] != stat.st_size or info['source_mtime_ns'] != stat.st_mtime_ns or
+                not optimized_file.exists()):
+            return None
+        return info
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def load_cached_model(model_file: Path, taskname: str, model_name: str, sess_options, providers: list,
+                      source_file: Optional[Path] = None) -> Tuple[object, float]:
+    """
+    Загрузка модели с кэшем оптимизированного графа
+    При первой загрузке onnxruntime сохраняет оптимизированный граф (optimized_model_filepath),
+    при следующих он загружается без повторной оптимизации
+    Возвращает (модель, сэкономленное время в мс)
+    :param taskname: Тип модели (route_model)
+    :param source_file: Исходный файл модели, если model_file - его производная (квантованная копия)
+    """
+    options = copy_session_options(sess_options)
+    if options.graph_optimization_level == onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL:
+        return load_model(model_file, taskname, options, providers, source_file=source_file), 0.0
+
+    optimized_file = optimized_model_path(model_file, model_name, sess_options, providers)
+    info = read_model_info(optimized_file, model_file)
+    if info is not None:
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+        start = time.perf_counter()
+        try:
+            model = load_model(optimized_file, taskname, options, providers, source_file=source_file or model_file)
+            return model, max(0.0, info['load_ms'] - (time.perf_counter() - start) * 1000)
+        except Exception as e:
+            print(f"Ошибка загрузки оптимизированной модели {optimized_file.name}, оптимизация выполняется заново: {str(e)}")
+            options = copy_session_options(sess_options)
+
+    optimized_file.parent.mkdir(parents=True, exist_ok=True)
+    # Процессы камер при первом запуске оптимизируют модели одновременно: у каждого свои временные файлы,
+    # готовые файлы заменяются атомарно
+    tmp_file = optimized_file.with_suffix(f".{os.getpid()}.tmp")
+    options.optimized_model_filepath = str(tmp_file)
+    start = time.perf_counter()
+    model = load_model(model_file, taskname, options, providers, source_file=source_file)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    try:
+        tmp_file.replace(optimized_file)
+        stat = model_file.stat()
+        tmp_info = optimized_file.with_suffix(f".{os.getpid()}.json.tmp")
+        with open(tmp_info, 'w', encoding='utf-8') as f:
+            json.dump({
+                'format': MODEL_INFO_FORMAT,
+                'taskname': taskname,
+                'load_ms': load_ms,
+                'source_size': stat.st_size,
+                'source_mtime_ns': stat.st_mtime_ns
+            }, f)
+        tmp_info.replace(optimized_file.with_suffix('.json'))
+    except Exception as e:
+        print(f"Ошибка сохранения оптимизированной модели {optimized_file.name}: {str(e)}")
+    return model, 0.0
+
+
+def route_model(model_file: Path) -> Optional[str]:
+    """
+    Тип модели по входам и выходам графа, без создания сессии onnxruntime
+    Порядок проверок повторяет model_zoo.ModelRouter: модель ориентиров 1k3d68 (вход 192x192)
+    тоже имеет квадратный вход от 112 пикселей и не должна считаться моделью распознавания
+    Возвращает taskname, который получит модель InsightFace, или None для неизвестной модели
+    """
+    graph = onnx.load(str(model_file), load_external_data=False).graph
+    initializers = {initializer.name for initializer in graph.initializer}
+    inputs = [graph_input for graph_input in graph.input if graph_input.name not in initializers]
+    outputs = graph.output
+
+    def shape(value_info) -> list:
+        return [dim.dim_value if dim.HasField('dim_value') else None
+                for dim in value_info.type.tensor_type.shape.dim]
+
+    input_shape = shape(inputs[0])
+    output_shape = shape(outputs[0])
+    if len(outputs) >= 5:
+        return 'detection'
+    if input_shape[2] == 192 and input_shape[3] == 192:
+        if output_shape[1] == 3309:
+            return 'landmark_3d_68'
+        return f"landmark_2d_{output_shape[1] // 2}"
+    if input_shape[2] == 96 and input_shape[3] == 96:
+        return 'genderage' if output_shape[1] == 3 else f"attribute_{output_shape[1]}"
+    if len(inputs) == 2 and input_shape[2] == 128 and input_shape[3] == 128:
+        return 'inswapper'
+    if (isinstance(input_shape[2], int) and input_shape[2] == input_shape[3] and
+            input_shape[2] >= 112 and input_shape[2] % 16 == 0):
+        return 'recognition'
+    return None
+
+
+def model_class(taskname: str):
+    """Класс модели InsightFace для типа модели"""
+    if taskname.startswith('landmark'):
+        return Landmark
+    if taskname == 'genderage' or taskname.startswith('attribute'):
+        return Attribute
+    return {'detection': RetinaFace, 'recognition': ArcFaceONNX, 'inswapper': INSwapper}[taskname]
+
+
+def load_model(model_file: Path, taskname: str, sess_options, providers: list, source_file: Optional[Path] = None):
+    """
+    Создание модели InsightFace по файлу ONNX с заданными параметрами сессии
+    (model_zoo.get_model не передает sess_options в onnxruntime)
+    :param taskname: Тип модели (route_model)
+    :param source_file: Исходный файл модели, если model_file - его производная (квантованная копия)
+    """
+    session = onnxruntime.InferenceSession(str(model_file), sess_options=sess_options, providers=providers)
+    return model_class(taskname)(model_file=str(source_file or model_file), session=session)
+
+
+
+class TunedFaceAnalysis(FaceAnalysis):
+
+    def __init__(self, name: str, providers: list, sess_options=None, quantization: str = 'none',
+                 allowed_modules=('detection', 'recognition'), root: str = '~/.insightface'):
+        """
+        FaceAnalysis с управляемыми параметрами сессий onnxruntime, кэшем
+        оптимизированных графов и опциональной заменой моделей их int8-версиями
+        Тип модели определяется по графу до создания сессии: ненужные модели
+        набора (возраст, ориентиры) не загружаются
+        :param name: Имя набора моделей InsightFace (buffalo_s, buffalo_l)
+        :param providers: Провайдеры onnxruntime
+        :param sess_options: Параметры сессий (create_session_options)
+        :param quantization: Какие модели квантовать: none, recognition, all
+        """
+        onnxruntime.set_default_logger_severity(3)
+        self.models = {}
+        self.model_dir = ensure_available('models', name, root=root)
+        quantized_modules = QUANTIZABLE_MODULES.get(quantization, ())
+        # Время, сэкономленное кэшем оптимизированных графов (только для загруженных моделей)
+        self.optimization_saved_ms = 0.0
+        # Модели набора, для которых сессии не создавались (тип не нужен или уже загружен)
+        self.skipped_models = []
+
+        for onnx_file in sorted(glob.glob(osp.join(self.model_dir, '*.onnx'))):
+            onnx_file = Path(onnx_file)
+            taskname = route_model(onnx_file)
+            if taskname is None or taskname not in allowed_modules or taskname in self.models:
+                self.skipped_models.append(onnx_file.name)
+                continue
+
+            model = None
+            if taskname in quantized_modules:
+                try:
+                    quantized_file = get_quantized_model(onnx_file, name)
+                    model, saved_ms = load_cached_model(quantized_file, taskname, name, sess_options, providers,
+                                                        source_file=onnx_file)
+                    self.optimization_saved_ms += saved_ms
+                except Exception as e:
+                    print(f"Ошибка квантования модели {onnx_file.name}, используется исходная: {str(e)}")
+
+            if model is None:
+                model, saved_ms = load_cached_model(onnx_file, taskname, name, sess_options, providers)
+                self.optimization_saved_ms += saved_ms
+
+            self.models[taskname] = model
+
+        if self.optimization_saved_ms > 0:
+            print(f"Модели {name} загружены из кэша оптимизации, сэкономлено ~{self.optimization_saved_ms:.0f} мс")
+        if self.skipped_models:
+            print(f"Модели {name} не загружались (не нужны): {', '.join(self.skipped_models)}")
+        assert 'detection' in self.models
+        self.det_model = self.models['detection']
+
+
+
+def get_face_analysis(name: str, use_gpu: bool, det_size: tuple, quantization: str = 'none',
+                      sess_options=None) -> TunedFaceAnalysis:
+    """
+    Набор моделей детекции и распознавания из реестра процесса
+    Все распознаватели процесса с одинаковыми моделью, провайдером, размером детектора,
+    квантованием и параметрами сессий используют одни сессии onnxruntime (сессии потокобезопасны).
+    Модели загружаются при первом запросе
+    :param name: Имя набора моделей InsightFace
+    :param use_gpu: CUDA вместо CPU
+    :param det_size: Размер входа детектора
+    :param quantization: Какие модели квантовать: none, recognition, all
+    """
+    key = (name, 'GPU' if use_gpu else 'CPU', tuple(det_size), quantization, session_options_key(sess_options))
+    with _models_lock:
+        model = _models.get(key)
+        if model is not None:
+            _models.move_to_end(key)
+            return model
+
+        model = TunedFaceAnalysis(
+            name=name,
+            providers=['CUDAExecutionProvider'] if use_gpu else ['CPUExecutionProvider'],
+            sess_options=sess_options,
+            quantization=quantization,
+            allowed_modules=['detection', 'recognition']
+        )
+        model.prepare(ctx_id=0 if use_gpu else -1, det_size=tuple(det_size))
+        _models[key] = model
+        # Вытесненный набор освобождается, когда его перестанут использовать распознаватели
+        while len(_models) > MAX_CACHED_MODELS:
+            _models.popitem(last=False)
+        return model
+
+
+def clear_models():
+    """Удаление всех наборов моделей из реестра (например, перед запуском процессов-обработчиков)"""
+    with _models_lock:
+        _models.clear()
@@ -0,0 +1,72 @@
+import time
+from typing import Optional
+import cv2
+import numpy as np
+
+
+# Ширина уменьшенного кадра для оценки движения
+MOTION_FRAME_WIDTH = 160
+# Изменение яркости пикселя относительно фона, считающееся движением
+PIXEL_DIFF_THRESHOLD = 25
+# Скорость обновления фона (скользящее среднее)
+BACKGROUND_RATE = 0.05
+
+
+
+class MotionGate:
+
+    def __init__(self, min_area: float = 0.002, max_idle: float = 2.0):
+        """
+        Дешевая проверка движения перед детекцией лиц
+        Кадр уменьшается, переводится в оттенки серого и сравнивается с фоном
+        (скользящим средним предыдущих кадров), поэтому медленные изменения
+        освещения не считаются движением
+        :param min_area: Доля изменившихся пикселей, начиная с которой кадр считается
+                         содержащим движение (0 - проверка отключена)
+        :param max_idle: Максимальный интервал в секундах между детекциями при отсутствии движения
+        """
+        self.min_area = min_area
+        self.max_idle = max_idle
+        self.background: Optional[np.ndarray] = None
+        self.last_pass = 0.0
+        self.skipped = 0
+
+
+    def should_process(self, frame: np.ndarray, force: bool = False) -> bool:
+        """
+        Обновление фона и решение, нужна ли детекция на кадре:
+        да при движении, при первом кадре и по истечении max_idle
+        :param force: Детекция нужна независимо от движения (например, в кадре есть треки);
+                      фон при этом все равно обновляется
+        """
+        if self.min_area <= 0:
+            return True
+
+        now = time.monotonic()
+        motion = self._update(frame)
+        if force or motion or now - self.last_pass >= self.max_idle:
+            self.last_pass = now
+            return True
+
+        self.skipped += 1
+        return False
+
+
+    def reset(self):
+        self.background = None
+
+
+    def _update(self, frame: np.ndarray) -> bool:
+        """Сравнение уменьшенного кадра с фоном; True, если доля изменившихся пикселей выше порога"""
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (MOTION_FRAME_WIDTH, max(1, height * MOTION_FRAME_WIDTH // width)),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0).astype(np.float32)
+
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray
+            return True
+
+        changed = np.count_nonzero(cv2.absdiff(gray, self.background) > PIXEL_DIFF_THRESHOLD)
+        cv2.accumulateWeighted(gray, self.background, BACKGROUND_RATE)
+        return changed >= self.min_area * gray.size
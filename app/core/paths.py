@@ -24,6 +24,14 @@ FACES_DATA_DIR_EDUCATIONAL = FACES_DATA_DIR / "educational"
 FACES_DATA_DIR_ENTERPRISE = FACES_DATA_DIR / "enterprise"
 FACES_IMG_DIR_EDUCATIONAL = FACES_DATA_DIR_EDUCATIONAL / "images"
 FACES_IMG_DIR_ENTERPRISE = FACES_DATA_DIR_ENTERPRISE / "images"
+FACES_CACHE_DIR_EDUCATIONAL = FACES_DATA_DIR_EDUCATIONAL / "cache"
+FACES_CACHE_DIR_ENTERPRISE = FACES_DATA_DIR_ENTERPRISE / "cache"
+
+# Производные модели (квантованные копии)
+MODELS_DIR = DATA_DIR / "models"
+
+# Состояние загрузки посещаемости из записей
+BACKFILL_DIR = DATA_DIR / "backfill"
 
 # Базы данных
 DB_EDUCATIONAL = DB_DIR / "educational.db"
@@ -42,7 +50,10 @@ def verify_paths():
         DB_DIR,
         ATTENDANCE_REPORTS_DIR,
         FACES_IMG_DIR_EDUCATIONAL,
-        FACES_IMG_DIR_ENTERPRISE
+        FACES_IMG_DIR_ENTERPRISE,
+        FACES_CACHE_DIR_EDUCATIONAL,
+        FACES_CACHE_DIR_ENTERPRISE,
+        MODELS_DIR
     ]
     
     # Создание директорий
@@ -0,0 +1,74 @@
+import threading
+from datetime import date, datetime
+from typing import Dict, Optional
+
+
+
+class DailyPresence:
+
+    def __init__(self, cooldown: float = 0.0):
+        """
+        Отметки посещения за текущий день в памяти: повторные распознавания
+        пользователя не обращаются к базе данных
+        Отметки загружаются одним запросом при первом обращении и заново после полуночи
+        :param cooldown: Через сколько секунд после отметки пользователь может быть
+                         отмечен повторно в тот же день (0 - одна отметка в день)
+        Методы потокобезопасны: непринятые посещения снимаются потоком записи (AttendanceWriter)
+        """
+        self.cooldown = cooldown
+        self.day: Optional[date] = None
+        # id пользователя -> время последней отметки за день
+        self.marked: Dict[int, datetime] = {}
+        self.lock = threading.Lock()
+
+
+    def needs_reload(self, now: datetime) -> bool:
+        """Отметки не загружены или наступил новый день"""
+        return self.day != now.date()
+
+
+    def load(self, day: date, marked: Dict[int, datetime]):
+        """
+        Загрузка отметок дня из БД
+        :param marked: id пользователя -> время последней отметки за день
+        """
+        with self.lock:
+            self.day = day
+            self.marked = dict(marked)
+
+
+    def should_mark(self, user_id: int, now: datetime) -> bool:
+        """Нужно ли записывать посещение (пользователь не отмечен сегодня или истек интервал)"""
+        with self.lock:
+            last = self.marked.get(user_id)
+        if last is None:
+            return True
+        return self.cooldown > 0 and (now - last).total_seconds() >= self.cooldown
+
+
+    def mark(self, user_id: int, now: datetime):
+        with self.lock:
+            self.marked[user_id] = now
+
+
+    def forget(self, user_id: int):
+        with self.lock:
+            self.marked.pop(user_id, None)
+
+
+    def unmark(self, user_id: int, timestamp: datetime):
+        """
+        Снятие отметки, которая не была записана в БД (время с точностью до секунды, как в БД)
+        Более поздняя отметка того же пользователя сохраняется
+        """
+        with self.lock:
+            last = self.marked.get(user_id)
+            if last is not None and last.replace(microsecond=0) <= timestamp:
+                del self.marked[user_id]
+
+
+    def invalidate(self):
+        """Отметки изменены в БД в обход распознавателя: при следующем обращении они загружаются заново"""
+        with self.lock:
+            self.day = None
+            self.marked = {}
@@ -0,0 +1,37 @@
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+
+
+class StageTimer:
+
+    def __init__(self):
+        """Накопление времени по этапам обработки кадра (детекция, выравнивание, эмбеддинг, поиск)"""
+        self.totals: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[stage] = self.totals.get(stage, 0.0) + time.perf_counter() - start
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+
+
+    def average_ms(self) -> Dict[str, float]:
+        """Среднее время одного вызова этапа в миллисекундах"""
+        return {stage: self.totals[stage] / self.counts[stage] * 1000 for stage in self.totals}
+
+
+    def summary(self) -> str:
+        return ", ".join(f"{stage}: {ms:.1f} мс x {self.counts[stage]}"
+                         for stage, ms in self.average_ms().items())
+
+
+    def reset(self):
+        self.totals = {}
+        self.counts = {}
@@ -0,0 +1,62 @@
+import math
+from typing import Dict, Optional, Tuple
+
+
+# Область интереса: (x1, y1, x2, y2) в долях ширины и высоты кадра
+FULL_FRAME = (0.0, 0.0, 1.0, 1.0)
+# Минимальный размер области в долях кадра (защита от случайного клика)
+MIN_ROI_SIZE = 0.05
+
+
+
+def parse_rois(value: str) -> Dict[int, Tuple[float, float, float, float]]:
+    """
+    Разбор областей интереса камер из настроек
+    '0: 0.1, 0.2, 0.9, 1.0; 1: 0, 0.3, 1, 1' -> {0: (0.1, 0.2, 0.9, 1.0), 1: (0.0, 0.3, 1.0, 1.0)}
+    (ключ - номер источника в camera_sources)
+    """
+    rois = {}
+    for item in (value or '').split(';'):
+        if ':' not in item:
+            continue
+        try:
+            index, coords = item.split(':', 1)
+            roi = normalize_roi(tuple(float(c) for c in coords.split(',')))
+        except ValueError:
+            print(f"Некорректная область интереса в настройках: {item.strip()}")
+            continue
+        if roi is not None:
+            rois[int(index)] = roi
+    return rois
+
+
+def format_rois(rois: Dict[int, Tuple[float, float, float, float]]) -> str:
+    """Запись областей интереса в строку настроек"""
+    return '; '.join(f"{index}: " + ', '.join(f"{c:.4f}" for c in roi)
+                     for index, roi in sorted(rois.items()))
+
+
+def normalize_roi(roi) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Упорядочивание и ограничение координат области
+    Возвращает None для области на весь кадр или слишком маленькой области
+    """
+    if roi is None or len(roi) != 4:
+        return None
+    x1, x2 = sorted((min(max(roi[0], 0.0), 1.0), min(max(roi[2], 0.0), 1.0)))
+    y1, y2 = sorted((min(max(roi[1], 0.0), 1.0), min(max(roi[3], 0.0), 1.0)))
+    if x2 - x1 < MIN_ROI_SIZE or y2 - y1 < MIN_ROI_SIZE:
+        return None
+    if (x1, y1, x2, y2) == FULL_FRAME:
+        return None
+    return (x1, y1, x2, y2)
+
+
+def roi_to_pixels(roi, frame_shape) -> Tuple[int, int, int, int]:
+    """Координаты области в пикселях кадра (весь кадр, если область не задана)"""
+    height, width = frame_shape[:2]
+    if roi is None:
+        return 0, 0, width, height
+    x1, y1, x2, y2 = roi
+    return (math.floor(x1 * width), math.floor(y1 * height),
+            math.ceil(x2 * width), math.ceil(y2 * height))
@@ -0,0 +1,189 @@
+from typing import Dict, List, Optional
+import numpy as np
+
+
+
+class Track:
+
+    def __init__(self, track_id: int, bbox: np.ndarray, kps: Optional[np.ndarray], det_score: float):
+        """
+        Трек одного лица между кадрами
+        :param track_id: Уникальный номер трека
+        :param bbox: Рамка (x1, y1, x2, y2)
+        :param kps: Ключевые точки лица с последней детекции
+        :param det_score: Уверенность детектора
+        """
+        self.track_id = track_id
+        self.bbox = bbox.astype(np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.kps = kps
+        self.det_score = det_score
+        self.misses = 0
+        self.detections_since_recognition = 0
+
+        # Голосование за личность: id пользователя (-1 - неизвестный) -> голоса и лучшая схожесть
+        self.votes: Dict[int, int] = {}
+        self.best_similarity: Dict[int, float] = {}
+        self.user_id = -1
+        self.similarity = 0.0
+        self.confirmed = False
+        # Большинство голосов за "неизвестный": лицо перепроверяется с тем же интервалом, что и подтвержденное
+        self.unknown = False
+
+
+    def needs_recognition(self, recheck_interval: int) -> bool:
+        """Нужен ли эмбеддинг лица: голосование не завершено или пора перепроверить результат"""
+        if self.confirmed or self.unknown:
+            return self.detections_since_recognition >= recheck_interval
+        return True
+
+
+    def predict(self):
+        """Сдвиг рамки по оценке скорости (кадр без детекции)"""
+        self.bbox = self.bbox + self.velocity
+        self.misses += 1
+
+
+    def correct(self, bbox: np.ndarray, kps: Optional[np.ndarray], det_score: float, alpha: float, beta: float):
+        """
+        Коррекция рамки по новой детекции (альфа-бета фильтр - упрощенный фильтр Калмана
+        с постоянной скоростью и фиксированными коэффициентами усиления)
+        """
+        predicted = self.bbox + self.velocity
+        residual = bbox.astype(np.float32) - predicted
+        self.bbox = predicted + alpha * residual
+        self.velocity = self.velocity + beta * residual
+        self.kps = kps
+        self.det_score = det_score
+        self.misses = 0
+        self.detections_since_recognition += 1
+
+
+    def add_vote(self, user_id: int, similarity: float, confirm_votes: int):
+        """Учет результата распознавания; личность подтверждается большинством из confirm_votes голосов"""
+        self.detections_since_recognition = 0
+        if self.unknown and user_id != -1:
+            # Перепроверка неизвестного лица нашла пользователя - голосование начинается заново
+            self.reset_identity()
+        self.votes[user_id] = self.votes.get(user_id, 0) + 1
+        self.best_similarity[user_id] = max(self.best_similarity.get(user_id, 0.0), similarity)
+
+        leader = max(self.votes, key=self.votes.get)
+        total = sum(self.votes.values())
+        if self.votes[leader] >= confirm_votes and self.votes[leader] * 2 > total:
+            if self.confirmed and leader != self.user_id:
+                # Повторная проверка не подтвердила личность - голосование начинается заново
+                self.reset_identity()
+                return
+            self.user_id = leader
+            self.similarity = self.best_similarity[leader]
+            self.confirmed = leader != -1
+            self.unknown = leader == -1
+
+
+    def reset_identity(self):
+        self.votes = {}
+        self.best_similarity = {}
+        self.user_id = -1
+        self.similarity = 0.0
+        self.confirmed = False
+        self.unknown = False
+
+
+
+class FaceTracker:
+
+    def __init__(self, iou_threshold: float = 0.3, max_misses: int = 10,
+                 alpha: float = 0.6, beta: float = 0.2):
+        """
+        Трекер лиц по перекрытию рамок (IoU) с прогнозом положения между детекциями
+        :param iou_threshold: Минимальное IoU для сопоставления детекции с треком
+        :param max_misses: Количество кадров без детекции, после которого трек удаляется
+        :param alpha: Коэффициент коррекции положения
+        :param beta: Коэффициент коррекции скорости
+        """
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.alpha = alpha
+        self.beta = beta
+        self.tracks: List[Track] = []
+        self._next_id = 1
+
+
+    def update(self, bboxes: np.ndarray, kpss: Optional[np.ndarray], det_scores: np.ndarray) -> List[Track]:
+        """
+        Сопоставление детекций кадра с треками (жадно по убыванию IoU)
+        Возвращает треки, обновленные или созданные на этом кадре
+        """
+        matched_tracks = set()
+        matched_detections = set()
+        updated = []
+
+        if self.tracks and len(bboxes):
+            predicted = np.array([track.bbox + track.velocity for track in self.tracks])
+            ious = iou_matrix(predicted, bboxes)
+            for flat in np.argsort(-ious, axis=None):
+                t, d = np.unravel_index(flat, ious.shape)
+                if ious[t, d] < self.iou_threshold:
+                    break
+                if t in matched_tracks or d in matched_detections:
+                    continue
+
+                track = self.tracks[t]
+                track.correct(bboxes[d], kpss[d] if kpss is not None else None, float(det_scores[d]),
+                              self.alpha, self.beta)
+                matched_tracks.add(t)
+                matched_detections.add(d)
+                updated.append(track)
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.predict()
+
+        for d in range(len(bboxes)):
+            if d in matched_detections:
+                continue
+            track = Track(self._next_id, bboxes[d], kpss[d] if kpss is not None else None, float(det_scores[d]))
+            self._next_id += 1
+            self.tracks.append(track)
+            updated.append(track)
+
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+        return updated
+
+
+    def predict(self) -> List[Track]:
+        """Прогноз положения всех треков на кадре без детекции"""
+        for track in self.tracks:
+            track.predict()
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+        return self.tracks
+
+
+    def forget_user(self, user_id: int):
+        """Сброс личности треков, подтвержденных как удаленный пользователь"""
+        for track in self.tracks:
+            if track.user_id == user_id:
+                track.reset_identity()
+
+
+    def reset(self):
+        self.tracks = []
+
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Матрица IoU между двумя наборами рамок (x1, y1, x2, y2)"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float32)[:, np.newaxis, :4]
+    boxes_b = np.asarray(boxes_b, dtype=np.float32)[np.newaxis, :, :4]
+
+    x1 = np.maximum(boxes_a[..., 0], boxes_b[..., 0])
+    y1 = np.maximum(boxes_a[..., 1], boxes_b[..., 1])
+    x2 = np.minimum(boxes_a[..., 2], boxes_b[..., 2])
+    y2 = np.minimum(boxes_a[..., 3], boxes_b[..., 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = (boxes_a[..., 2] - boxes_a[..., 0]) * (boxes_a[..., 3] - boxes_a[..., 1])
+    area_b = (boxes_b[..., 2] - boxes_b[..., 0]) * (boxes_b[..., 3] - boxes_b[..., 1])
+    union = area_a + area_b - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-6), 0.0)
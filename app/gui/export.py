@@ -1,12 +1,69 @@
+import threading
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QCheckBox, QProgressBar,
     QTableWidget, QDateEdit, QLabel, QFileDialog, QMessageBox, QTableWidgetItem, QHeaderView
 )
-from PyQt6.QtCore import QDate
-from datetime import datetime
-import pandas as pd
+from PyQt6.QtCore import QDate, QThread, pyqtSignal
+from typing import List
 import sqlite3
-from ..core.database import DatabaseManager
+from ..core.database import AttendanceEvent, DatabaseManager
+from ..core.export import EXPORT_FORMATS, export_attendance
+
+
+# Строк в таблице предпросмотра (экспортируется весь период)
+PREVIEW_LIMIT = 1000
+# Фильтр диалога сохранения -> расширение файла
+EXPORT_FILTERS = {
+    "Excel Files (*.xlsx)": ".xlsx",
+    "CSV (*.csv)": ".csv",
+    "CSV gzip (*.csv.gz)": ".csv.gz",
+}
+
+
+
+class ExportWorker(QThread):
+
+    progress = pyqtSignal(int, int)
+    completed = pyqtSignal(int)
+    cancelled = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, institution_type: str, start_date: str, end_date: str, path: str,
+                 per_category: bool = False, parent=None):
+        """
+        Экспорт посещений в отдельном потоке со своим соединением с БД
+        :param path: Файл .xlsx, .csv или .csv.gz
+        :param per_category: Отдельный лист для каждой группы/должности (xlsx)
+        """
+        super().__init__(parent)
+        self.institution_type = institution_type
+        self.start_date = start_date
+        self.end_date = end_date
+        self.path = path
+        self.per_category = per_category
+        self.stop_event = threading.Event()
+
+
+    def cancel(self):
+        self.stop_event.set()
+
+
+    def run(self):
+        # Соединение SQLite привязано к потоку, в котором создано
+        db = DatabaseManager(self.institution_type)
+        try:
+            written = export_attendance(db, self.start_date, self.end_date, self.path,
+                                        per_category=self.per_category,
+                                        progress=self.progress.emit,
+                                        should_stop=self.stop_event.is_set)
+            if written is None:
+                self.cancelled.emit()
+            else:
+                self.completed.emit(written)
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            db.conn.close()
 
 
 
@@ -20,6 +77,7 @@ class ExportWidget(QWidget):
         super().__init__()
         self.db = db
         self.institution_type = db.institution_type
+        self.export_worker = None
         self.init_ui()
 
 
@@ -47,10 +105,23 @@ class ExportWidget(QWidget):
         self.load_btn.clicked.connect(self.load_data)
         btn_layout.addWidget(self.load_btn)
         
-        self.export_btn = QPushButton("Экспорт в Excel")
-        self.export_btn.clicked.connect(self.export_to_excel)
+        self.export_btn = QPushButton("Экспорт")
+        self.export_btn.clicked.connect(self.export_data)
         self.export_btn.setEnabled(False)
         btn_layout.addWidget(self.export_btn)
+
+        category = "группы" if self.institution_type == 'Educational' else "должности"
+        self.per_category_check = QCheckBox(f"Отдельный лист для каждой {category} (Excel)")
+        btn_layout.addWidget(self.per_category_check)
+
+        # Ход экспорта
+        progress_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        progress_layout.addWidget(self.progress_bar)
+
+        self.cancel_btn = QPushButton("Отмена")
+        self.cancel_btn.clicked.connect(self.cancel_export)
+        progress_layout.addWidget(self.cancel_btn)
         
         # Таблица для предпросмотра
         self.preview_table = QTableWidget()
@@ -67,7 +138,9 @@ class ExportWidget(QWidget):
         # Компоновка
         layout.addLayout(date_layout)
         layout.addLayout(btn_layout)
+        layout.addLayout(progress_layout)
         layout.addWidget(self.preview_table)
+        self.set_exporting(False)
 
 
     def load_data(self):
@@ -76,13 +149,14 @@ class ExportWidget(QWidget):
             start = self.start_date.date().toString("yyyy-MM-dd")
             end = self.end_date.date().toString("yyyy-MM-dd")
             
-            records = self.db.get_attendance(start, end)
+            # Для предпросмотра читается только первая часть периода
+            records = next(self.db.iter_attendance_events(start, end, PREVIEW_LIMIT), [])
             if not records:
                 QMessageBox.warning(self, "Нет данных", "За выбранный период записи отсутствуют.")
                 return
             
             self.display_preview(records)
-            self.export_btn.setEnabled(True)
+            self.export_btn.setEnabled(self.export_worker is None)
             
         except sqlite3.Error as e:
             QMessageBox.critical(self, "Ошибка БД", f"Ошибка загрузки данных:\n{str(e)}")
@@ -90,102 +164,101 @@ class ExportWidget(QWidget):
             QMessageBox.critical(self, "Ошибка", f"Неизвестная ошибка:\n{str(e)}")
 
 
-    def display_preview(self, records):
-        """Отображение данных для предпросмотра"""
-        self.preview_table.setRowCount(0)
-        
-        for user_id, fullname, times in records:
-            for entry in times.split(';'):
-                entry = entry.strip()
-                if not entry:
-                    continue
-                
-                row = self.preview_table.rowCount()
-                self.preview_table.insertRow(row)
-                
-                try:
-                    dt = datetime.strptime(entry, "%d.%m.%Y %H:%M")
-                    date_str = dt.strftime("%d.%m.%Y")
-                    time_str = dt.strftime("%H:%M")
-                except ValueError:
-                    date_str = "Ошибка даты"
-                    time_str = "Ошибка времени"
-                
-                self.preview_table.setItem(row, 0, QTableWidgetItem(fullname))
-                if self.institution_type == 'Educational':
-                    group = self.db.get_user_group(user_id) or "N/A"
-                    self.preview_table.setItem(row, 1, QTableWidgetItem(group))
-                elif self.institution_type == 'Enterprise':
-                    position = self.db.get_user_position(user_id) or "N/A"
-                    self.preview_table.setItem(row, 1, QTableWidgetItem(position))
-                self.preview_table.setItem(row, 2, QTableWidgetItem(date_str))
-                self.preview_table.setItem(row, 3, QTableWidgetItem(time_str))
-
-
-    def export_to_excel(self):
-        """Экспорт данных в Excel"""
-        try:
-            file_path, _ = QFileDialog.getSaveFileName(
-                self,
-                "Сохранить как",
-                f"Посещаемость_{self.start_date.date().toString('dd-MM-yyyy')}_{self.end_date.date().toString('dd-MM-yyyy')}.xlsx",
-                "Excel Files (*.xlsx)"
-            )
-            
-            if not file_path:
-                return
-                
-            start = self.start_date.date().toString("yyyy-MM-dd")
-            end = self.end_date.date().toString("yyyy-MM-dd")
-            records = self.db.get_attendance(start, end)
-            
-            # Формирование DataFrame
-            data = []
-            for user_id, fullname, times in records:
-
-                if self.institution_type == 'Educational':
-                    group = self.db.get_user_group(user_id) or "N/A"
-                elif self.institution_type == 'Enterprise':
-                    position = self.db.get_user_position(user_id) or "N/A"
-
-                for entry in times.split(';'):
-                    entry = entry.strip()
-                    if entry:
-                        try:
-                            dt = datetime.strptime(entry, "%d.%m.%Y %H:%M")
-                            if self.institution_type == 'Educational':
-                                data.append({
-                                    "ФИО": fullname,
-                                    "Группа": group,
-                                    "Дата": dt.strftime("%d.%m.%Y"),
-                                    "Время": dt.strftime("%H:%M")
-                                })
-                            elif self.institution_type == 'Enterprise':
-                                data.append({
-                                    "ФИО": fullname,
-                                    "Должность": position,
-                                    "Дата": dt.strftime("%d.%m.%Y"),
-                                    "Время": dt.strftime("%H:%M")
-                                })
-                        except ValueError:
-                            continue
-            
-            if not data:
-                QMessageBox.warning(self, "Нет данных", "Нет данных для экспорта.")
-                return
-                
-            df = pd.DataFrame(data)
-            df.to_excel(file_path, index=False, engine='openpyxl')
-            
-            QMessageBox.information(
-                self, 
-                "Экспорт завершен", 
-                f"Данные успешно экспортированы в файл:\n{file_path}"
-            )
-            
-        except Exception as e:
-            QMessageBox.critical(
-                self, 
-                "Ошибка экспорта", 
-                f"Не удалось выполнить экспорт:\n{str(e)}"
-            )
\ No newline at end of file
+    def display_preview(self, records: List[AttendanceEvent]):
+        """Отображение данных для предпросмотра (одна строка таблицы на посещение)"""
+        self.preview_table.setRowCount(len(records))
+
+        for row, event in enumerate(records):
+            self.preview_table.setItem(row, 0, QTableWidgetItem(event.fullname))
+            self.preview_table.setItem(row, 1, QTableWidgetItem(event.category))
+            self.preview_table.setItem(row, 2, QTableWidgetItem(event.timestamp.strftime("%d.%m.%Y")))
+            self.preview_table.setItem(row, 3, QTableWidgetItem(event.timestamp.strftime("%H:%M")))
+
+
+    def export_data(self):
+        """Экспорт посещений за период в фоновом потоке"""
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self,
+            "Сохранить как",
+            f"Посещаемость_{self.start_date.date().toString('dd-MM-yyyy')}_{self.end_date.date().toString('dd-MM-yyyy')}.xlsx",
+            ";;".join(EXPORT_FILTERS)
+        )
+
+        if not file_path:
+            return
+        # Имя без расширения дополняется расширением выбранного фильтра
+        if not file_path.lower().endswith(EXPORT_FORMATS):
+            file_path += EXPORT_FILTERS.get(selected_filter, ".xlsx")
+
+        self.export_worker = ExportWorker(
+            self.institution_type,
+            self.start_date.date().toString("yyyy-MM-dd"),
+            self.end_date.date().toString("yyyy-MM-dd"),
+            file_path,
+            per_category=self.per_category_check.isChecked(),
+            parent=self
+        )
+        self.export_worker.progress.connect(self.update_progress)
+        self.export_worker.completed.connect(self.handle_export_completed)
+        self.export_worker.cancelled.connect(self.handle_export_cancelled)
+        self.export_worker.failed.connect(self.handle_export_failed)
+        self.export_worker.finished.connect(self.handle_export_finished)
+
+        self.progress_bar.setRange(0, 0)  # до первой части - без процента
+        self.set_exporting(True)
+        self.export_worker.start()
+
+
+    def cancel_export(self):
+        if self.export_worker is not None:
+            self.cancel_btn.setEnabled(False)
+            self.export_worker.cancel()
+
+
+    def stop_export(self):
+        """Отмена экспорта и ожидание потока (при закрытии окна)"""
+        if self.export_worker is not None:
+            self.export_worker.cancel()
+            self.export_worker.wait()
+
+
+    def set_exporting(self, exporting: bool):
+        self.progress_bar.setVisible(exporting)
+        self.cancel_btn.setVisible(exporting)
+        self.cancel_btn.setEnabled(exporting)
+        self.load_btn.setEnabled(not exporting)
+        self.export_btn.setEnabled(not exporting and self.preview_table.rowCount() > 0)
+
+
+    def update_progress(self, done: int, total: int):
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+        self.progress_bar.setFormat(f"{done} из {total} записей")
+
+
+    def handle_export_completed(self, written: int):
+        if not written:
+            QMessageBox.warning(self, "Нет данных", "За выбранный период записи отсутствуют, сохранены только заголовки.")
+            return
+        QMessageBox.information(
+            self,
+            "Экспорт завершен",
+            f"Экспортировано записей: {written}\nФайл:\n{self.export_worker.path}"
+        )
+
+
+    def handle_export_cancelled(self):
+        QMessageBox.information(self, "Экспорт отменен", "Экспорт отменен, файл не сохранен.")
+
+
+    def handle_export_failed(self, message: str):
+        QMessageBox.critical(
+            self,
+            "Ошибка экспорта",
+            f"Не удалось выполнить экспорт:\n{message}"
+        )
+
+
+    def handle_export_finished(self):
+        self.export_worker = None
+        self.set_exporting(False)
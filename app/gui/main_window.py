@@ -1,17 +1,22 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QTabWidget, QVBoxLayout, 
-                            QHBoxLayout, QLabel, QPushButton, QTableWidget, 
-                            QTableWidgetItem, QHeaderView, QMessageBox, QMenuBar, QApplication)
-from PyQt6.QtCore import Qt, QTimer, pyqtSignal
-from PyQt6.QtGui import QImage, QPixmap, QAction, QIcon
-import cv2
-from ..core.face_recognition import FaceRecognizer
+                            QHBoxLayout, QPushButton, QTableWidget, 
+                            QTableWidgetItem, QHeaderView, QMessageBox, QMenuBar, QApplication, QComboBox)
+from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtGui import QAction, QIcon
+from ..core.attendance_writer import AttendanceWriter
 from ..core.database import DatabaseManager
+from ..core.frame_queue import LatestFrameQueue
+from ..core.capture import parse_sources
+from ..core.profiling import StageTimer
+from ..core.roi import parse_rois, format_rois, normalize_roi
 from datetime import datetime
 from .registration import RegistrationWidget
 from .statistics import StatisticsWidget
 from .system_participants import SystemParticipantsWidget
 from .export import ExportWidget
 from .settings import SettingsDialog
+from .video_label import VideoLabel
+from .startup import RecognizerLoader
 from ..settings.settings import SettingsManager
 EXIT_CODE_REBOOT = 1001
 
@@ -22,28 +27,48 @@ class MainWindow(QMainWindow):
     update_table_signal = pyqtSignal()
     
 
-    def __init__(self, settings_manager: SettingsManager):
+    def __init__(self, settings_manager: SettingsManager, startup_timer: StageTimer = None):
         """
         Инициализация главного окна
+        Окно показывается сразу, модель и галерея загружаются в фоновом потоке
         :param settings_manager: Объект SettingsManager для работы с конфигурационными файлами
+        :param startup_timer: Время этапов запуска (импорт и т.д.) для отчета о запуске
         """
 
         super().__init__()
+        self.startup_timer = startup_timer or StageTimer()
         self.settings_manager = settings_manager
         self.settings_manager.load_settings()
         self.institution_type = settings_manager.get_setting('institution')
         self.db = DatabaseManager(settings_manager.get_setting('institution'))
         self.restart_required = False
         self.tracking_active = False
-        self.cap = cv2.VideoCapture(0)
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_frame)
-        self.face_recognizer = FaceRecognizer(self.db, self.settings_manager)
-        self.init_ui()
-
-        # Связывание сигналов
-        self.update_table_signal.connect(self.update_attendance_table)
-        self.update_attendance_table()
+        self.camera_sources = parse_sources(settings_manager.get_setting('camera_sources'))
+        self.camera_rois = parse_rois(settings_manager.get_setting('camera_rois'))
+        self.capture_thread = None
+        self.inference_thread = None
+        self.camera_pool = None
+        self.last_results = []
+        self.face_recognizer = None
+        self.recognizer_loader = None
+        # Посещения записываются отдельным потоком; таблица обновляется после записи
+        self.attendance_writer = AttendanceWriter(
+            self.institution_type,
+            batch_size=int(self.settings_manager.get_setting('attendance_batch_size')),
+            flush_interval=int(self.settings_manager.get_setting('attendance_flush_ms')) / 1000,
+            on_flush=lambda added: self.update_table_signal.emit()
+        )
+        self.attendance_writer.start()
+        # Настройки изменены во время загрузки распознавателя
+        self.settings_pending = False
+        with self.startup_timer.measure('интерфейс'):
+            self.init_ui()
+
+            # Связывание сигналов
+            self.update_table_signal.connect(self.update_attendance_table)
+            self.update_attendance_table()
+
+        self.load_face_recognizer()
 
 
     def init_ui(self):
@@ -68,8 +93,8 @@ class MainWindow(QMainWindow):
         self.main_tab = QWidget()
         self.tabs.addTab(self.main_tab, "Главная")
 
-        # Вкладка "Регистрация"
-        self.registration_tab = RegistrationWidget(self.db, self.face_recognizer)
+        # Вкладка "Регистрация" (распознаватель передается после загрузки)
+        self.registration_tab = RegistrationWidget(self.db, None)
         self.registration_tab.registration_complete.connect(self.handle_registration_complete)
         self.tabs.addTab(self.registration_tab, "Регистрация")
 
@@ -79,6 +104,7 @@ class MainWindow(QMainWindow):
 
         # Вкладка "Участники системы"
         self.users_tab = SystemParticipantsWidget(self.db)
+        self.users_tab.user_deleted.connect(self.handle_user_deleted)
         self.tabs.addTab(self.users_tab, "Участники системы")
 
         # Вкладка "Экспорт"
@@ -92,7 +118,8 @@ class MainWindow(QMainWindow):
         left_panel = QVBoxLayout()
         
         # Область для видео
-        self.video_label = QLabel("Нажмите 'Начать отслеживание' для активации")
+        self.video_label = VideoLabel("Нажмите 'Начать отслеживание' для активации")
+        self.video_label.roi_selected.connect(self.handle_roi_selected)
         self.video_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.video_label.setStyleSheet("border: 2px solid gray;")
         self.video_label.setMinimumSize(640, 480)
@@ -100,8 +127,22 @@ class MainWindow(QMainWindow):
         # Кнопка управления отслеживанием
         self.tracking_btn = QPushButton("Начать отслеживание")
         self.tracking_btn.clicked.connect(self.toggle_tracking)
+
+        # Редактирование области интереса поверх видео
+        self.roi_btn = QPushButton("Изменить область распознавания")
+        self.roi_btn.setCheckable(True)
+        self.roi_btn.setToolTip("Выделите область мышью; правая кнопка - весь кадр")
+        self.roi_btn.toggled.connect(self.video_label.set_editing)
+
+        # Выбор камеры для предпросмотра (если камер несколько)
+        self.camera_select = QComboBox()
+        self.camera_select.addItems([f"Камера {index + 1}: {source}" for index, source in enumerate(self.camera_sources)])
+        self.camera_select.currentIndexChanged.connect(self.select_preview_camera)
+        self.camera_select.setVisible(len(self.camera_sources) > 1)
         
         left_panel.addWidget(self.video_label)
+        left_panel.addWidget(self.camera_select)
+        left_panel.addWidget(self.roi_btn)
         left_panel.addWidget(self.tracking_btn)
         
         # Правая панель: таблица посещаемости
@@ -125,57 +166,203 @@ class MainWindow(QMainWindow):
         """
         Запуск/остановка режима отслеживание и поиска лиц
         """
+        if self.face_recognizer is None:
+            QMessageBox.information(self, "Внимание", "Модель распознавания еще загружается")
+            return
+
         self.tracking_active = not self.tracking_active
         
         if self.tracking_active:
         
-            if not self.face_recognizer.known_embeddings:
+            if len(self.face_recognizer.gallery) == 0:
                 QMessageBox.warning(self, "Внимание", "Нет зарегистрированных пользователей!")
                 self.tracking_active = False
                 return
 
-            self.cap = cv2.VideoCapture(0)
-        
-            if not self.cap.isOpened():
-                QMessageBox.critical(self, "Ошибка", "Камера недоступна!")
-                self.tracking_active = False
-                return
-
+            self.start_pipeline()
             self.tracking_btn.setText("Остановить отслеживание")
-            self.timer.start(100)  # 100 мс
         
         else:
         
             self.tracking_btn.setText("Начать отслеживание")
-            self.timer.stop()
-            if self.cap.isOpened():
-                self.cap.release()
+            self.stop_pipeline()
             self.video_label.clear()
             self.video_label.setText("Нажмите 'Начать отслеживание' для активации")
 
 
-    def update_frame(self):
-        """Обновление кадра с распознаванием лиц"""
+    def load_face_recognizer(self, recognizer=None):
+        """
+        Фоновая загрузка моделей и галереи с отображением хода в строке состояния
+        :param recognizer: Работающий распознаватель для применения измененных настроек
+        """
+        if recognizer is None:
+            self.statusBar().showMessage("Загрузка модели распознавания...")
+            self.tracking_btn.setEnabled(False)
+        self.recognizer_loader = RecognizerLoader(self.db, self.settings_manager, self.startup_timer,
+                                                  recognizer=recognizer, parent=self)
+        self.recognizer_loader.progress.connect(self.statusBar().showMessage)
+        self.recognizer_loader.loaded.connect(self.handle_recognizer_loaded)
+        self.recognizer_loader.failed.connect(self.handle_recognizer_failed)
+        self.recognizer_loader.start()
+
+
+    def handle_recognizer_loaded(self, face_recognizer):
+        """Распознаватель загружен: подключение к вкладкам и потоку распознавания"""
+        face_recognizer.set_roi(self.camera_rois.get(0))
+        face_recognizer.set_attendance_writer(self.attendance_writer)
+        self.face_recognizer = face_recognizer
+        self.registration_tab.set_face_recognizer(face_recognizer)
+        if self.inference_thread is not None:
+            self.inference_thread.face_recognizer = face_recognizer
+        self.tracking_btn.setEnabled(True)
+        self.recognizer_loader = None
+
+        self.publish_gallery()
+
+        self.statusBar().showMessage(f"Модель загружена, пользователей в галерее: {len(face_recognizer.gallery.user_names)}", 5000)
+        if self.startup_timer.totals:
+            print(f"Время загрузки: {self.startup_timer.summary()}")
+            self.startup_timer.reset()
+
+        if self.settings_pending:
+            self.settings_pending = False
+            self.recreate_face_recognizer()
+
+
+    def handle_recognizer_failed(self, message: str):
+        self.recognizer_loader = None
+        self.settings_pending = False
+        self.statusBar().showMessage("Ошибка загрузки модели распознавания")
+        QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить модель распознавания:\n{message}")
+
+
+    def start_pipeline(self):
+        """Запуск потоков захвата и распознавания (для нескольких камер - пула процессов)"""
+        from .video_pipeline import CaptureThread, InferenceThread
+
+        self.last_results = []
+        if len(self.camera_sources) > 1:
+            self.start_camera_pool()
+            return
+
+        frame_queue = LatestFrameQueue(maxsize=1)
+        self.capture_thread = CaptureThread(self.camera_sources[0], frame_queue,
+                                            resolution=self.face_recognizer.CAPTURE_RESOLUTION, parent=self)
+        self.capture_thread.frame_captured.connect(self.update_frame)
+        self.capture_thread.capture_failed.connect(self.handle_capture_failed)
+
+        self.inference_thread = InferenceThread(self.face_recognizer, frame_queue, parent=self)
+        self.inference_thread.results_ready.connect(self.handle_results)
+
+        self.inference_thread.start()
+        self.capture_thread.start()
+
+
+    def start_camera_pool(self):
+        """Запуск процессов камер с общей галереей"""
+        from ..core.camera_pool import CameraPool
+        from .video_pipeline import PoolReaderThread
+
+        self.camera_pool = CameraPool(self.camera_sources, self.face_recognizer.get_snapshot_dir(),
+                                      rois=self.camera_rois)
+        self.camera_pool.preview_source.value = self.camera_select.currentIndex()
+        with self.face_recognizer.lock:
+            self.camera_pool.start(self.face_recognizer.gallery)
+
+        self.capture_thread = PoolReaderThread(self.camera_pool, parent=self)
+        self.capture_thread.frame_captured.connect(self.update_frame)
+        self.capture_thread.results_ready.connect(self.handle_preview_results)
+        self.capture_thread.attendance_ready.connect(self.handle_attendance)
+        self.capture_thread.capture_failed.connect(self.handle_capture_failed)
+        self.capture_thread.start()
+
+
+    def stop_pipeline(self):
+        """Остановка потоков захвата и распознавания"""
+        if self.capture_thread is not None:
+            self.capture_thread.stop()
+            self.capture_thread = None
+
+        if self.inference_thread is not None:
+            self.inference_thread.stop()
+            self.inference_thread = None
+            if self.face_recognizer is not None and self.face_recognizer.timings.totals:
+                print(f"Время этапов обработки кадра: {self.face_recognizer.timings.summary()}")
+
+        if self.camera_pool is not None:
+            self.camera_pool.stop()
+            self.camera_pool = None
+
+
+    def select_preview_camera(self, index: int):
+        """Смена камеры для предпросмотра"""
+        self.last_results = []
+        if self.camera_pool is not None:
+            self.camera_pool.preview_source.value = index
+
+
+    def handle_roi_selected(self, roi):
+        """Сохранение области интереса камеры, показанной в предпросмотре"""
+        source_index = self.camera_select.currentIndex()
+        roi = normalize_roi(roi)
+        if roi is None:
+            self.camera_rois.pop(source_index, None)
+        else:
+            self.camera_rois[source_index] = roi
+        self.settings_manager.update_setting('camera_rois', format_rois(self.camera_rois))
+
+        if self.camera_pool is not None:
+            self.camera_pool.set_roi(source_index, roi)
+        elif source_index == 0 and self.face_recognizer is not None:
+            self.face_recognizer.set_roi(roi)
+        self.roi_btn.setChecked(False)
+
+
+    def publish_gallery(self):
+        """Передача обновленной галереи процессам камер"""
+        if self.camera_pool is not None and self.face_recognizer is not None:
+            with self.face_recognizer.lock:
+                self.camera_pool.publish_gallery(self.face_recognizer.gallery)
+
+
+    def handle_capture_failed(self, message: str):
+        """Ошибка открытия камеры в потоке захвата"""
+        QMessageBox.critical(self, "Ошибка", message)
+        if self.tracking_active and self.camera_pool is None:
+            self.toggle_tracking()
 
-        ret, frame = self.cap.read()
-        if ret:
-        
-            # Распознавание лиц и получение результатов
-            processed_frame, recognized_users = self.face_recognizer.process_frame(frame)
 
-            # Обновление таблицы при обнаружении
-            if recognized_users:
-                self.update_table_signal.emit()
+    def handle_results(self, results: list):
+        """Результаты распознавания из рабочего потока: отметка посещения в потоке GUI"""
+        self.handle_preview_results(results)
+        self.handle_attendance([result for result in results if result['recognized']])
 
-            # Конвертация для отображения в Qt
-            rgb_image = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2RGB)
-            h, w, ch = rgb_image.shape
-            bytes_per_line = ch * w
-            q_img = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-            self.video_label.setPixmap(QPixmap.fromImage(q_img).scaled(
-                self.video_label.size(),
-                Qt.AspectRatioMode.KeepAspectRatio,
-            ))
+
+    def handle_preview_results(self, results: list):
+        """Результаты распознавания для отображения поверх кадров"""
+        self.last_results = results
+
+
+    def handle_attendance(self, recognized_users: list):
+        """
+        Отметка посещения распознанных пользователей
+        События всех камер проходят через этот метод в одном потоке,
+        поэтому повторные появления человека перед разными камерами не дублируются
+        """
+        # Таблица обновляется после записи очереди посещений (update_table_signal)
+        if recognized_users:
+            self.face_recognizer.mark_attendance(recognized_users)
+
+
+    def update_frame(self, frame):
+        """Отображение кадра с камеры с последними результатами распознавания"""
+        if self.capture_thread is None:
+            return
+
+        # Кадр выводится без копирования, рамки и подписи рисуются поверх него
+        roi = self.camera_rois.get(self.camera_select.currentIndex())
+        self.video_label.show_frame(frame, self.last_results, roi)
+        self.capture_thread.frame_displayed()
 
 
     def update_attendance_table(self):
@@ -225,14 +412,23 @@ class MainWindow(QMainWindow):
 
 
     def handle_registration_complete(self):
-        """Обновление данных после регистрации"""
-        self.face_recognizer.load_known_faces()
-        self.face_recognizer.last_detected_user = None  # Сброс кэша
+        """Обновление данных после регистрации (пользователь уже добавлен в галерею)"""
+        if self.face_recognizer is not None:
+            self.face_recognizer.presence.invalidate()  # Регистрация добавила отметку посещения
+            self.publish_gallery()
         self.update_attendance_table()
         self.update_table_signal.emit()
         self.video_label.repaint()
 
 
+    def handle_user_deleted(self, user_id: int):
+        """Удаление пользователя из галереи распознавания"""
+        if self.face_recognizer is not None:
+            self.face_recognizer.remove_user(user_id)
+            self.publish_gallery()
+        self.update_attendance_table()
+
+
     def open_settings(self):
         """Открытие настроек"""
         settings_dialog = SettingsDialog(self.settings_manager, parent=self)
@@ -250,7 +446,8 @@ class MainWindow(QMainWindow):
             self.recreate_db()
             self.restart_required = True
             self.close()
-            
+            return
+
         self.recreate_face_recognizer()
 
 
@@ -263,18 +460,31 @@ class MainWindow(QMainWindow):
 
 
     def recreate_face_recognizer(self):
-        """Пересоздание объекта FaceRecognizer с обновленными настройками"""
-        if hasattr(self, "face_recognizer"):
-            del self.face_recognizer
+        """
+        Применение обновленных настроек к FaceRecognizer (в фоновом потоке)
+        Распознаватель и галерея сохраняются; модели перезагружаются только при изменении
+        модели или провайдера
+        """
+        if self.recognizer_loader is not None:
+            self.settings_pending = True
+            return
+
+        # Процессы камер читают настройки при запуске
+        if self.camera_pool is not None:
+            self.toggle_tracking()
+            self.statusBar().showMessage("Отслеживание остановлено для применения настроек", 5000)
 
-        self.face_recognizer = FaceRecognizer(self.db, self.settings_manager)
-        self.face_recognizer.load_known_faces()
+        self.load_face_recognizer(self.face_recognizer)
 
 
     def closeEvent(self, event):
         """Обработчик закрытия окна"""
-        if self.cap.isOpened():
-            self.cap.release()
+        self.stop_pipeline()
+        self.export_tab.stop_export()
+        if self.recognizer_loader is not None:
+            self.recognizer_loader.wait()
+        self.attendance_writer.stop()
+        print(f"Запись посещений: {self.attendance_writer.summary()}")
 
         # Для перезапуска
         if self.restart_required:
@@ -1,19 +1,23 @@
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLabel, QLineEdit,
                             QPushButton, QFormLayout, QMessageBox, QSizePolicy, QComboBox, QDateEdit)
 from PyQt6.QtCore import Qt, pyqtSignal
-from ..core.face_recognition import FaceRecognizer
+from typing import TYPE_CHECKING, Optional
 from ..core.database import DatabaseManager
 
+if TYPE_CHECKING:
+    from ..core.face_recognition import FaceRecognizer
+
 
 
 class RegistrationWidget(QWidget):
 
     registration_complete = pyqtSignal()
 
-    def __init__(self, db: DatabaseManager, face_recognizer: FaceRecognizer):
+    def __init__(self, db: DatabaseManager, face_recognizer: Optional['FaceRecognizer']):
         """
         Инициализация вкладки "Регистрация"
         :param db: Объект DatabaseManager для работы с базой данных
+        :param face_recognizer: Распознаватель (None, пока модель загружается)
         """
 
         super().__init__()
@@ -24,6 +28,10 @@ class RegistrationWidget(QWidget):
         self.init_ui()
 
 
+    def set_face_recognizer(self, face_recognizer: 'FaceRecognizer'):
+        self.face_recognizer = face_recognizer
+
+
     def init_ui(self):
         self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
         main_layout = QVBoxLayout(self)
@@ -130,6 +138,10 @@ class RegistrationWidget(QWidget):
             QMessageBox.critical(self, "Ошибка", "Все поля обязательны для заполнения!")
             return
 
+        if self.face_recognizer is None:
+            QMessageBox.information(self, "Внимание", "Модель распознавания еще загружается")
+            return
+
         # Сохранение в БД
         user_id = self.db.add_user(user_data)
         if user_id == -1:
@@ -145,6 +157,7 @@ class RegistrationWidget(QWidget):
                 "Пользователь успешно зарегистрирован!\nЛицо добавлено в систему.")
         else:
             self.db.delete_user(user_id)
+            self.face_recognizer.remove_user(user_id)
             QMessageBox.critical(self, "Ошибка", 
                 "Не удалось захватить изображения лица!")
 
@@ -0,0 +1,66 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+from ..core.database import DatabaseManager
+from ..core.profiling import StageTimer
+from ..settings.settings import SettingsManager
+
+
+
+class RecognizerLoader(QThread):
+
+    progress = pyqtSignal(str)
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, db: DatabaseManager, settings_manager: SettingsManager, timer: StageTimer,
+                 recognizer=None, parent=None):
+        """
+        Фоновая загрузка FaceRecognizer: импорт InsightFace/onnxruntime, инициализация
+        моделей и загрузка галереи выполняются после появления окна
+        :param db: Соединение с БД главного потока (передается в FaceRecognizer для отметок посещения)
+        :param timer: Накопитель времени этапов запуска
+        :param recognizer: Работающий распознаватель, к которому применяются измененные настройки
+                           (модели и галерея загружаются заново только при необходимости)
+        """
+        super().__init__(parent)
+        self.db = db
+        self.settings_manager = settings_manager
+        self.timer = timer
+        self.recognizer = recognizer
+
+
+    def run(self):
+        try:
+            if self.recognizer is not None:
+                self.progress.emit("Применение настроек...")
+                with self.timer.measure('модель'):
+                    reload_gallery = self.recognizer.apply_settings()
+                if not reload_gallery:
+                    self.loaded.emit(self.recognizer)
+                    return
+                recognizer = self.recognizer
+            else:
+                self.progress.emit("Загрузка библиотек распознавания...")
+                with self.timer.measure('импорт моделей'):
+                    from ..core.face_recognition import FaceRecognizer
+
+                self.progress.emit("Инициализация модели...")
+                with self.timer.measure('модель'):
+                    recognizer = FaceRecognizer(self.db, self.settings_manager, load_gallery=False)
+
+            # Соединение SQLite привязано к создавшему его потоку: пользователи читаются своим
+            self.progress.emit("Загрузка галереи...")
+            with self.timer.measure('галерея'):
+                db = DatabaseManager(self.db.institution_type)
+                users = db.get_all_users()
+                db.conn.close()
+                recognizer.load_known_faces(users, progress=self._report_gallery)
+
+            self.loaded.emit(recognizer)
+
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+    def _report_gallery(self, done: int, total: int):
+        if done % 20 == 0:
+            self.progress.emit(f"Загрузка галереи: {done}/{total} пользователей")
@@ -1,8 +1,8 @@
-from datetime import datetime
+from typing import List
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, 
                             QPushButton, QTableWidget, QTableWidgetItem, QHeaderView)
 from PyQt6.QtCore import Qt, QDate
-from ..core.database import DatabaseManager
+from ..core.database import AttendanceEvent, DatabaseManager
 
 
 
@@ -83,7 +83,7 @@ class StatisticsWidget(QWidget):
             self.load_last_30_days()
             return
             
-        records = self.db.get_attendance_by_search(search_text)
+        records = self.db.get_attendance_events_by_search(search_text)
         self.display_results(records)
         
 
@@ -95,7 +95,7 @@ class StatisticsWidget(QWidget):
             return
             
         try:
-            records = self.db.get_attendance_by_date(date_input)
+            records = self.db.get_attendance_events_by_date(date_input)
             self.display_results(records)
         except ValueError as e:
             print(f"Ошибка даты: {str(e)}")
@@ -105,37 +105,16 @@ class StatisticsWidget(QWidget):
         """Загрузка данных за последние 30 дней"""
         end_date = QDate.currentDate().toString("yyyy-MM-dd")
         start_date = QDate.currentDate().addDays(-30).toString("yyyy-MM-dd")
-        records = self.db.get_attendance(start_date, end_date)
+        records = self.db.get_attendance_events(start_date, end_date)
         self.display_results(records)
         
         
-    def display_results(self, records):
-        """Отображение результатов"""
-        self.results_table.setRowCount(0)
-        
-        for user_id, fullname, times in records:
-            for entry in times.split(';'):
-                entry = entry.strip()
-                if not entry:
-                    continue
-                    
-                row = self.results_table.rowCount()
-                self.results_table.insertRow(row)
-                
-                try:
-                    dt = datetime.strptime(entry, "%d.%m.%Y %H:%M")
-                    date_str = dt.strftime("%d.%m.%Y")
-                    time_str = dt.strftime("%H:%M")
-                except:
-                    date_str = time_str = "N/A"
-                
-                # Таблица
-                self.results_table.setItem(row, 0, QTableWidgetItem(fullname))
-                if self.institution_type == 'Educational':
-                    group = self.db.get_user_group(user_id)
-                    self.results_table.setItem(row, 1, QTableWidgetItem(group))
-                elif self.institution_type == 'Enterprise':
-                    position = self.db.get_user_position(user_id)
-                    self.results_table.setItem(row, 1, QTableWidgetItem(position))
-                self.results_table.setItem(row, 2, QTableWidgetItem(date_str))
-                self.results_table.setItem(row, 3, QTableWidgetItem(time_str))
\ No newline at end of file
+    def display_results(self, records: List[AttendanceEvent]):
+        """Отображение результатов (одна строка таблицы на посещение)"""
+        self.results_table.setRowCount(len(records))
+
+        for row, event in enumerate(records):
+            self.results_table.setItem(row, 0, QTableWidgetItem(event.fullname))
+            self.results_table.setItem(row, 1, QTableWidgetItem(event.category))
+            self.results_table.setItem(row, 2, QTableWidgetItem(event.timestamp.strftime("%d.%m.%Y")))
+            self.results_table.setItem(row, 3, QTableWidgetItem(event.timestamp.strftime("%H:%M")))
\ No newline at end of file
@@ -1,13 +1,15 @@
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, 
                             QPushButton, QTableWidget, QTableWidgetItem,
                             QHeaderView, QMessageBox)
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, pyqtSignal
 from ..core.database import DatabaseManager
 
 
 
 
 class SystemParticipantsWidget(QWidget):
+
+    user_deleted = pyqtSignal(int)
     
     def __init__(self, db: DatabaseManager):
         """
@@ -113,6 +115,7 @@ class SystemParticipantsWidget(QWidget):
             
             if reply == QMessageBox.StandardButton.Yes:
                 if self.db.delete_user(user_id):
+                    self.user_deleted.emit(user_id)
                     self.load_users()
                     QMessageBox.information(self, "Успех", "Пользователь успешно удален!")
                 else:
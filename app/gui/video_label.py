@@ -0,0 +1,153 @@
+from PyQt6.QtWidgets import QLabel
+from PyQt6.QtCore import Qt, QPointF, QRect, QRectF, pyqtSignal
+from PyQt6.QtGui import QColor, QImage, QPainter, QPen
+
+
+# Цвета рамок: распознанное лицо, неизвестное лицо, область интереса
+RECOGNIZED_COLOR = QColor(0, 255, 0)
+UNKNOWN_COLOR = QColor(255, 0, 0)
+ROI_COLOR = QColor(255, 255, 0)
+
+
+
+class VideoLabel(QLabel):
+
+    roi_selected = pyqtSignal(object)
+
+    def __init__(self, text: str = "", parent=None):
+        """
+        Область отображения видео с выделением области интереса мышью
+        Кадр BGR выводится напрямую (без копирования и конвертации в RGB),
+        рамки и подписи лиц рисуются QPainter поверх масштабированного кадра.
+        В режиме редактирования прямоугольник рисуется протягиванием левой кнопкой,
+        правая кнопка сбрасывает область на весь кадр. Выбранная область отправляется
+        сигналом roi_selected в долях кадра (x1, y1, x2, y2) или None
+        """
+        super().__init__(text, parent)
+        self.editing = False
+        self.drag_start = None
+        self.drag_end = None
+        self.frame = None
+        self.image = None
+        self.results = []
+        self.roi = None
+
+
+    def show_frame(self, frame, results: list, roi=None):
+        """
+        Вывод кадра с результатами распознавания
+        :param frame: Кадр BGR (numpy); QImage ссылается на его буфер, поэтому кадр хранится до следующего
+        :param results: Результаты FaceRecognizer.analyze_frame (координаты в пикселях кадра)
+        :param roi: Область интереса в долях кадра или None
+        """
+        if self.image is None and self.text():
+            self.setText("")
+        height, width = frame.shape[:2]
+        self.frame = frame
+        self.image = QImage(frame.data, width, height, frame.strides[0], QImage.Format.Format_BGR888)
+        self.results = results
+        self.roi = roi
+        self.update()
+
+
+    def clear(self):
+        self.frame = None
+        self.image = None
+        self.results = []
+        self.roi = None
+        super().clear()
+
+
+    def set_editing(self, editing: bool):
+        self.editing = editing
+        self.drag_start = None
+        self.drag_end = None
+        self.setCursor(Qt.CursorShape.CrossCursor if editing else Qt.CursorShape.ArrowCursor)
+        self.update()
+
+
+    def image_rect(self) -> QRect:
+        """Положение отображаемого кадра внутри виджета (кадр масштабирован с сохранением пропорций и отцентрован)"""
+        if self.image is None:
+            return QRect()
+        size = self.image.size().scaled(self.size(), Qt.AspectRatioMode.KeepAspectRatio)
+        x = (self.width() - size.width()) // 2
+        y = (self.height() - size.height()) // 2
+        return QRect(x, y, size.width(), size.height())
+
+
+    def mousePressEvent(self, event):
+        if not self.editing or self.image_rect().isEmpty():
+            return super().mousePressEvent(event)
+
+        if event.button() == Qt.MouseButton.RightButton:
+            self.roi_selected.emit(None)
+        elif event.button() == Qt.MouseButton.LeftButton:
+            self.drag_start = event.position().toPoint()
+            self.drag_end = self.drag_start
+        self.update()
+
+
+    def mouseMoveEvent(self, event):
+        if self.editing and self.drag_start is not None:
+            self.drag_end = event.position().toPoint()
+            self.update()
+        else:
+            super().mouseMoveEvent(event)
+
+
+    def mouseReleaseEvent(self, event):
+        if not self.editing or self.drag_start is None or event.button() != Qt.MouseButton.LeftButton:
+            return super().mouseReleaseEvent(event)
+
+        image = self.image_rect()
+        start, end = self.drag_start, event.position().toPoint()
+        self.drag_start = None
+        self.drag_end = None
+        self.update()
+        self.roi_selected.emit((
+            (start.x() - image.x()) / image.width(), (start.y() - image.y()) / image.height(),
+            (end.x() - image.x()) / image.width(), (end.y() - image.y()) / image.height()
+        ))
+
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.image is None and self.drag_start is None:
+            return
+
+        painter = QPainter(self)
+        if self.image is not None:
+            target = self.image_rect()
+            # Масштабирование выполняется при отрисовке, без промежуточного QPixmap
+            painter.drawImage(target, self.image)
+            self._draw_overlay(painter, target)
+
+        # Выделяемая область поверх кадра
+        if self.drag_start is not None and self.drag_end is not None:
+            painter.setPen(QPen(ROI_COLOR, 2, Qt.PenStyle.DashLine))
+            painter.drawRect(QRect(self.drag_start, self.drag_end).normalized())
+        painter.end()
+
+
+    def _draw_overlay(self, painter: QPainter, target: QRect):
+        """Рамки и подписи лиц, граница области интереса (координаты кадра -> координаты виджета)"""
+        scale_x = target.width() / self.image.width()
+        scale_y = target.height() / self.image.height()
+
+        if self.roi is not None:
+            x1, y1, x2, y2 = self.roi
+            painter.setPen(QPen(ROI_COLOR, 1))
+            painter.drawRect(QRectF(target.x() + x1 * target.width(), target.y() + y1 * target.height(),
+                                    (x2 - x1) * target.width(), (y2 - y1) * target.height()))
+
+        for result in self.results:
+            x1, y1, x2, y2 = result['bbox'][:4]
+            color = RECOGNIZED_COLOR if result['recognized'] else UNKNOWN_COLOR
+            label = f"{result['user_name']} ({result['similarity']:.2f})" if result['recognized'] else "Неизвестный"
+            left = target.x() + x1 * scale_x
+            top = target.y() + y1 * scale_y
+
+            painter.setPen(QPen(color, 2))
+            painter.drawRect(QRectF(left, top, (x2 - x1) * scale_x, (y2 - y1) * scale_y))
+            painter.drawText(QPointF(left, top - 5), label)
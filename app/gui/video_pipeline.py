@@ -0,0 +1,144 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+from typing import TYPE_CHECKING
+from ..core.capture import open_capture
+from ..core.frame_queue import LatestFrameQueue
+
+if TYPE_CHECKING:
+    from ..core.camera_pool import CameraPool
+    from ..core.face_recognition import FaceRecognizer
+
+
+
+class CaptureThread(QThread):
+
+    frame_captured = pyqtSignal(object)
+    capture_failed = pyqtSignal(str)
+
+    def __init__(self, source, frame_queue: LatestFrameQueue, resolution=(0, 0), parent=None):
+        """
+        Поток захвата кадров с камеры
+        :param source: Индекс камеры или путь/URL видеопотока для cv2.VideoCapture
+        :param frame_queue: Очередь кадров для потока распознавания
+        :param resolution: Запрашиваемое разрешение захвата (0 - по умолчанию камеры)
+        """
+        super().__init__(parent)
+        self.source = source
+        self.resolution = resolution
+        self.frame_queue = frame_queue
+        # Новый кадр отправляется в GUI, только когда предыдущий уже отображен
+        self.display_pending = False
+
+
+    def run(self):
+        cap = open_capture(self.source, self.resolution)
+        if not cap.isOpened():
+            self.capture_failed.emit("Камера недоступна!")
+            return
+
+        try:
+            while not self.isInterruptionRequested():
+                ret, frame = cap.read()
+                if not ret:
+                    self.msleep(10)
+                    continue
+
+                self.frame_queue.put(frame)
+                if not self.display_pending:
+                    self.display_pending = True
+                    self.frame_captured.emit(frame)
+        finally:
+            cap.release()
+
+
+    def frame_displayed(self):
+        """Вызывается GUI после отображения кадра"""
+        self.display_pending = False
+
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
+
+
+
+class InferenceThread(QThread):
+
+    results_ready = pyqtSignal(list)
+
+    def __init__(self, face_recognizer: 'FaceRecognizer', frame_queue: LatestFrameQueue, parent=None):
+        """
+        Поток распознавания: обрабатывает самые свежие кадры так быстро, как позволяет процессор
+        :param face_recognizer: Объект FaceRecognizer
+        :param frame_queue: Очередь кадров от потока захвата
+        """
+        super().__init__(parent)
+        self.face_recognizer = face_recognizer
+        self.frame_queue = frame_queue
+
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            frame = self.frame_queue.get(timeout=0.1)
+            if frame is None:
+                continue
+
+            try:
+                results = self.face_recognizer.analyze_frame(frame)
+            except Exception as e:
+                print(f"Ошибка распознавания кадра: {str(e)}")
+                continue
+
+            self.results_ready.emit(results)
+
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
+
+
+
+class PoolReaderThread(QThread):
+
+    frame_captured = pyqtSignal(object)
+    results_ready = pyqtSignal(list)
+    attendance_ready = pyqtSignal(list)
+    capture_failed = pyqtSignal(str)
+
+    def __init__(self, camera_pool: 'CameraPool', parent=None):
+        """
+        Поток чтения событий пула камер: кадры и результаты выбранной камеры
+        для предпросмотра, распознанные пользователи всех камер - для отметки посещения
+        :param camera_pool: Запущенный пул процессов камер
+        """
+        super().__init__(parent)
+        self.camera_pool = camera_pool
+        self.display_pending = False
+
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            event = self.camera_pool.get_result(timeout=0.02)
+            while event is not None:
+                source_index, kind, payload = event
+                if kind == 'recognized':
+                    self.attendance_ready.emit(payload)
+                elif kind == 'preview' and source_index == self.camera_pool.preview_source.value:
+                    self.results_ready.emit(payload)
+                elif kind == 'error':
+                    self.capture_failed.emit(payload)
+                event = self.camera_pool.get_result()
+
+            frame = self.camera_pool.get_preview_frame()
+            if frame is not None and not self.display_pending:
+                self.display_pending = True
+                self.frame_captured.emit(frame)
+
+
+    def frame_displayed(self):
+        """Вызывается GUI после отображения кадра"""
+        self.display_pending = False
+
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
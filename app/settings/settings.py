@@ -13,11 +13,10 @@ class SettingsManager:
 
 
     def load_settings(self):
-        """Загрузка настроек из файла."""
+        """Загрузка настроек из файла (отсутствующие ключи берутся из настроек 'по умолчанию')."""
+        self.config.read(DEFAULT_SETTINGS_FILE)
         if SETTINGS_FILE.exists():
             self.config.read(SETTINGS_FILE)
-        else:
-            self.config.read(DEFAULT_SETTINGS_FILE)
 
 
     def load_default_settings(self):
@@ -48,7 +47,30 @@ class SettingsManager:
                 if not self.config.has_section('Settings'):
                     self.config.add_section('Settings')
                     self.config.set('Settings', 'max_faces', '10')
+                    self.config.set('Settings', 'face_priority', 'size')
+                    self.config.set('Settings', 'det_size', '320')
+                    self.config.set('Settings', 'capture_width', '0')
+                    self.config.set('Settings', 'capture_height', '0')
                     self.config.set('Settings', 'institution', 'Educational')
                     self.config.set('Settings', 'execution_provider', 'CPU')
                     self.config.set('Settings', 'model', 'buffalo_s')
+                    self.config.set('Settings', 'quantization', 'none')
+                    self.config.set('Settings', 'intra_op_threads', '0')
+                    self.config.set('Settings', 'inter_op_threads', '0')
+                    self.config.set('Settings', 'graph_optimization', 'all')
+                    self.config.set('Settings', 'execution_mode', 'sequential')
+                    self.config.set('Settings', 'gallery_index', 'exact')
+                    self.config.set('Settings', 'ivf_nlist', '0')
+                    self.config.set('Settings', 'ivf_nprobe', '8')
+                    self.config.set('Settings', 'registration_keep_samples', '5')
+                    self.config.set('Settings', 'frame_skip', '1')
+                    self.config.set('Settings', 'track_confirm_votes', '3')
+                    self.config.set('Settings', 'track_recheck_interval', '30')
+                    self.config.set('Settings', 'camera_sources', '0')
+                    self.config.set('Settings', 'camera_rois', '')
+                    self.config.set('Settings', 'motion_min_area', '0.002')
+                    self.config.set('Settings', 'motion_max_idle', '2.0')
+                    self.config.set('Settings', 'attendance_cooldown', '0')
+                    self.config.set('Settings', 'attendance_batch_size', '50')
+                    self.config.set('Settings', 'attendance_flush_ms', '200')
                     self.config.write(file)
\ No newline at end of file
@@ -0,0 +1,35 @@
+"""
+Загрузка посещаемости задним числом из записей с камер и папок с фотографиями
+
+Время посещения берется из записи: для видео - время начала (из имени файла
+вида 20241018_093000 или по времени изменения файла) плюс позиция кадра,
+для изображений - EXIF, имя файла или время изменения.
+Обработанные записи запоминаются; повторный запуск продолжает с необработанных.
+    python backfill.py recordings/
+    python backfill.py lecture.mp4 --start "2024-10-18 09:30:00" --stride 50 --workers 4
+"""
+import argparse
+from datetime import datetime
+from app.core.backfill import BackfillRunner
+from app.settings.settings import SettingsManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help="Видеофайлы и папки (с видео или изображениями)")
+    parser.add_argument('--stride', type=int, default=25, help="Обрабатывать каждый N-й кадр")
+    parser.add_argument('--min-hits', type=int, default=2,
+                        help="Минимум кадров с распознанным пользователем для отметки посещения")
+    parser.add_argument('--workers', type=int, default=0, help="Количество процессов (0 - по числу ядер)")
+    parser.add_argument('--start', type=lambda value: datetime.strptime(value, '%Y-%m-%d %H:%M:%S'),
+                        default=None, help="Время начала записи 'YYYY-MM-DD HH:MM:SS' (для всех видео)")
+    parser.add_argument('--force', action='store_true', help="Обработать заново уже обработанные записи")
+    args = parser.parse_args()
+
+    runner = BackfillRunner(SettingsManager(), stride=args.stride, min_hits=args.min_hits,
+                            workers=args.workers, start=args.start, force=args.force)
+    runner.run(args.paths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Запросы посещаемости до и после миграции схемы (диапазоны по индексу времени вместо DATE/strftime)
+
+Создается временная БД в старой схеме (индексы по одному столбцу, фильтры функциями от timestamp),
+измеряются старые запросы, затем DatabaseManager выполняет миграцию и измеряются новые.
+Для каждого запроса выводится план (EXPLAIN QUERY PLAN) и время
+(старые запросы возвращают строку на пользователя с GROUP_CONCAT, новые - строку на посещение)
+
+Запуск из корня проекта:
+    python -m benchmarks.attendance_queries --rows 3000000 --users 3000 --days 1500
+"""
+import argparse
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import numpy as np
+from app.core.database import DatabaseManager
+
+
+# Запросы до миграции (как они были в database.py)
+OLD_QUERIES = {
+    'today': '''
+        SELECT u.lastname || ' ' || u.firstname || ' ' || u.patronymic AS full_name, u.group_name,
+               GROUP_CONCAT(a.timestamp, ', ') AS timestamps
+        FROM users u JOIN attendance a ON u.id = a.user_id
+        WHERE DATE(a.timestamp) = DATE(?)
+        GROUP BY u.id''',
+    'range_30d': '''
+        SELECT u.id, u.lastname || ' ' || u.firstname || COALESCE(' ' || u.patronymic, '') AS fullname,
+               GROUP_CONCAT(strftime('%d.%m.%Y %H:%M', datetime(timestamp)), '; ') AS times
+        FROM attendance a JOIN users u ON a.user_id = u.id
+        WHERE date(timestamp) BETWEEN ? AND ?
+        GROUP BY u.id ORDER BY timestamp DESC''',
+    'by_date': '''
+        SELECT u.id, u.lastname || ' ' || u.firstname || COALESCE(' ' || u.patronymic, '') AS fullname,
+               GROUP_CONCAT(strftime('%d.%m.%Y %H:%M', a.timestamp), '; ') AS times
+        FROM attendance a JOIN users u ON a.user_id = u.id
+        WHERE strftime('%d', a.timestamp) = ? AND strftime('%m', a.timestamp) = ? AND strftime('%Y', a.timestamp) = ?
+        GROUP BY u.id ORDER BY a.timestamp DESC''',
+    'by_day_month': '''
+        SELECT u.id, u.lastname || ' ' || u.firstname || COALESCE(' ' || u.patronymic, '') AS fullname,
+               GROUP_CONCAT(strftime('%d.%m.%Y %H:%M', a.timestamp), '; ') AS times
+        FROM attendance a JOIN users u ON a.user_id = u.id
+        WHERE strftime('%d', a.timestamp) = ? AND strftime('%m', a.timestamp) = ?
+        GROUP BY u.id ORDER BY a.timestamp DESC''',
+    'user_today': '''
+        SELECT COUNT(*) FROM attendance
+        WHERE user_id = ? AND DATE(timestamp) = DATE(?)''',
+}
+
+
+def create_old_database(path: Path, rows: int, users: int, days: int, last_day: date):
+    """БД в схеме до миграции со случайными посещениями за days дней до last_day включительно"""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lastname TEXT COLLATE NOCASE NOT NULL,
+            firstname TEXT COLLATE NOCASE NOT NULL,
+            patronymic TEXT COLLATE NOCASE,
+            faculty TEXT,
+            group_name TEXT COLLATE NOCASE
+        );
+        CREATE TABLE attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        );
+    ''')
+    conn.executemany("INSERT INTO users (lastname, firstname, patronymic, faculty, group_name) VALUES (?, ?, ?, ?, ?)",
+                     ((f"Фамилия{i}", f"Имя{i}", f"Отчество{i}", "ФИТ", f"Группа{i % 100}") for i in range(users)))
+
+    rng = np.random.default_rng(0)
+    first = datetime.combine(last_day - timedelta(days=days - 1), datetime.min.time())
+    chunk = 200000
+    for offset in range(0, rows, chunk):
+        n = min(chunk, rows - offset)
+        seconds = np.sort(rng.integers(0, days * 86400, n))
+        user_ids = rng.integers(1, users + 1, n)
+        conn.executemany("INSERT INTO attendance (user_id, timestamp) VALUES (?, ?)",
+                         ((int(u), (first + timedelta(seconds=int(s))).strftime('%Y-%m-%d %H:%M:%S'))
+                          for u, s in zip(user_ids, seconds)))
+    conn.execute("CREATE INDEX idx_attendance_user ON attendance(user_id)")
+    conn.execute("CREATE INDEX idx_attendance_time ON attendance(timestamp)")
+    conn.commit()
+    conn.close()
+
+
+def plan(conn: sqlite3.Connection, sql: str, params=()) -> str:
+    rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return "; ".join(row[-1] for row in rows)
+
+
+def timed(function, repeat: int):
+    """Среднее время вызова в мс и результат"""
+    result = function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=3000000)
+    parser.add_argument('--users', type=int, default=3000)
+    parser.add_argument('--days', type=int, default=1500)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    today = date.today()
+    day = today - timedelta(days=40)
+    month_ago = (today - timedelta(days=30)).isoformat()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "attendance.db"
+        start = time.perf_counter()
+        create_old_database(path, args.rows, args.users, args.days, today)
+        print(f"БД: {args.rows} посещений, {args.users} пользователей, {args.days} дней "
+              f"(создание {time.perf_counter() - start:.1f} с)")
+
+        # До миграции
+        conn = sqlite3.connect(path)
+        old_params = {
+            'today': (today.isoformat(),),
+            'range_30d': (month_ago, today.isoformat()),
+            'by_date': (f"{day.day:02d}", f"{day.month:02d}", str(day.year)),
+            'by_day_month': (f"{day.day:02d}", f"{day.month:02d}"),
+            'user_today': (1, today.isoformat()),
+        }
+        old = {}
+        for name, sql in OLD_QUERIES.items():
+            ms, result = timed(lambda: conn.execute(sql, old_params[name]).fetchall(), args.repeat)
+            old[name] = (ms, len(result), plan(conn, sql, old_params[name]))
+        conn.close()
+
+        # Миграция и новые запросы DatabaseManager
+        start = time.perf_counter()
+        db = DatabaseManager('Educational', db_path=path)
+        print(f"Миграция схемы: {time.perf_counter() - start:.1f} с")
+
+        statements = []
+        db.conn.set_trace_callback(statements.append)
+        new_calls = {
+            'today': db.get_today_attendance,
+            'range_30d': lambda: db.get_attendance_events(month_ago, today.isoformat()),
+            'by_date': lambda: db.get_attendance_events_by_date(f"{day.day}.{day.month}.{day.year}"),
+            'by_day_month': lambda: db.get_attendance_events_by_date(f"{day.day}.{day.month}"),
+            'user_today': lambda: [db.has_attendance_today(1)],
+        }
+        new = {}
+        for name, call in new_calls.items():
+            ms, result = timed(call, args.repeat)
+            sql = statements[-1]
+            statements.clear()
+            new[name] = (ms, len(result), plan(db.conn, sql))
+        db.conn.set_trace_callback(None)
+
+    print(f"\n{'запрос':<14}{'до, мс':>10}{'после, мс':>12}{'ускорение':>11}{'строк (до/после)':>20}")
+    for name in OLD_QUERIES:
+        old_ms, old_rows, _ = old[name]
+        new_ms, new_rows, _ = new[name]
+        rows = f"{new_rows}" if old_rows == new_rows else f"{old_rows}/{new_rows}"
+        print(f"{name:<14}{old_ms:>10.1f}{new_ms:>12.2f}{old_ms / max(new_ms, 1e-6):>10.0f}x{rows:>20}")
+
+    print("\nПланы запросов:")
+    for name in OLD_QUERIES:
+        print(f"{name}\n  до:    {old[name][2]}\n  после: {new[name][2]}")
+
+
+if __name__ == "__main__":
+    main()
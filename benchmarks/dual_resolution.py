@@ -0,0 +1,71 @@
+"""
+Стоимость детекции при разных размерах входа детектора на кадрах высокого разрешения
+
+Для каждого det_size замеряется детекция на сжатом кадре (как в FaceRecognizer)
+и количество найденных лиц; экономия считается относительно самого большого размера.
+Распознавание в обоих случаях выполняется по кадру полного разрешения.
+
+Запуск из корня проекта (нужны загруженные модели InsightFace):
+    python -m benchmarks.dual_resolution --video entrance_1080p.mp4 --sizes 320 480 640 960
+"""
+import argparse
+import time
+import cv2
+import numpy as np
+from app.core.face_recognition import FaceRecognizer
+from app.core.gallery import FaceGallery
+from app.settings.settings import SettingsManager
+
+
+def read_frames(path, count: int, rng):
+    """Кадры видеофайла или синтетические кадры 1920x1080"""
+    if not path:
+        return [rng.integers(0, 255, (1080, 1920, 3), dtype=np.uint8) for _ in range(count)]
+
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', default=None)
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[320, 480, 640, 960])
+    args = parser.parse_args()
+
+    frames = read_frames(args.video, args.frames, np.random.default_rng(0))
+    if not frames:
+        print("Нет кадров")
+        return
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} кадров {width}x{height}")
+
+    recognizer = FaceRecognizer(None, SettingsManager(), gallery=FaceGallery())
+    results = {}
+    for size in sorted(args.sizes, reverse=True):
+        recognizer.DET_SIZE = (size, size)
+        recognizer.det_model.prepare(-1, input_size=recognizer.DET_SIZE)
+        recognizer._detect(frames[0])
+
+        faces = 0
+        start = time.perf_counter()
+        for frame in frames:
+            bboxes, _ = recognizer._detect(frame)
+            faces += bboxes.shape[0]
+        results[size] = ((time.perf_counter() - start) / len(frames) * 1000, faces / len(frames))
+
+    reference_ms = results[max(results)][0]
+    for size, (ms, faces) in sorted(results.items()):
+        print(f"det_size={size}: {ms:.1f} мс/кадр, лиц на кадре {faces:.2f}, "
+              f"экономия {reference_ms - ms:.1f} мс/кадр")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Сравнение точного и приближенного (IVF) поиска по галерее эмбеддингов
+
+Запуск из корня проекта:
+    python -m benchmarks.gallery_index --users 30000 --samples 10
+"""
+import argparse
+import time
+import numpy as np
+from app.core.gallery import FaceGallery
+from app.core.gallery_index import ExactIndex, IVFIndex
+
+
+def make_gallery(num_users: int, samples: int, dim: int, noise: float, rng):
+    """Синтетическая галерея: образцы пользователя разбросаны вокруг его 'личности'"""
+    identities = rng.standard_normal((num_users, dim)).astype(np.float32)
+    identities /= np.linalg.norm(identities, axis=1, keepdims=True)
+    user_ids = np.repeat(np.arange(num_users), samples)
+    embeddings = identities[user_ids] + noise * rng.standard_normal((user_ids.shape[0], dim)).astype(np.float32) / np.sqrt(dim)
+    return identities, embeddings, user_ids
+
+
+def run(gallery: FaceGallery, queries: np.ndarray, batch: int):
+    """Средняя задержка на кадр (batch лиц) и найденные id"""
+    found = []
+    start = time.perf_counter()
+    for i in range(0, queries.shape[0], batch):
+        ids, _ = gallery.match(queries[i:i + batch])
+        found.append(ids[:, 0])
+    elapsed = time.perf_counter() - start
+    frames = int(np.ceil(queries.shape[0] / batch))
+    return elapsed / frames * 1000, np.concatenate(found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=30000)
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--noise', type=float, default=0.8)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--batch', type=int, default=5, help="Лиц в одном кадре")
+    parser.add_argument('--nlist', type=int, default=0)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    identities, embeddings, user_ids = make_gallery(args.users, args.samples, args.dim, args.noise, rng)
+    query_users = rng.choice(args.users, args.queries)
+    queries = identities[query_users] + args.noise * rng.standard_normal((args.queries, args.dim)).astype(np.float32) / np.sqrt(args.dim)
+    names = {}
+
+    print(f"Галерея: {args.users} пользователей x {args.samples} образцов = {embeddings.shape[0]} строк, dim={args.dim}")
+
+    exact = FaceGallery(index=ExactIndex())
+    start = time.perf_counter()
+    exact.build(list(embeddings), list(user_ids), names)
+    print(f"exact: построение {time.perf_counter() - start:.2f} с")
+    exact_ms, exact_ids = run(exact, queries, args.batch)
+    print(f"exact: {exact_ms:.2f} мс/кадр, точность {np.mean(exact_ids == query_users):.4f}")
+
+    ivf = FaceGallery(index=IVFIndex(nlist=args.nlist))
+    start = time.perf_counter()
+    ivf.build(list(embeddings), list(user_ids), names)
+    print(f"ivf: построение {time.perf_counter() - start:.2f} с, кластеров {ivf.index.centroids.shape[0]}")
+
+    for nprobe in args.nprobe:
+        ivf.index.nprobe = nprobe
+        ivf_ms, ivf_ids = run(ivf, queries, args.batch)
+        recall = np.mean(ivf_ids == exact_ids)
+        print(f"ivf nprobe={nprobe:>3}: {ivf_ms:.2f} мс/кадр ({exact_ms / ivf_ms:.1f}x), "
+              f"совпадение с exact {recall:.4f}")
+
+
+if __name__ == '__main__':
+    main()
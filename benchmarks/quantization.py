@@ -0,0 +1,139 @@
+"""
+Сравнение int8-моделей с исходными fp32: скорость и расхождение результатов
+
+Точность распознавания оценивается на эталонных изображениях пользователей
+(или на кадрах из --images): косинусная близость эмбеддингов fp32 и int8
+и доля верных ответов поиска ближайшего образца (leave-one-out) для каждой модели.
+Детектор сравнивается по найденным рамкам на кадрах крупнее 112x112.
+
+Запуск из корня проекта (нужны загруженные модели InsightFace):
+    python -m benchmarks.quantization
+    python -m benchmarks.quantization --images frames/ --model buffalo_l
+"""
+import argparse
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+from insightface.utils import face_align
+from app.core.face_recognition import ALIGNED_FACE_SIZE
+from app.core.model_loader import TunedFaceAnalysis, session_options_from_settings
+from app.core.paths import FACES_IMG_DIR_EDUCATIONAL, FACES_IMG_DIR_ENTERPRISE
+from app.core.tracking import iou_matrix
+from app.settings.settings import SettingsManager
+
+
+def measure(func, repeats: int) -> float:
+    """Среднее время вызова в миллисекундах (после прогрева)"""
+    func()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def load_images(images_dir):
+    """Изображения с метками: папка пользователя (эталоны) или имя файла (кадры)"""
+    if images_dir:
+        paths = sorted(p for p in Path(images_dir).rglob('*') if p.suffix.lower() in ('.jpg', '.jpeg', '.png'))
+    else:
+        paths = sorted(list(FACES_IMG_DIR_EDUCATIONAL.glob('*/*.jpg')) + list(FACES_IMG_DIR_ENTERPRISE.glob('*/*.jpg')))
+
+    images = []
+    for path in paths:
+        img = cv2.imread(str(path))
+        if img is not None:
+            images.append((path.parent.name, img))
+    return images
+
+
+def align_faces(model: TunedFaceAnalysis, images: list):
+    """Выровненные лица: эталоны 112x112 используются как есть, на кадрах берется самое крупное лицо"""
+    labels, aligned = [], []
+    for label, img in images:
+        if img.shape[:2] == (ALIGNED_FACE_SIZE, ALIGNED_FACE_SIZE):
+            labels.append(label)
+            aligned.append(img)
+            continue
+        bboxes, kpss = model.det_model.detect(img, max_num=1, metric='max')
+        if bboxes.shape[0]:
+            labels.append(label)
+            aligned.append(face_align.norm_crop(img, landmark=kpss[0], image_size=ALIGNED_FACE_SIZE))
+    return np.array(labels), aligned
+
+
+def leave_one_out_accuracy(embeddings: np.ndarray, labels: np.ndarray) -> float:
+    """Доля образцов, ближайший другой образец которых принадлежит тому же пользователю"""
+    if len(labels) < 2:
+        return float('nan')
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    similarity = normalized @ normalized.T
+    np.fill_diagonal(similarity, -np.inf)
+    return float(np.mean(labels[np.argmax(similarity, axis=1)] == labels))
+
+
+def compare_detection(fp32: TunedFaceAnalysis, int8: TunedFaceAnalysis, frames: list):
+    """Количество лиц и среднее IoU сопоставленных рамок"""
+    count_diff, ious = 0, []
+    for frame in frames:
+        boxes_fp32, _ = fp32.det_model.detect(frame, max_num=0, metric='default')
+        boxes_int8, _ = int8.det_model.detect(frame, max_num=0, metric='default')
+        count_diff += abs(boxes_fp32.shape[0] - boxes_int8.shape[0])
+        if boxes_fp32.shape[0] and boxes_int8.shape[0]:
+            ious.extend(iou_matrix(boxes_fp32, boxes_int8).max(axis=1))
+    mean_iou = np.mean(ious) if ious else float('nan')
+    print(f"Детекция: {len(frames)} кадров, расхождение в числе лиц {count_diff}, среднее IoU рамок {mean_iou:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=None, help="Набор моделей (по умолчанию - из настроек)")
+    parser.add_argument('--images', default=None, help="Папка с кадрами или эталонами (по умолчанию - эталоны пользователей)")
+    parser.add_argument('--det-size', type=int, default=320)
+    parser.add_argument('--batch', type=int, default=8, help="Лиц в одном вызове модели распознавания")
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    settings_manager = SettingsManager()
+    model_name = args.model or settings_manager.get_setting('model')
+    sess_options = session_options_from_settings(settings_manager)
+    models = {}
+    for quantization in ('none', 'all'):
+        model = TunedFaceAnalysis(model_name, ['CPUExecutionProvider'], sess_options, quantization)
+        model.prepare(ctx_id=-1, det_size=(args.det_size, args.det_size))
+        models['fp32' if quantization == 'none' else 'int8'] = model
+
+    images = load_images(args.images)
+    frames = [img for _, img in images if img.shape[:2] != (ALIGNED_FACE_SIZE, ALIGNED_FACE_SIZE)]
+    labels, aligned = align_faces(models['fp32'], images)
+
+    # Скорость
+    rng = np.random.default_rng(0)
+    frame = frames[0] if frames else rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    batch = (aligned * args.batch)[:args.batch] if aligned else [
+        rng.integers(0, 255, (ALIGNED_FACE_SIZE, ALIGNED_FACE_SIZE, 3), dtype=np.uint8) for _ in range(args.batch)]
+    for name, model in models.items():
+        det_ms = measure(lambda: model.det_model.detect(frame, max_num=0, metric='default'), args.repeats)
+        rec_ms = measure(lambda: model.models['recognition'].get_feat(batch), args.repeats)
+        print(f"{name}: детекция {det_ms:.1f} мс/кадр, распознавание {rec_ms:.1f} мс/{args.batch} лиц")
+
+    # Точность
+    if not aligned:
+        print("Нет изображений лиц для оценки точности")
+        return
+
+    embeddings = {name: model.models['recognition'].get_feat(aligned) for name, model in models.items()}
+    fp32 = embeddings['fp32'] / np.linalg.norm(embeddings['fp32'], axis=1, keepdims=True)
+    int8 = embeddings['int8'] / np.linalg.norm(embeddings['int8'], axis=1, keepdims=True)
+    cosine = np.sum(fp32 * int8, axis=1)
+    print(f"Распознавание: {len(aligned)} лиц, близость эмбеддингов fp32/int8 "
+          f"средняя {cosine.mean():.4f}, минимальная {cosine.min():.4f}")
+    for name, values in embeddings.items():
+        print(f"{name}: точность поиска ближайшего образца {leave_one_out_accuracy(values, labels):.4f}")
+
+    if frames:
+        compare_detection(models['fp32'], models['int8'], frames)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Сравнение распознавания лиц по одному и одним батчем, время этапов обработки кадра
+
+Запуск из корня проекта (нужны загруженные модели InsightFace):
+    python -m benchmarks.recognition_batch --faces 1 2 4 8 16
+    python -m benchmarks.recognition_batch --video corridor.mp4 --users 1000
+
+С --video видео обрабатывается с эмбеддингами по одному лицу (как до батчей)
+и одним батчем на кадр; печатается среднее время этапов обоих способов
+"""
+import argparse
+import time
+import cv2
+import numpy as np
+from app.core.face_recognition import FaceRecognizer, ALIGNED_FACE_SIZE
+from app.core.gallery import FaceGallery
+from app.core.motion import MotionGate
+from app.settings.settings import SettingsManager
+from benchmarks.gallery_index import make_gallery
+
+
+def measure(func, repeats: int) -> float:
+    """Среднее время вызова в миллисекундах (после прогрева)"""
+    func()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def compare_batching(recognizer: FaceRecognizer, counts: list, repeats: int, rng):
+    """Эмбеддинги N выровненных лиц: N вызовов модели против одного"""
+    rec_model = recognizer.rec_model
+    for count in counts:
+        faces = [rng.integers(0, 255, (ALIGNED_FACE_SIZE, ALIGNED_FACE_SIZE, 3), dtype=np.uint8)
+                 for _ in range(count)]
+        sequential = measure(lambda: [rec_model.get_feat(face) for face in faces], repeats)
+        batched = measure(lambda: rec_model.get_feat(faces), repeats)
+        print(f"{count:3d} лиц: по одному {sequential:7.1f} мс, батчем {batched:7.1f} мс "
+              f"(x{sequential / batched:.2f})")
+
+
+class SequentialModel:
+    """Модель распознавания, вызываемая отдельно для каждого лица (обработка до перехода на батчи)"""
+
+    def __init__(self, model):
+        self.model = model
+
+
+    def get_feat(self, faces):
+        if not faces:
+            return self.model.get_feat(faces)
+        return np.vstack([self.model.get_feat(face) for face in faces])
+
+
+def profile_video(recognizer: FaceRecognizer, path: str, max_frames: int) -> dict:
+    """Время этапов analyze_frame на видеофайле (мс на вызов этапа, 'кадр' - на кадр)"""
+    recognizer.tracker.reset()
+    recognizer.motion_gate = MotionGate(recognizer.MOTION_MIN_AREA, recognizer.MOTION_MAX_IDLE)
+    recognizer.frame_counter = 0
+    recognizer.timings.reset()
+
+    cap = cv2.VideoCapture(path)
+    frames = 0
+    start = time.perf_counter()
+    while frames < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        recognizer.analyze_frame(frame)
+        frames += 1
+    elapsed = time.perf_counter() - start
+    cap.release()
+
+    if not frames:
+        return {}
+    print(f"{frames} кадров, {elapsed / frames * 1000:.1f} мс/кадр")
+    print(recognizer.timings.summary())
+    return {'кадр': elapsed / frames * 1000, **recognizer.timings.average_ms()}
+
+
+def compare_video(recognizer: FaceRecognizer, path: str, max_frames: int, rounds: int):
+    """
+    Этапы обработки видео с эмбеддингами по одному лицу и батчем
+    Порядок проходов чередуется по раундам (второй проход обычно медленнее первого),
+    в таблицу попадает среднее по раундам
+    """
+    rec_model = recognizer.rec_model
+    models = {'по одному': SequentialModel(rec_model), 'батчем': rec_model}
+    results = {mode: [] for mode in models}
+    for round_index in range(rounds):
+        for mode in (list(models) if round_index % 2 == 0 else list(models)[::-1]):
+            print(f"\n{mode.capitalize()}, раунд {round_index + 1}:")
+            recognizer.rec_model = models[mode]
+            results[mode].append(profile_video(recognizer, path, max_frames))
+    recognizer.rec_model = rec_model
+
+    average = {mode: {stage: float(np.mean([run[stage] for run in runs if stage in run]))
+                      for stage in runs[0]} for mode, runs in results.items() if runs and runs[0]}
+    if len(average) < 2:
+        return
+    sequential, batched = average['по одному'], average['батчем']
+    print(f"\n{'этап, мс':10s} {'по одному':>10s} {'батчем':>10s}")
+    for stage in batched:
+        before = f"{sequential[stage]:10.1f}" if stage in sequential else f"{'-':>10s}"
+        print(f"{stage:10s} {before} {batched[stage]:10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--faces', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--video', help="Видеофайл для замера этапов обработки кадра")
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--users', type=int, default=0,
+                        help="Пользователей в случайной галерее для этапа match (0 - пустая галерея)")
+    parser.add_argument('--samples', type=int, default=5)
+    parser.add_argument('--rounds', type=int, default=2, help="Раундов обработки видео каждым способом")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    gallery = FaceGallery()
+    if args.users:
+        _, embeddings, user_ids = make_gallery(args.users, args.samples, 512, 0.8, rng)
+        gallery.build(list(embeddings), list(user_ids), {int(user_id): str(user_id) for user_id in set(user_ids)})
+    recognizer = FaceRecognizer(None, SettingsManager(), gallery=gallery)
+    compare_batching(recognizer, args.faces, args.repeats, rng)
+    if args.video:
+        compare_video(recognizer, args.video, args.frames, max(1, args.rounds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Учет посещаемости без графического интерфейса (мини-ПК, служба systemd)
+
+Настройки берутся из app/settings/settings.ini; источники по умолчанию - camera_sources.
+    python daemon.py
+    python daemon.py --source 0 --source rtsp://10.0.0.5/stream --stats-interval 60
+    python daemon.py --source recordings/lecture.mp4
+"""
+import argparse
+import signal
+from app.core.capture import parse_source, parse_sources
+from app.core.headless import HeadlessRunner
+from app.settings.settings import SettingsManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', action='append', default=None,
+                        help="Индекс камеры, видеофайл, URL потока или папка с изображениями (можно несколько)")
+    parser.add_argument('--stats-interval', type=float, default=30.0,
+                        help="Период вывода статистики в секундах (0 - не выводить)")
+    args = parser.parse_args()
+
+    settings_manager = SettingsManager()
+    # Источники из командной строки не разбираются по запятым: запятая допустима в пути или URL
+    sources = [parse_source(source) for source in args.source] if args.source else \
+        parse_sources(settings_manager.get_setting('camera_sources'))
+
+    runner = HeadlessRunner(settings_manager, sources, stats_interval=args.stats_interval)
+
+    # Корректная остановка по Ctrl+C и systemctl stop
+    signal.signal(signal.SIGINT, lambda *_: runner.stop())
+    signal.signal(signal.SIGTERM, lambda *_: runner.stop())
+
+    print(f"Распознавание запущено, источники: {sources}")
+    runner.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
+import time
+START_TIME = time.perf_counter()
+
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtGui import QFontDatabase, QFont
-from app.gui.main_window import MainWindow
 import sys
 from app.core.paths import STYLES_DIR
+from app.core.profiling import StageTimer
 from app.settings.settings import SettingsManager
 
 
@@ -11,11 +14,17 @@ def main():
     EXIT_CODE_REBOOT = 1001
     app = QApplication(sys.argv)
 
+    # Тяжелые библиотеки (InsightFace, onnxruntime) загружаются в фоне после появления окна
+    startup_timer = StageTimer()
+    with startup_timer.measure('импорт'):
+        from app.gui.main_window import MainWindow
+
     while True:    
         settings_manager = SettingsManager()
-        window = MainWindow(settings_manager)
+        window = MainWindow(settings_manager, startup_timer)
         load_styles(app)
         window.show()
+        print(f"Окно открыто через {time.perf_counter() - START_TIME:.2f} с после запуска")
 
         exit_code = app.exec()
         if exit_code != EXIT_CODE_REBOOT: